@@ -0,0 +1,82 @@
+"""
+Benchmark: cliente DeepSeek compartido vs. un httpx.AsyncClient por llamada.
+
+Uso:
+    python -m benchmarks.deepseek_pool --calls 200 --handshake-ms 40
+
+Contra el stub local el transporte es HTTP/1.1 en claro, así que lo que se
+mide es el costo de conexión + creación del cliente por llamada;
+`--handshake-ms` simula los RTT extra del handshake TLS de producción.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from src.integrations.deepseek import DeepSeekClient
+from benchmarks.stub_server import StubServer
+
+
+MESSAGES = [
+    {"role": "system", "content": "Eres un clasificador de intenciones."},
+    {"role": "user", "content": "hola, quiero info de los agentes de WhatsApp"},
+]
+
+
+async def per_call_client(base_url: str) -> float:
+    """Comportamiento anterior: cliente nuevo (y conexión nueva) por llamada."""
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{base_url}/chat/completions",
+            headers={"Authorization": "Bearer bench"},
+            json={"model": "deepseek-chat", "messages": MESSAGES},
+            timeout=60.0
+        )
+        response.json()
+    return time.perf_counter() - started
+
+
+async def pooled_client(client: DeepSeekClient) -> float:
+    started = time.perf_counter()
+    await client.chat_completion(MESSAGES)
+    return time.perf_counter() - started
+
+
+def report(name: str, samples: list, connections: int) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(
+        f"{name:<22} avg={statistics.mean(samples) * 1000:7.2f}ms "
+        f"p50={statistics.median(samples) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms "
+        f"conexiones={connections}"
+    )
+
+
+async def main(calls: int, handshake_ms: float, latency_ms: float) -> None:
+    server = await StubServer(handshake_ms=handshake_ms, latency_ms=latency_ms).start()
+
+    baseline = [await per_call_client(server.base_url) for _ in range(calls)]
+    report("cliente por llamada", baseline, server.connections)
+
+    server.connections = 0
+    client = DeepSeekClient(api_key="bench", base_url=server.base_url)
+    await client.start()
+    pooled = [await pooled_client(client) for _ in range(calls)]
+    report("cliente compartido", pooled, server.connections)
+    await client.close()
+
+    saved = statistics.mean(baseline) - statistics.mean(pooled)
+    print(f"ahorro medio por llamada: {saved * 1000:.2f}ms")
+    await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.handshake_ms, args.latency_ms))
@@ -0,0 +1,168 @@
+"""
+Doble en memoria del cliente síncrono de supabase-py para los benchmarks.
+Implementa el subconjunto de la API que usa SupabaseClient
+(table().select/insert/update().eq().order().limit().execute() y las
+funciones RPC de supabase_schema.sql) y cada execute() bloquea
+`latency_ms` con time.sleep, como la llamada HTTP real.
+Cuenta los round trips para comparar estrategias de persistencia.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.limit_n = None
+
+    def select(self, *columns):
+        self.op = "select"
+        return self
+
+    def insert(self, data):
+        self.op, self.payload = "insert", data
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def _matches(self, row) -> bool:
+        return all(row.get(c) == v for c, v in self.filters)
+
+    def execute(self):
+        self.db.round_trip()
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.op == "insert":
+            batch = self.payload if isinstance(self.payload, list) else [self.payload]
+            inserted = []
+            for data in batch:
+                row = {
+                    "id": str(uuid.uuid4()),
+                    "created_at": self.db.now(),
+                    **({"message_count": 0, "updated_at": self.db.now()} if self.table == "leads" else {}),
+                    **data,
+                }
+                rows.append(row)
+                inserted.append(dict(row))
+            return SimpleNamespace(data=inserted)
+        if self.op == "update":
+            updated = []
+            for row in rows:
+                if self._matches(row):
+                    row.update(self.payload)
+                    if self.table == "leads":
+                        row["updated_at"] = self.db.now()  # trigger update_leads_updated_at
+                    updated.append(dict(row))
+            return SimpleNamespace(data=updated)
+
+        result = [dict(r) for r in rows if self._matches(r)]
+        if self.order_by:
+            column, desc = self.order_by
+            result.sort(key=lambda r: r[column], reverse=desc)
+        if self.limit_n is not None:
+            result = result[:self.limit_n]
+        return SimpleNamespace(data=result)
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict):
+        self.db = db
+        self.handler = getattr(db, f"_rpc_{name}")
+        self.params = params
+
+    def execute(self):
+        self.db.round_trip()
+        return SimpleNamespace(data=self.handler(**self.params))
+
+
+class FakeSupabase:
+    """Cliente supabase-py falso: tablas en memoria y latencia bloqueante."""
+
+    def __init__(self, latency_ms: float = 5.0):
+        self.latency = latency_ms / 1000
+        self.tables = {}
+        self.round_trips = 0
+
+    def now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def round_trip(self) -> None:
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def _lead(self, phone_number: str):
+        return next((r for r in self.tables.get("leads", []) if r["phone_number"] == phone_number), None)
+
+    def _rpc_load_conversation_context(self, p_phone_number, p_limit):
+        lead = self._lead(p_phone_number)
+        if lead is None:
+            lead = {
+                "id": str(uuid.uuid4()), "phone_number": p_phone_number, "fsm_state": "INICIO",
+                "bant_score": 0, "message_count": 0, "extracted_facts": {}, "puntos_dolor": [],
+                "created_at": self.now(), "updated_at": self.now(),
+            }
+            self.tables.setdefault("leads", []).append(lead)
+        messages = sorted(
+            (m for m in self.tables.get("messages", []) if m["lead_id"] == lead["id"]),
+            key=lambda m: m["created_at"]
+        )
+        return {"lead": dict(lead), "messages": [dict(m) for m in messages[-p_limit:]]}
+
+    def _rpc_commit_turn(self, p_phone_number, p_lead_updates, p_facts, p_messages):
+        lead = self._lead(p_phone_number)
+        if lead is None:
+            return None
+        now = datetime.now(timezone.utc)
+        for i, message in enumerate(p_messages):
+            created_at = (now + timedelta(microseconds=i)).isoformat()
+            row = {k: v for k, v in message.items() if k != "mark_extracted"}
+            self.tables.setdefault("messages", []).append(
+                {"id": str(uuid.uuid4()), "lead_id": lead["id"], "created_at": created_at, **row}
+            )
+            if message.get("mark_extracted"):
+                lead["extraction_watermark"] = created_at
+        lead.update(p_lead_updates)
+        lead["extracted_facts"] = {**(lead.get("extracted_facts") or {}), **p_facts}
+        lead["message_count"] = (lead.get("message_count") or 0) + len(p_messages)
+        if p_messages:
+            lead["last_message_at"] = now.isoformat()
+        return dict(lead)
+
+    def _rpc_append_messages(self, p_messages):
+        for message in p_messages:
+            lead = self._lead(message["phone_number"])
+            if lead is None:
+                continue
+            row = {k: v for k, v in message.items() if k not in ("mark_extracted", "phone_number")}
+            self.tables.setdefault("messages", []).append({**row, "lead_id": lead["id"]})
+            lead["message_count"] = (lead.get("message_count") or 0) + 1
+            lead["last_message_at"] = message["created_at"]
+            if message.get("mark_extracted"):
+                lead["extraction_watermark"] = message["created_at"]
+        return len(p_messages)
@@ -0,0 +1,86 @@
+"""
+Benchmark: clasificador local de intención contra un set etiquetado.
+
+Uso:
+    python -m benchmarks.intent_classifier --threshold 0.85
+
+Reporta, por umbral, la cobertura (mensajes resueltos sin LLM), la
+precisión sobre esos mensajes y la latencia por clasificación. Los
+mensajes no cubiertos irían al router LLM. Las muestras que coinciden con
+un ejemplo de entrenamiento (tras normalizar) se excluyen: la precisión se
+mide sobre textos que el modelo no vio.
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from src.agents.intent_classifier import IntentClassifier, normalize
+from src.agents.intent_data import TRAINING_EXAMPLES
+
+
+SAMPLES_PATH = Path(__file__).parent / "data" / "intent_samples.jsonl"
+
+
+def load_samples(path: Path) -> list:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def held_out(samples: list) -> list:
+    """Muestras cuyo texto no está en los ejemplos de entrenamiento."""
+    seen = {normalize(text) for text, _ in TRAINING_EXAMPLES}
+    kept = [s for s in samples if normalize(s["text"]) not in seen]
+    if len(kept) < len(samples):
+        print(f"⚠️ {len(samples) - len(kept)} muestras están en el set de entrenamiento y se omiten")
+    return kept
+
+
+def evaluate(classifier: IntentClassifier, samples: list, repeat: int) -> None:
+    covered = correct = 0
+    errors = []
+    timings = []
+    for sample in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = classifier.classify(sample["text"], sample.get("fsm_state"))
+            timings.append(time.perf_counter() - started)
+        if result is None:
+            continue
+        covered += 1
+        if result.intencion_primaria == sample["intent"]:
+            correct += 1
+        else:
+            errors.append((sample["text"], sample["intent"], result.intencion_primaria, result.confianza))
+
+    ordered = sorted(timings)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(
+        f"umbral={classifier.threshold:.2f} cobertura={covered / len(samples):6.1%} "
+        f"precisión={correct / covered if covered else 0:6.1%} "
+        f"llamadas LLM evitadas={covered}/{len(samples)} "
+        f"p50={statistics.median(timings) * 1e6:7.1f}µs p99={p99 * 1e6:7.1f}µs"
+    )
+    for text, expected, got, confidence in errors:
+        print(f"    ✗ {text!r}: esperado={expected} obtenido={got} ({confidence:.2f})")
+
+
+def main(thresholds: list, repeat: int) -> None:
+    samples = held_out(load_samples(SAMPLES_PATH))
+    started = time.perf_counter()
+    model = IntentClassifier(threshold=0).model
+    print(f"entrenamiento: {(time.perf_counter() - started) * 1000:.1f}ms, {len(samples)} muestras")
+
+    for threshold in thresholds:
+        classifier = IntentClassifier(threshold=threshold)
+        classifier._model = model
+        evaluate(classifier, samples, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threshold", type=float, action="append")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.threshold or [0.5, 0.7, 0.85, 0.95], args.repeat)
@@ -0,0 +1,147 @@
+"""
+Benchmark: throughput de turnos concurrentes según la capa de persistencia.
+
+Uso:
+    python -m benchmarks.persistence --turns 64 --db-latency-ms 8 --llm-ms 300
+    python -m benchmarks.persistence --database-url postgresql://localhost/sdr_bench
+
+Cada turno hace las operaciones de base de process_message (contexto,
+lead, hechos, BANT, estado FSM y los dos mensajes) alrededor de una espera
+no bloqueante que simula las llamadas al LLM. Se compara:
+
+- bloqueante: supabase-py con .execute() en el event loop (comportamiento
+  anterior); cada consulta congela a todas las conversaciones del worker.
+- pool de hilos: SupabaseClient, consultas fuera del event loop, una
+  escritura por operación (sin y con lead_cache).
+- unidad de trabajo: contexto en un round trip (load_conversation_context)
+  y escrituras del turno en una sola llamada a commit_turn
+  (TurnUnitOfWork, como process_message).
+- + journal: además los mensajes van al journal write-behind y se insertan
+  en bloque fuera del turno (el flush final cuenta en los round trips).
+- asyncpg: PostgresRepository contra `--database-url` (requiere asyncpg y
+  el esquema de supabase_schema.sql aplicado).
+
+Contra Supabase la latencia es la de un doble en memoria (fake_supabase).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from src.integrations.lead_cache import LeadCache
+from src.integrations.message_journal import MessageJournal
+from src.integrations.supabase_client import SupabaseClient
+from src.integrations.unit_of_work import TurnUnitOfWork
+from src.models import Message
+from benchmarks.fake_supabase import FakeSupabase
+
+
+class BlockingSupabaseClient(SupabaseClient):
+    """Comportamiento anterior: .execute() síncrono dentro del event loop."""
+
+    async def _execute(self, query):
+        return query.execute()
+
+
+async def run_turn(repo, phone: str, llm_seconds: float) -> float:
+    started = time.perf_counter()
+    await repo.get_conversation_context(phone)
+    await repo.get_or_create_lead(phone)
+    await asyncio.sleep(llm_seconds / 2)  # router + extractor
+    await repo.update_extracted_facts(phone, {"ultimo_tema": "agentes"})
+    await repo.update_bant_score(phone, 40)
+    await repo.update_fsm_state(phone, "CALIFICACION")
+    await asyncio.sleep(llm_seconds / 2)  # respuesta
+    await repo.save_message(Message(phone_number=phone, direction="inbound", content="hola"))
+    await repo.save_message(Message(phone_number=phone, direction="outbound", content="¡Hola!"))
+    return time.perf_counter() - started
+
+
+async def run_turn_uow(repo, phone: str, llm_seconds: float) -> float:
+    started = time.perf_counter()
+    with TurnUnitOfWork(repo, phone) as uow:
+        await uow.load()
+        await asyncio.sleep(llm_seconds / 2)  # router + extractor
+        uow.update_extracted_facts({"ultimo_tema": "agentes"})
+        uow.update_bant_score(40)
+        uow.update_fsm_state("CALIFICACION")
+        await asyncio.sleep(llm_seconds / 2)  # respuesta
+        uow.add_message(Message(phone_number=phone, direction="inbound", content="hola"), mark_extracted=True)
+        uow.add_message(Message(phone_number=phone, direction="outbound", content="¡Hola!"))
+        await uow.flush()
+    return time.perf_counter() - started
+
+
+async def loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.005) -> None:
+    """Retraso del event loop: cuánto tarda en despertar un sleep corto."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def measure(name: str, repo, turns: int, llm_seconds: float, round_trips=None, turn=run_turn) -> None:
+    phones = [f"57300{i:07d}" for i in range(turns)]
+    for phone in phones:
+        await repo.get_or_create_lead(phone)
+
+    stop, lags = asyncio.Event(), []
+    lag_task = asyncio.create_task(loop_lag(stop, lags))
+    before = round_trips() if round_trips else 0
+    started = time.perf_counter()
+    durations = await asyncio.gather(*(turn(repo, p, llm_seconds) for p in phones))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    if getattr(repo, "journal", None):
+        await repo.journal.flush()
+
+    ordered = sorted(durations)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    trips = f" round_trips/turno={(round_trips() - before) / turns:4.1f}" if round_trips else ""
+    print(
+        f"{name:<18} turnos/s={turns / elapsed:7.1f} "
+        f"p50={statistics.median(durations) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms "
+        f"lag máx. del loop={max(lags, default=0) * 1000:7.1f}ms{trips}"
+    )
+
+
+async def main(turns: int, db_latency_ms: float, llm_ms: float, database_url: str) -> None:
+    llm_seconds = llm_ms / 1000
+    modes = (
+        ("bloqueante", BlockingSupabaseClient, False, False, run_turn),
+        ("pool de hilos", SupabaseClient, False, False, run_turn),
+        ("+ lead_cache", SupabaseClient, True, False, run_turn),
+        ("unidad de trabajo", SupabaseClient, True, False, run_turn_uow),
+        ("+ journal", SupabaseClient, True, True, run_turn_uow),
+    )
+    for name, cls, cached, journaled, turn in modes:
+        repo = cls()
+        repo.client = FakeSupabase(latency_ms=db_latency_ms)
+        repo.lead_cache = LeadCache() if cached else None
+        repo.journal = MessageJournal(repo) if journaled else None
+        await measure(name, repo, turns, llm_seconds, lambda: repo.client.round_trips, turn)
+        await repo.close()
+
+    if database_url:
+        from src.integrations.postgres_repository import PostgresRepository
+        repo = PostgresRepository(database_url)
+        repo.lead_cache = LeadCache()
+        await repo.start()
+        try:
+            await measure("asyncpg", repo, turns, llm_seconds)
+            await measure("asyncpg + uow", repo, turns, llm_seconds, turn=run_turn_uow)
+            repo.journal = MessageJournal(repo)
+            await measure("asyncpg + journal", repo, turns, llm_seconds, turn=run_turn_uow)
+        finally:
+            await repo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=64)
+    parser.add_argument("--db-latency-ms", type=float, default=8.0)
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--database-url", default="")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.db_latency_ms, args.llm_ms, args.database_url))
@@ -0,0 +1,67 @@
+"""
+Benchmark: tokens de los datos del lead en los prompts, repr vs bloque compacto.
+
+Uso:
+    python -m benchmarks.prompt_encoding --agents 4
+
+Recorre conversaciones grabadas (estado FSM y datos del lead por turno) y
+compara, con el estimador local de tokens, el repr del dict que se
+interpolaba antes contra `render_lead`, más el bloque estado/objetivo del
+agente conversacional. `--agents` es cuántos agentes reciben los datos
+del lead por turno (router, extractor, calificador, conversacional).
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from src.agents.conversational import DEFAULT_OBJECTIVE, STATE_BLOCKS, STATE_OBJECTIVES
+from src.agents.prompt_encoding import render_lead, render_objective
+from src.utils import count_tokens
+
+
+CONVERSATIONS_PATH = Path(__file__).parent / "data" / "conversations.jsonl"
+
+# Bloque estado/objetivo tal como se interpolaba antes
+LEGACY_STATE_BLOCK = "ESTADO ACTUAL DE LA VENTA: {estado} (Sigue el objetivo de este estado)\nOBJETIVO INMEDIATO: {objetivo}"
+
+
+def load_conversations(path: Path) -> list:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(agents: int) -> None:
+    conversations = load_conversations(CONVERSATIONS_PATH)
+    before = after = turns = 0
+    encode_seconds = 0.0
+    for conversation in conversations:
+        for turn in conversation["turns"]:
+            state, lead_data = turn["fsm_state"], turn["lead_data"]
+            legacy_state = LEGACY_STATE_BLOCK.format(
+                estado=state, objetivo=STATE_OBJECTIVES.get(state, DEFAULT_OBJECTIVE)
+            )
+            before += agents * count_tokens(str(lead_data or {})) + count_tokens(legacy_state)
+
+            # Cada agente del turno renderiza el bloque
+            for _ in range(agents):
+                started = time.perf_counter()
+                encoded = render_lead(lead_data)
+                encode_seconds += time.perf_counter() - started
+            state_block = STATE_BLOCKS.get(state) or render_objective(state, DEFAULT_OBJECTIVE)
+            after += agents * count_tokens(encoded) + count_tokens(state_block)
+            turns += 1
+
+    print(
+        f"{len(conversations)} conversaciones, {turns} turnos, {agents} agentes/turno\n"
+        f"tokens de entrada: antes={before} después={after} "
+        f"ahorro={before - after} ({(before - after) / before:.1%}, {(before - after) / turns:.1f}/turno)\n"
+        f"render_lead: {encode_seconds / (turns * agents) * 1e6:.1f}µs/llamada"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, default=4)
+    args = parser.parse_args()
+    main(args.agents)
@@ -0,0 +1,59 @@
+"""
+Benchmark: pre-extracción determinista contra un set etiquetado.
+
+Uso:
+    python -m benchmarks.rule_extractor --repeat 200
+
+Reporta la latencia por mensaje de las reglas, la fracción de mensajes que
+aún necesitarían el extractor LLM y los campos que no coinciden con lo
+esperado.
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from src.agents.rule_extractor import extract_with_rules
+
+
+SAMPLES_PATH = Path(__file__).parent / "data" / "extraction_samples.jsonl"
+
+
+def load_samples(path: Path) -> list:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(repeat: int) -> None:
+    samples = load_samples(SAMPLES_PATH)
+    timings = []
+    needs_llm = exact = 0
+    errors = []
+    for sample in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = extract_with_rules(sample["text"])
+            timings.append(time.perf_counter() - started)
+        needs_llm += result.needs_llm
+        if result.data == sample["expected"] and result.needs_llm == sample.get("needs_llm", False):
+            exact += 1
+        else:
+            errors.append((sample["text"], sample["expected"], result.data, result.reasons))
+
+    ordered = sorted(timings)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(
+        f"{len(samples)} mensajes: p50={statistics.median(timings) * 1e6:6.1f}µs "
+        f"p99={p99 * 1e6:6.1f}µs necesitan LLM={needs_llm / len(samples):6.1%} "
+        f"exactos={exact}/{len(samples)}"
+    )
+    for text, expected, got, reasons in errors:
+        print(f"    ✗ {text!r}: esperado={expected} obtenido={got} {reasons}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.repeat)
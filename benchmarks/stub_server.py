@@ -0,0 +1,79 @@
+"""
+Servidor HTTP/1.1 mínimo que imita /chat/completions de DeepSeek.
+Sirve para medir el cliente sin red ni API key.
+"""
+import asyncio
+import json
+from typing import Optional
+
+
+COMPLETION = {
+    "choices": [{"message": {"role": "assistant", "content": "{\"ok\": true}"}}],
+    "usage": {"prompt_tokens": 120, "completion_tokens": 8, "total_tokens": 128},
+}
+
+
+class StubServer:
+    """
+    Stub con keep-alive.
+    `handshake_ms` simula el costo de handshake (TLS) en cada conexión nueva;
+    `latency_ms` simula el tiempo de generación por request.
+    """
+
+    def __init__(self, handshake_ms: float = 0, latency_ms: float = 0):
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> "StubServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    def respond(self, path: str, body: bytes) -> bytes:
+        """Cuerpo de la respuesta; las subclases pueden cambiarlo."""
+        return json.dumps(COMPLETION).encode()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        if self.handshake_ms:
+            await asyncio.sleep(self.handshake_ms / 1000)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                path = request_line.split()[1].decode()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                payload = self.respond(path, body)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -4,6 +4,8 @@ from .extractor import extractor_agent, ExtractorAgent
 from .qualifier import qualifier_agent, QualifierAgent
 from .conversational import conversational_agent, ConversationalAgent
 from .scheduler import scheduler_agent, SchedulerAgent
+from .analyzer import analyzer_agent, AnalyzerAgent
+from .summarizer import summarizer_agent, SummarizerAgent
 
 __all__ = [
     "router_agent",
@@ -16,4 +18,8 @@ __all__ = [
     "ConversationalAgent",
     "scheduler_agent",
     "SchedulerAgent",
+    "analyzer_agent",
+    "AnalyzerAgent",
+    "summarizer_agent",
+    "SummarizerAgent",
 ]
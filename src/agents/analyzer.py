@@ -0,0 +1,125 @@
+"""
+Agente Analizador: análisis del turno en una sola llamada.
+Fusiona router, extractor y calificador: clasifica la intención, extrae
+datos del lead y evalúa BANT con una única respuesta JSON.
+"""
+from ..integrations.deepseek import deepseek_client
+from ..integrations.resilience import DeepSeekError
+from ..models import RouterResult, TurnAnalysis, ConversationContext
+from ..config import IntentTypes, settings
+from .context_builder import build_history
+from .prompt_encoding import render_lead
+from .router import RouterAgent
+from .extractor import ExtractorAgent
+from .qualifier import QualifierAgent
+
+
+ANALYZER_SYSTEM_PROMPT = """Eres el **Agente Analizador de Mi IA Colombia**. En cada turno de una conversación de ventas por WhatsApp haces tres tareas y respondes un solo JSON.
+
+CONTEXTO DE LA EMPRESA:
+- Mi IA Colombia vende sistemas de IA personalizados (apps web con IA, agentes de ventas, automatización).
+- Mercado: empresas colombianas (PYMEs y medianas). Presupuestos típicos: $5M - $100M COP.
+
+TAREA 1 - INTENCIÓN del mensaje actual:
+- saludo, expresion_interes, pregunta_servicio, pregunta_precio, objecion, solicitud_agendar,
+  info_personal, punto_dolor, no_interesado, fuera_tema, confirmacion, rechazo
+
+TAREA 2 - EXTRACCIÓN de datos explícitos del usuario (NO inventes, NO asumas):
+- nombre, empresa, cargo, ciudad (en Colombia), email
+- puntos_dolor: lista de frases cortas con los problemas
+- presupuesto_min / presupuesto_max: número en COP sin puntos ni comas
+  ("15 millones" -> 15000000, "30 palos" -> 30000000, "10M" -> 10000000, "200 mil" -> 200000)
+- urgencia: "baja", "media", "alta", "urgente"
+  ("para ayer", "ya", "urgente" -> "urgente"; "este mes", "pronto" -> "alta"; "viendo opciones", "sin afán" -> "baja")
+Solo incluye campos con información nueva o mejor que la ya conocida.
+
+TAREA 3 - CALIFICACIÓN BANT (solo si el contexto dice CALIFICAR: sí; si no, "bant": null):
+- budget (0-25): 25 presupuesto confirmado >$10M; 20 "tengo recursos"; 15 pide cotización; 10 no sabe precios pero la empresa sugiere capacidad; 0 "no tengo plata".
+- authority (0-25): 25 dueño/gerente/fundador; 20 director/jefe de área; 10 empleado buscando para su jefe; 0 estudiante o curioso.
+- need (0-25): 25 problema urgente ("pierdo clientes"); 20 quiere modernizar/automatizar; 10 curiosidad general; 0 no sabe qué quiere.
+- timing (0-25): 25 "para ya", "este mes"; 20 "próximo mes"; 10 "este año", "solo mirando"; 0 futuro lejano.
+
+En un mensaje aparte recibes el estado FSM, los datos ya conocidos del lead y si debes calificar.
+
+Responde SOLO el JSON (sin markdown) con este formato exacto:
+{
+  "intencion": {
+    "intencion_primaria": "...",
+    "intencion_secundaria": null,
+    "contiene_dato_extraible": true/false,
+    "datos_detectados": {},
+    "siguiente_estado_sugerido": "...",
+    "confianza": 0.0-1.0
+  },
+  "datos": {
+    "nombre": "...", "empresa": "...", "cargo": "...", "ciudad": "...", "email": "...",
+    "puntos_dolor": ["..."], "presupuesto_min": 10000000, "presupuesto_max": 20000000, "urgencia": "media"
+  },
+  "bant": {
+    "budget_score": 0-25, "budget_justification": "...",
+    "authority_score": 0-25, "authority_justification": "...",
+    "need_score": 0-25, "need_justification": "...",
+    "timing_score": 0-25, "timing_justification": "..."
+  }
+}"""
+
+
+# Contexto dinámico, después del prompt estático (prefijo cacheable)
+ANALYZER_CONTEXT_TEMPLATE = """ESTADO ACTUAL FSM: {estado_actual}
+CALIFICAR: {calificar}
+DATOS YA CONOCIDOS:
+{datos_lead}"""
+
+
+class AnalyzerAgent:
+    """Agente que reemplaza router, extractor y calificador con una sola llamada."""
+
+    async def analyze(self, context: ConversationContext, qualify: bool = True) -> TurnAnalysis:
+        """
+        Analiza el turno actual.
+        Si el LLM no está disponible retorna intención fuera de tema, sin
+        datos nuevos y sin calificación (el caller conserva el score anterior).
+        """
+        turn_context = ANALYZER_CONTEXT_TEMPLATE.format(
+            estado_actual=context.fsm_state,
+            datos_lead=render_lead(context.lead_data),
+            calificar="sí" if qualify else "no"
+        )
+
+        messages = [
+            {"role": "system", "content": ANALYZER_SYSTEM_PROMPT},
+            {"role": "system", "content": turn_context},
+            {"role": "user", "content": f"CONVERSACIÓN:\n{self._build_conversation(context)}"}
+        ]
+
+        # Llamar a DeepSeek
+        try:
+            result = await deepseek_client.chat_json(
+                messages,
+                agent="analyzer"
+            )
+        except DeepSeekError as e:
+            print(f"⚠️ Analizador sin LLM, usando fallback: {e}")
+            return TurnAnalysis(
+                router=RouterResult(intencion_primaria=IntentTypes.OFF_TOPIC, confianza=0.0)
+            )
+
+        # Validar cada bloque con el parser del agente correspondiente
+        bant = result.get("bant")
+        datos = result.get("datos")
+        return TurnAnalysis(
+            router=RouterAgent.parse_result(result.get("intencion") or {}),
+            lead_data=ExtractorAgent.parse_result(datos or {}),
+            bant=QualifierAgent.parse_result(bant) if qualify and isinstance(bant, dict) else None,
+            extraction_done=isinstance(datos, dict)
+        )
+
+    def _build_conversation(self, context: ConversationContext) -> str:
+        """Construye el historial de conversación con el mensaje actual al final."""
+        lines = build_history(context, "analyzer", settings.context_budget_analyzer)
+        lines.append(f"Usuario (mensaje actual): {context.current_message}")
+        return "\n".join(lines)
+
+
+# Instancia global
+analyzer_agent = AnalyzerAgent()
@@ -0,0 +1,65 @@
+"""
+Armado del historial de conversación para los prompts de los agentes.
+Cada agente tiene un presupuesto de tokens (CONTEXT_BUDGET_*): entran los
+mensajes más recientes que caben y lo ya cubierto por el resumen acumulado
+del lead se reemplaza por ese resumen, así el prompt no crece con la
+conversación.
+"""
+from typing import List, Optional
+
+from ..models import ConversationContext, Message
+from ..utils import count_tokens, metrics
+
+
+ROLE_LABELS = {"inbound": "Usuario", "outbound": "Agente"}
+
+
+def format_message(msg: Message, max_chars: Optional[int] = None) -> str:
+    """Línea "Rol: contenido", recortada a `max_chars` si se indica."""
+    content = msg.content
+    if max_chars and len(content) > max_chars:
+        content = content[:max_chars] + "..."
+    return f"{ROLE_LABELS.get(msg.direction, 'Agente')}: {content}"
+
+
+def build_history(
+    context: ConversationContext,
+    agent: str,
+    budget: int,
+    messages: Optional[List[Message]] = None,
+    with_summary: bool = True,
+    max_chars: Optional[int] = None
+) -> List[str]:
+    """
+    Líneas del historial que caben en `budget` tokens, en orden cronológico.
+    `messages` reemplaza al historial completo (p.ej. el delta incremental).
+    Con `with_summary` y un resumen en el lead, los mensajes que este ya
+    cubre se omiten y el resumen va primero.
+    """
+    if messages is None:
+        messages = context.message_history
+    header = None
+    if with_summary and context.conversation_summary:
+        header = f"(Resumen de lo anterior: {context.conversation_summary})"
+        if context.summary_watermark is not None:
+            # Mismo criterio que unsummarized_history, válido también para copias
+            watermark = context.summary_watermark.astimezone()
+            messages = [m for m in messages if m.created_at.astimezone() > watermark]
+
+    used = count_tokens(header) if header else 0
+    lines = []
+    for msg in reversed(messages):
+        line = format_message(msg, max_chars)
+        cost = count_tokens(line) + 1  # + salto de línea
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    dropped = len(messages) - len(lines)
+    if dropped:
+        metrics.increment("context_messages_dropped", dropped, agent=agent)
+    metrics.observe("context_history_tokens", used, agent=agent)
+
+    lines.reverse()
+    return [header] + lines if header else lines
@@ -2,10 +2,15 @@
 Agente Conversacional: Generador de respuestas.
 Genera respuestas naturales y persuasivas según el estado FSM y contexto.
 """
-from typing import Optional
+import re
+from typing import AsyncIterator, List, Optional, Tuple
 from ..integrations.deepseek import deepseek_client
+from ..integrations.rate_limit import Priority
+from ..integrations.resilience import DeepSeekError
 from ..models import ConversationContext
 from ..config import FSMStates, settings
+from .context_builder import build_history
+from .prompt_encoding import render_lead, render_objective, render_objectives
 
 
 CONVERSATIONAL_SYSTEM_PROMPT = """Eres el **Asistente Virtual de Mi IA Colombia**, experto en automatización y ventas B2B.
@@ -32,16 +37,20 @@ PROHIBIDO:
 - Inventar características técnicas que no existen.
 - Prometer resultados numéricos exactos ("venderás 50% más").
 
-ESTADO ACTUAL DE LA VENTA: {estado} (Sigue el objetivo de este estado)
-OBJETIVO INMEDIATO: {objetivo_estado}
+En el siguiente mensaje recibes el estado de la venta y su objetivo (síguelo), los datos del lead y el historial reciente.
+Responde como el asistente ideal: útil, breve y persuasivo."""
+
 
-DATOS QUE YA SABES DEL LEAD:
+# Contexto dinámico del turno. Va en un mensaje aparte, después del prompt
+# estático, para que el prefijo del prompt sea idéntico entre llamadas y
+# DeepSeek lo sirva desde su cache de contexto.
+CONVERSATIONAL_CONTEXT_TEMPLATE = """{estado_objetivo}
+
+DATOS DEL LEAD:
 {lead_data}
 
 HISTORIAL RECIENTE:
-{conversacion}
-
-Responde como el asistente ideal: útil, breve y persuasivo."""
+{conversacion}"""
 
 
 # Objetivos por estado
@@ -55,6 +64,46 @@ STATE_OBJECTIVES = {
     FSMStates.NUTRICION: "Mantener el engagement, ofrecer valor, y dejar la puerta abierta.",
     FSMStates.DESCARTADO: "Despedirse amablemente y dejar la puerta abierta para el futuro."
 }
+DEFAULT_OBJECTIVE = "Responder de forma útil y guiar hacia agendar."
+
+# Bloques "estado/objetivo" ya renderizados (idénticos entre llamadas)
+STATE_BLOCKS = render_objectives(STATE_OBJECTIVES)
+
+
+# Respuestas de respaldo cuando DeepSeek no está disponible
+FALLBACK_RESPONSES = {
+    FSMStates.BIENVENIDA: (
+        f"¡Hola! 👋 Soy el asistente virtual de {settings.company_name}. "
+        "Ayudamos a empresas a crecer con inteligencia artificial. ¿En qué puedo ayudarte hoy?"
+    ),
+    FSMStates.EXTRACCION_DATOS: "¡Gracias por contarme! ¿Me compartes tu nombre y el de tu empresa para entender mejor tu caso?",
+    FSMStates.DESCARTADO: "Gracias por tu tiempo. Si en el futuro necesitas apoyo con IA o automatización, aquí estaremos.",
+}
+DEFAULT_FALLBACK_RESPONSE = (
+    "Gracias por tu mensaje. Para darte información precisa, "
+    "¿te gustaría agendar una llamada de 15 minutos con nuestro equipo?"
+)
+
+
+def fallback_response(state: str) -> str:
+    """Respuesta plantilla para el estado cuando el LLM falla rápido."""
+    return FALLBACK_RESPONSES.get(state, DEFAULT_FALLBACK_RESPONSE)
+
+
+# Fin de párrafo / fin de oración para cortar el streaming en segmentos
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+")
+
+
+def split_ready_segments(buffer: str, unit: str = "paragraph") -> Tuple[List[str], str]:
+    """
+    Separa del buffer los segmentos ya completos.
+    Retorna (segmentos listos, resto pendiente).
+    """
+    pattern = SENTENCE_BREAK if unit == "sentence" else PARAGRAPH_BREAK
+    parts = pattern.split(buffer)
+    ready = [p.strip() for p in parts[:-1] if p.strip()]
+    return ready, parts[-1]
 
 
 class ConversationalAgent:
@@ -66,33 +115,75 @@ class ConversationalAgent:
         state: str = None
     ) -> str:
         """Genera una respuesta para el estado actual."""
+        messages = self._build_messages(context, state)
         
+        # Llamar a DeepSeek
+        try:
+            response = await deepseek_client.chat_completion(
+                messages=messages,
+                agent="conversational",
+                priority=Priority.REPLY
+            )
+        except DeepSeekError as e:
+            print(f"⚠️ Respuesta de respaldo, LLM no disponible: {e}")
+            return fallback_response(state or context.fsm_state)
+        
+        return response.strip()
+    
+    async def generate_response_stream(
+        self,
+        context: ConversationContext,
+        state: str = None,
+        unit: str = None
+    ) -> AsyncIterator[str]:
+        """
+        Genera la respuesta en streaming, entregando cada párrafo (u oración)
+        en cuanto está completo para que guardrails y envío empiecen antes.
+        """
+        unit = unit or settings.stream_segment_unit
+        messages = self._build_messages(context, state)
+        
+        buffer = ""
+        delivered = False
+        try:
+            async for delta in deepseek_client.chat_completion_stream(
+                messages=messages,
+                agent="conversational",
+                priority=Priority.REPLY
+            ):
+                buffer += delta
+                ready, buffer = split_ready_segments(buffer, unit)
+                for segment in ready:
+                    delivered = True
+                    yield segment
+        except DeepSeekError as e:
+            print(f"⚠️ Streaming interrumpido, LLM no disponible: {e}")
+            if not delivered and not buffer.strip():
+                yield fallback_response(state or context.fsm_state)
+                return
+        
+        if buffer.strip():
+            yield buffer.strip()
+    
+    def _build_messages(self, context: ConversationContext, state: str = None) -> List[dict]:
+        """Construye el prompt para el estado actual."""
         current_state = state or context.fsm_state
-        objetivo = STATE_OBJECTIVES.get(current_state, "Responder de forma útil y guiar hacia agendar.")
+        estado_objetivo = STATE_BLOCKS.get(current_state) or render_objective(current_state, DEFAULT_OBJECTIVE)
         
         # Construir conversación
         conversation = self._build_conversation(context)
         
-        system_prompt = CONVERSATIONAL_SYSTEM_PROMPT.format(
-            estado=current_state,
-            lead_data=context.lead_data or {},
-            objetivo_estado=objetivo,
+        turn_context = CONVERSATIONAL_CONTEXT_TEMPLATE.format(
+            estado_objetivo=estado_objetivo,
+            lead_data=render_lead(context.lead_data),
             conversacion=conversation
         )
         
-        messages = [
-            {"role": "system", "content": system_prompt},
+        return [
+            {"role": "system", "content": CONVERSATIONAL_SYSTEM_PROMPT},
+            {"role": "system", "content": turn_context},
             {"role": "user", "content": context.current_message}
         ]
-        
-        # Llamar a DeepSeek
-        response = await deepseek_client.chat_completion(
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
-        )
-        
-        return response.strip()
     
     async def generate_welcome(self) -> str:
         """Genera mensaje de bienvenida estándar."""
@@ -143,10 +234,7 @@ Te enviaré un recordatorio antes de la llamada. ¡Hasta pronto! 🚀"""
         if not context.message_history:
             return "(Nueva conversación)"
         
-        lines = []
-        for msg in context.message_history[-5:]:  # Últimos 5 mensajes
-            role = "Usuario" if msg.direction == "inbound" else "Agente"
-            lines.append(f"{role}: {msg.content}")
+        lines = build_history(context, "conversational", settings.context_budget_conversational)
         
         return "\n".join(lines)
 
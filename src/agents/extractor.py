@@ -1,10 +1,21 @@
 """
 Agente Extractor: Extracción de datos del lead.
 Extrae entidades nombradas y datos estructurados de la conversación.
+
+En modo incremental solo se envían los datos ya conocidos y los mensajes
+posteriores al watermark del lead (la última extracción exitosa), en vez
+de todo el historial en cada turno.
 """
-from typing import Optional
-from ..integrations.deepseek import deepseek_client
-from ..models import LeadData, ConversationContext
+import time
+from typing import List, Optional, Tuple
+from ..integrations.deepseek import deepseek_client, estimate_tokens
+from ..integrations.resilience import DeepSeekError
+from ..models import LeadData, ConversationContext, Message
+from ..config import FSMStates, settings
+from ..utils import metrics
+from .context_builder import build_history
+from .prompt_encoding import render_lead
+from .rule_extractor import LLM_PREFERRED_FIELDS, extract_with_rules
 
 
 EXTRACTOR_SYSTEM_PROMPT = """Eres el **Agente Extractor de Mi IA Colombia**. Tu misión es convertir conversación natural en datos estructurados JSON.
@@ -35,11 +46,10 @@ REGLAS DE NORMALIZACIÓN (CRÍTICO):
    - "viendo opciones", "sin afán" -> "baja"
 3. **Puntos de Dolor:** Extrae frases cortas que describan el problema.
 
-DATOS YA CONOCIDOS (Solo actualiza si hay nueva información mejor):
-{datos_actuales}
+En un mensaje aparte recibes los DATOS YA CONOCIDOS del lead. Solo actualízalos si hay nueva información mejor.
 
 RESPONDE SOLO EL JSON (Sin markdown):
-{{
+{
   "nombre": "...",
   "empresa": "...",
   "cargo": "...",
@@ -49,7 +59,27 @@ RESPONDE SOLO EL JSON (Sin markdown):
   "presupuesto_min": 10000000,
   "presupuesto_max": 20000000,
   "urgencia": "media"
-}}"""
+}"""
+
+
+# Contexto dinámico, después del prompt estático (prefijo cacheable)
+EXTRACTOR_CONTEXT_TEMPLATE = """DATOS YA CONOCIDOS:
+{datos_actuales}"""
+
+
+def history_window(context: ConversationContext, agent: str) -> List[Message]:
+    """
+    Historial a enviar al LLM: completo, o solo el delta desde el watermark
+    en modo incremental (contando los tokens de prompt que se evitan).
+    """
+    if not settings.incremental_extraction:
+        return context.message_history
+    window = context.unextracted_history
+    skipped = [m for m in context.message_history if m not in window]
+    if skipped:
+        avoided = estimate_tokens([{"content": f"Usuario: {m.content}"} for m in skipped])
+        metrics.increment("prompt_tokens_avoided", avoided, agent=agent)
+    return window
 
 
 class ExtractorAgent:
@@ -57,24 +87,76 @@ class ExtractorAgent:
     
     async def extract(self, context: ConversationContext) -> LeadData:
         """Extrae datos del lead de la conversación actual."""
+        lead_data, _ = await self.extract_with_status(context)
+        return lead_data
+    
+    async def extract_with_status(self, context: ConversationContext) -> Tuple[LeadData, bool]:
+        """
+        Extrae datos del lead y retorna (datos, delta_cubierto).
+        Primero aplica las reglas deterministas al mensaje; el LLM solo se
+        llama si quedan datos sin cubrir, algo es ambiguo o hay mensajes
+        anteriores aún sin extraer. Lo que resolvieron las reglas prevalece
+        sobre su respuesta salvo en campos difusos como la urgencia, donde
+        solo llenan vacíos. `delta_cubierto` indica que todos los
+        mensajes hasta el actual quedaron extraídos (avanza el watermark).
+        """
+        window = history_window(context, "extractor")
+        rules = None
+        if settings.rule_extraction_enabled:
+            started = time.perf_counter()
+            rules = extract_with_rules(context.current_message)
+            metrics.observe("rule_extraction_seconds", time.perf_counter() - started)
+            metrics.increment("rule_extraction_fields", len(rules.data))
+            # Sin modo incremental el watermark no avanza: solo cuenta el mensaje actual
+            pending = settings.incremental_extraction and any(
+                m.direction == "inbound" for m in context.unextracted_history
+            )
+            if not (rules.needs_llm or pending or self._awaiting_identity(context)):
+                metrics.increment("llm_calls_saved", reason="rule_extraction")
+                return LeadData(**rules.data), True
+        rule_data = rules.data if rules is not None else {}
         
         # Construir historial de conversación
-        conversation = self._build_conversation(context)
+        conversation = self._build_conversation(context, window)
         
-        # Prompt con datos actuales
-        system_prompt = EXTRACTOR_SYSTEM_PROMPT.format(
-            datos_actuales=context.lead_data or {}
+        # Prompt estático + datos actuales
+        turn_context = EXTRACTOR_CONTEXT_TEMPLATE.format(
+            datos_actuales=render_lead(context.lead_data)
         )
         
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": EXTRACTOR_SYSTEM_PROMPT},
+            {"role": "system", "content": turn_context},
             {"role": "user", "content": f"CONVERSACIÓN:\n{conversation}"}
         ]
         
         # Llamar a DeepSeek
-        result = await deepseek_client.chat_json(messages, temperature=0.1)
+        try:
+            result = await deepseek_client.chat_json(
+                messages,
+                agent="extractor"
+            )
+        except DeepSeekError as e:
+            # Sin datos nuevos este turno; se reintenta en el siguiente
+            print(f"⚠️ Extractor sin LLM: {e}")
+            return LeadData(**rule_data), False
         
-        # Parsear resultado
+        llm_data = self.parse_result(result).model_dump(exclude_none=True)
+        merged = {**llm_data, **rule_data}
+        merged.update({k: llm_data[k] for k in LLM_PREFERRED_FIELDS if k in llm_data})
+        return LeadData(**merged), True
+    
+    @staticmethod
+    def _awaiting_identity(context: ConversationContext) -> bool:
+        """En extracción de datos sin nombre o empresa, la respuesta puede traerlos."""
+        lead = context.lead_data or {}
+        return context.fsm_state == FSMStates.EXTRACCION_DATOS and not (
+            lead.get("nombre") and lead.get("empresa")
+        )
+    
+    @staticmethod
+    def parse_result(result: dict) -> LeadData:
+        """Valida el JSON del LLM como LeadData, ignorando campos vacíos."""
         try:
             # Filtrar valores null
             clean_data = {
@@ -86,13 +168,13 @@ class ExtractorAgent:
             print(f"Error parsing extractor result: {e}")
             return LeadData()
     
-    def _build_conversation(self, context: ConversationContext) -> str:
-        """Construye el historial de conversación."""
-        lines = []
-        
-        for msg in context.message_history:
-            role = "Usuario" if msg.direction == "inbound" else "Agente"
-            lines.append(f"{role}: {msg.content}")
+    def _build_conversation(self, context: ConversationContext, window: List[Message]) -> str:
+        """Construye el historial de conversación (completo o el delta incremental)."""
+        # El delta incremental ya parte de los datos conocidos: sin resumen
+        lines = build_history(
+            context, "extractor", settings.context_budget_extractor,
+            messages=window, with_summary=not settings.incremental_extraction
+        )
         
         # Añadir mensaje actual
         lines.append(f"Usuario: {context.current_message}")
@@ -0,0 +1,205 @@
+"""
+Clasificador local de intención (fast-path del router).
+Mensajes obvios ("hola", "sí", "no me interesa", "el martes a las 10") se
+clasifican en proceso con reglas compiladas y un modelo TF-IDF + regresión
+logística en NumPy; solo si la confianza no alcanza el umbral se llama al
+router LLM.
+"""
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import RouterResult
+from ..config import FSMStates, IntentTypes, settings
+from ..utils import metrics
+from .intent_data import TRAINING_EXAMPLES
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y solo letras/dígitos separados por un espacio."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9ñ]+", text))
+
+
+WEEKDAY = r"(lunes|martes|miercoles|jueves|viernes|sabado|manana|hoy)"
+TIME = r"(a las \d{1,2}|\d{1,2} ?(am|pm)|\d{1,2} \d{2})"
+
+# (intención, patrón sobre el texto normalizado, confianza)
+INTENT_RULES: List[Tuple[str, "re.Pattern", float]] = [
+    (IntentTypes.NOT_INTERESTED, re.compile(
+        r"\bno (me|nos) interesa\b|\bno estoy interesad[oa]\b|\b(dejen|deja) de escribir"
+        r"|\bno me escriban\b|\bborren mi numero\b"
+    ), 0.96),
+    (IntentTypes.GREETING, re.compile(
+        r"^(hola+|holi|buenas|buenos dias|buenas tardes|buenas noches|buen dia|hey|saludos|que mas)"
+        r"( (hola+|como estas|como esta|como van|que tal|buen dia|buenas tardes|buenas noches))*$"
+    ), 0.97),
+    (IntentTypes.CONFIRMATION, re.compile(
+        r"^(si+|si senor|si senora|ok+|okay|okey|dale|listo|perfecto|de una|claro|claro que si"
+        r"|confirmo|vale|correcto|exacto|asi es|me sirve|me parece bien|hagamosle)$"
+    ), 0.95),
+    (IntentTypes.REJECTION, re.compile(r"^(no+|nop|nel|ninguno|ninguna)$"), 0.9),
+]
+
+# Elección de horario: solo es confirmación cuando se ofrecieron horarios
+SLOT_CHOICE = re.compile(
+    rf"^((el|la) )?({WEEKDAY}( .*)?|(opcion )?[1-3]|(la )?(primera|segunda|tercera)( opcion)?)$"
+)
+SCHEDULE_REQUEST = re.compile(rf"\b{WEEKDAY}\b.*\b{TIME}\b")
+
+
+class TfidfLogisticModel:
+    """
+    TF-IDF (palabras + trigramas de caracteres) con regresión logística
+    multinomial entrenada por descenso de gradiente. La confianza se calibra
+    con temperature scaling sobre una partición de validación.
+    """
+
+    def __init__(self, l2: float = 1e-3, epochs: int = 400, learning_rate: float = 2.0):
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.labels: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0)
+        self.weights = np.zeros((0, 0))
+        self.bias = np.zeros(0)
+        self.temperature = 1.0
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        words = normalize(text).split()
+        grams = []
+        for word in words:
+            padded = f" {word} "
+            grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return [f"w:{w}" for w in words] + [f"c:{g}" for g in grams]
+
+    def fit(self, examples: Sequence[Tuple[str, str]]) -> "TfidfLogisticModel":
+        # Temperatura: entrenar sin 1 de cada 5 ejemplos y ajustar sobre ellos
+        train = [e for i, e in enumerate(examples) if i % 5]
+        held_out = [e for i, e in enumerate(examples) if not i % 5]
+        self._train(train)
+        logits = self._logits(self._vectorize([t for t, _ in held_out]))
+        targets = np.array([self.labels.index(label) for _, label in held_out])
+        self.temperature = min(
+            np.arange(0.5, 5.01, 0.25),
+            key=lambda t: self._nll(logits / t, targets)
+        )
+        self._train(examples)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Intención más probable y su probabilidad calibrada."""
+        probs = self._softmax(self._logits(self._vectorize([text])) / self.temperature)[0]
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def _train(self, examples: Sequence[Tuple[str, str]]) -> None:
+        texts = [t for t, _ in examples]
+        self.labels = sorted({label for _, label in examples})
+        documents = [set(self.tokens(t)) for t in texts]
+        self.vocabulary = {tok: i for i, tok in enumerate(sorted(set().union(*documents)))}
+        df = np.zeros(len(self.vocabulary))
+        for doc in documents:
+            df[[self.vocabulary[t] for t in doc]] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + df)) + 1
+
+        x = self._vectorize(texts)
+        y = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        y[np.arange(len(texts)), [self.labels.index(label) for _, label in examples]] = 1
+        self.weights = np.zeros((x.shape[1], len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(self.epochs):
+            grad = (self._softmax(self._logits(x)) - y) / len(texts)
+            self.weights -= self.learning_rate * (x.T @ grad + self.l2 * self.weights)
+            self.bias -= self.learning_rate * grad.sum(axis=0)
+
+    def _vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        x = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for tok in self.tokens(text):
+                col = self.vocabulary.get(tok)
+                if col is not None:
+                    x[row, col] += 1
+        x *= self.idf
+        norms = np.linalg.norm(x, axis=1, keepdims=True)
+        return x / np.where(norms == 0, 1, norms)
+
+    def _logits(self, x: np.ndarray) -> np.ndarray:
+        return x @ self.weights + self.bias
+
+    @staticmethod
+    def _softmax(z: np.ndarray) -> np.ndarray:
+        z = z - z.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def _nll(self, logits: np.ndarray, targets: np.ndarray) -> float:
+        probs = self._softmax(logits)
+        return float(-np.log(probs[np.arange(len(targets)), targets] + 1e-12).mean())
+
+
+class IntentClassifier:
+    """Reglas compiladas + modelo estadístico con umbral de confianza."""
+
+    def __init__(self, threshold: float = None, max_words: int = None):
+        self.threshold = settings.fast_intent_threshold if threshold is None else threshold
+        self.max_words = max_words or settings.fast_intent_max_words
+        self._model: Optional[TfidfLogisticModel] = None
+
+    @property
+    def model(self) -> TfidfLogisticModel:
+        """Modelo entrenado bajo demanda; la app lo entrena en el arranque."""
+        if self._model is None:
+            self._model = TfidfLogisticModel().fit(TRAINING_EXAMPLES)
+        return self._model
+
+    def predict(self, text: str, fsm_state: str = None) -> Tuple[Optional[str], float, str]:
+        """(intención, confianza, fuente) sin aplicar el umbral."""
+        normalized = normalize(text)
+        if not normalized:
+            return None, 0.0, "empty"
+
+        for intent, pattern, confidence in INTENT_RULES:
+            if pattern.search(normalized):
+                return intent, confidence, "rule"
+
+        if fsm_state == FSMStates.CIERRE and SLOT_CHOICE.match(normalized):
+            return IntentTypes.CONFIRMATION, 0.93, "rule"
+        if SCHEDULE_REQUEST.search(normalized):
+            intent = IntentTypes.CONFIRMATION if fsm_state == FSMStates.CIERRE else IntentTypes.SCHEDULE_REQUEST
+            return intent, 0.9, "rule"
+
+        # Mensajes largos suelen mezclar intención y datos: mejor el LLM
+        if len(normalized.split()) > self.max_words:
+            return None, 0.0, "too_long"
+
+        intent, confidence = self.model.predict(text)
+        return intent, confidence, "model"
+
+    def classify(self, text: str, fsm_state: str = None) -> Optional[RouterResult]:
+        """RouterResult si la confianza supera el umbral; None para usar el LLM."""
+        started = time.perf_counter()
+        intent, confidence, source = self.predict(text, fsm_state)
+        metrics.observe("intent_classifier_seconds", time.perf_counter() - started)
+
+        if intent is None or confidence < self.threshold:
+            metrics.increment("router_fast_path_misses")
+            return None
+
+        metrics.increment("router_fast_path_hits", source=source)
+        metrics.increment("llm_calls_saved", reason="fast_intent")
+        return RouterResult(
+            intencion_primaria=intent,
+            contiene_dato_extraible=intent in (IntentTypes.PERSONAL_INFO, IntentTypes.PAIN_POINT),
+            confianza=round(confidence, 4)
+        )
+
+
+# Instancia global
+intent_classifier = IntentClassifier()
@@ -0,0 +1,179 @@
+"""
+Ejemplos etiquetados para el clasificador local de intención.
+Mensajes cortos y típicos de WhatsApp; los mensajes largos o con datos
+mezclados se dejan al router LLM.
+"""
+from ..config import IntentTypes
+
+
+TRAINING_EXAMPLES = [
+    # Saludo
+    ("hola", IntentTypes.GREETING),
+    ("holaa", IntentTypes.GREETING),
+    ("buenas", IntentTypes.GREETING),
+    ("buenos días", IntentTypes.GREETING),
+    ("buenas tardes", IntentTypes.GREETING),
+    ("buenas noches", IntentTypes.GREETING),
+    ("hola buen día", IntentTypes.GREETING),
+    ("hola, cómo estás?", IntentTypes.GREETING),
+    ("hola qué tal", IntentTypes.GREETING),
+    ("qué más, cómo va", IntentTypes.GREETING),
+    ("saludos", IntentTypes.GREETING),
+    ("hey hola", IntentTypes.GREETING),
+    ("buenas tardes, cómo están", IntentTypes.GREETING),
+    ("hola hola", IntentTypes.GREETING),
+
+    # Expresión de interés
+    ("me interesa", IntentTypes.INTEREST),
+    ("me interesa mucho", IntentTypes.INTEREST),
+    ("quiero más información", IntentTypes.INTEREST),
+    ("quiero info", IntentTypes.INTEREST),
+    ("me gustaría saber más", IntentTypes.INTEREST),
+    ("suena interesante", IntentTypes.INTEREST),
+    ("cuéntame más", IntentTypes.INTEREST),
+    ("me llama la atención", IntentTypes.INTEREST),
+    ("quiero un agente de ventas", IntentTypes.INTEREST),
+    ("estoy interesado", IntentTypes.INTEREST),
+    ("estoy interesada en el servicio", IntentTypes.INTEREST),
+    ("vi su anuncio y me interesó", IntentTypes.INTEREST),
+    ("quisiera implementar eso en mi empresa", IntentTypes.INTEREST),
+
+    # Pregunta sobre el servicio
+    ("qué hacen?", IntentTypes.QUESTION_SERVICE),
+    ("a qué se dedican", IntentTypes.QUESTION_SERVICE),
+    ("cómo funciona", IntentTypes.QUESTION_SERVICE),
+    ("cómo funciona el agente", IntentTypes.QUESTION_SERVICE),
+    ("qué servicios ofrecen", IntentTypes.QUESTION_SERVICE),
+    ("eso se conecta con mi crm?", IntentTypes.QUESTION_SERVICE),
+    ("funciona con whatsapp business?", IntentTypes.QUESTION_SERVICE),
+    ("cuánto se demora la implementación", IntentTypes.QUESTION_SERVICE),
+    ("tienen casos de éxito?", IntentTypes.QUESTION_SERVICE),
+    ("qué es un agente sdr", IntentTypes.QUESTION_SERVICE),
+    ("hacen apps web?", IntentTypes.QUESTION_SERVICE),
+    ("el bot responde solo?", IntentTypes.QUESTION_SERVICE),
+    ("qué incluye el servicio", IntentTypes.QUESTION_SERVICE),
+
+    # Pregunta de precio
+    ("cuánto cuesta?", IntentTypes.QUESTION_PRICE),
+    ("cuánto vale", IntentTypes.QUESTION_PRICE),
+    ("qué precio tiene", IntentTypes.QUESTION_PRICE),
+    ("precio?", IntentTypes.QUESTION_PRICE),
+    ("cuánto cobran", IntentTypes.QUESTION_PRICE),
+    ("qué valor tiene el agente", IntentTypes.QUESTION_PRICE),
+    ("me pasas la cotización", IntentTypes.QUESTION_PRICE),
+    ("cuál es el costo", IntentTypes.QUESTION_PRICE),
+    ("manejan planes mensuales?", IntentTypes.QUESTION_PRICE),
+    ("cuánto sale eso", IntentTypes.QUESTION_PRICE),
+    ("tienen precios para pymes", IntentTypes.QUESTION_PRICE),
+    ("rango de precios?", IntentTypes.QUESTION_PRICE),
+
+    # Objeción
+    ("está muy caro", IntentTypes.OBJECTION),
+    ("es mucha plata", IntentTypes.OBJECTION),
+    ("no sé si funcione para mi negocio", IntentTypes.OBJECTION),
+    ("ya tenemos un chatbot", IntentTypes.OBJECTION),
+    ("no confío en los bots", IntentTypes.OBJECTION),
+    ("mis clientes prefieren hablar con personas", IntentTypes.OBJECTION),
+    ("no tengo tiempo para eso", IntentTypes.OBJECTION),
+    ("déjame pensarlo", IntentTypes.OBJECTION),
+    ("lo tengo que consultar", IntentTypes.OBJECTION),
+    ("ahora no tenemos presupuesto", IntentTypes.OBJECTION),
+    ("me da miedo que falle", IntentTypes.OBJECTION),
+    ("suena complicado", IntentTypes.OBJECTION),
+
+    # Solicitud de agendar
+    ("quiero agendar una llamada", IntentTypes.SCHEDULE_REQUEST),
+    ("agendemos", IntentTypes.SCHEDULE_REQUEST),
+    ("podemos hablar por teléfono?", IntentTypes.SCHEDULE_REQUEST),
+    ("me pueden llamar", IntentTypes.SCHEDULE_REQUEST),
+    ("cuándo nos podemos reunir", IntentTypes.SCHEDULE_REQUEST),
+    ("quiero una reunión", IntentTypes.SCHEDULE_REQUEST),
+    ("agenda una cita", IntentTypes.SCHEDULE_REQUEST),
+    ("hagamos una videollamada", IntentTypes.SCHEDULE_REQUEST),
+    ("tienen espacio esta semana?", IntentTypes.SCHEDULE_REQUEST),
+    ("quiero hablar con un asesor", IntentTypes.SCHEDULE_REQUEST),
+    ("llámame mañana", IntentTypes.SCHEDULE_REQUEST),
+    ("me regalas una cita", IntentTypes.SCHEDULE_REQUEST),
+
+    # Información personal
+    ("soy juan", IntentTypes.PERSONAL_INFO),
+    ("me llamo carolina", IntentTypes.PERSONAL_INFO),
+    ("hola, soy andrés de ferretería el tornillo", IntentTypes.PERSONAL_INFO),
+    ("mi nombre es pedro", IntentTypes.PERSONAL_INFO),
+    ("trabajo en una clínica dental", IntentTypes.PERSONAL_INFO),
+    ("soy el gerente", IntentTypes.PERSONAL_INFO),
+    ("soy dueña de una tienda de ropa", IntentTypes.PERSONAL_INFO),
+    ("estamos en medellín", IntentTypes.PERSONAL_INFO),
+    ("somos de bogotá", IntentTypes.PERSONAL_INFO),
+    ("mi empresa se llama inversiones lópez", IntentTypes.PERSONAL_INFO),
+    ("mi correo es juan@empresa.com", IntentTypes.PERSONAL_INFO),
+    ("tenemos 20 empleados", IntentTypes.PERSONAL_INFO),
+
+    # Punto de dolor
+    ("pierdo muchos clientes", IntentTypes.PAIN_POINT),
+    ("no doy abasto con los mensajes", IntentTypes.PAIN_POINT),
+    ("no alcanzamos a responder a tiempo", IntentTypes.PAIN_POINT),
+    ("las ventas están bajas", IntentTypes.PAIN_POINT),
+    ("nos escriben de noche y nadie contesta", IntentTypes.PAIN_POINT),
+    ("el equipo de ventas está saturado", IntentTypes.PAIN_POINT),
+    ("perdemos leads por demora", IntentTypes.PAIN_POINT),
+    ("todo lo hacemos a mano", IntentTypes.PAIN_POINT),
+    ("gastamos mucho tiempo en tareas repetitivas", IntentTypes.PAIN_POINT),
+    ("los clientes se quejan de que no respondemos", IntentTypes.PAIN_POINT),
+    ("necesito automatizar la atención", IntentTypes.PAIN_POINT),
+    ("no tenemos quién atienda el whatsapp", IntentTypes.PAIN_POINT),
+
+    # No interesado
+    ("no me interesa", IntentTypes.NOT_INTERESTED),
+    ("no gracias", IntentTypes.NOT_INTERESTED),
+    ("no estoy interesado", IntentTypes.NOT_INTERESTED),
+    ("no nos interesa", IntentTypes.NOT_INTERESTED),
+    ("no me escriban más", IntentTypes.NOT_INTERESTED),
+    ("borren mi número", IntentTypes.NOT_INTERESTED),
+    ("no quiero nada", IntentTypes.NOT_INTERESTED),
+    ("no necesito eso", IntentTypes.NOT_INTERESTED),
+    ("paso, gracias", IntentTypes.NOT_INTERESTED),
+    ("ya no me interesa", IntentTypes.NOT_INTERESTED),
+    ("dejen de escribirme", IntentTypes.NOT_INTERESTED),
+
+    # Fuera de tema
+    ("qué hora es", IntentTypes.OFF_TOPIC),
+    ("quién ganó el partido", IntentTypes.OFF_TOPIC),
+    ("me ayudas con una tarea", IntentTypes.OFF_TOPIC),
+    ("cuéntame un chiste", IntentTypes.OFF_TOPIC),
+    ("venden celulares?", IntentTypes.OFF_TOPIC),
+    ("número equivocado", IntentTypes.OFF_TOPIC),
+    ("está lloviendo mucho", IntentTypes.OFF_TOPIC),
+    ("busco trabajo", IntentTypes.OFF_TOPIC),
+    ("necesito un préstamo", IntentTypes.OFF_TOPIC),
+    ("cómo se hace un ajiaco", IntentTypes.OFF_TOPIC),
+    ("jajaja", IntentTypes.OFF_TOPIC),
+
+    # Confirmación
+    ("sí", IntentTypes.CONFIRMATION),
+    ("si señor", IntentTypes.CONFIRMATION),
+    ("ok", IntentTypes.CONFIRMATION),
+    ("dale", IntentTypes.CONFIRMATION),
+    ("listo", IntentTypes.CONFIRMATION),
+    ("perfecto", IntentTypes.CONFIRMATION),
+    ("de una", IntentTypes.CONFIRMATION),
+    ("claro que sí", IntentTypes.CONFIRMATION),
+    ("confirmo", IntentTypes.CONFIRMATION),
+    ("me sirve", IntentTypes.CONFIRMATION),
+    ("ese horario me queda bien", IntentTypes.CONFIRMATION),
+    ("el martes a las 10", IntentTypes.CONFIRMATION),
+    ("la primera opción", IntentTypes.CONFIRMATION),
+    ("correcto", IntentTypes.CONFIRMATION),
+
+    # Rechazo
+    ("no", IntentTypes.REJECTION),
+    ("ninguno me sirve", IntentTypes.REJECTION),
+    ("ese día no puedo", IntentTypes.REJECTION),
+    ("no me queda", IntentTypes.REJECTION),
+    ("mejor otro día", IntentTypes.REJECTION),
+    ("a esa hora no", IntentTypes.REJECTION),
+    ("no, así no", IntentTypes.REJECTION),
+    ("esos horarios no me funcionan", IntentTypes.REJECTION),
+    ("no estoy de acuerdo", IntentTypes.REJECTION),
+    ("prefiero que no", IntentTypes.REJECTION),
+]
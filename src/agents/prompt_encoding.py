@@ -0,0 +1,66 @@
+"""
+Codificación compacta de datos en los prompts.
+Los datos del lead se renderizan como un bloque "clave: valor" en orden
+fijo (el de LeadData), sin nulos ni listas vacías, en vez del repr de un
+dict de Python (comillas, None, corchetes). El texto es idéntico entre
+llamadas mientras los datos no cambien. No se cachea: renderizar cuesta
+lo mismo que armar una clave de versión con todos los campos.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from ..models import LeadData
+
+
+# Orden estable: el de LeadData; claves desconocidas al final, alfabéticas
+LEAD_FIELD_ORDER = list(LeadData.model_fields)
+EMPTY_LEAD = "(sin datos)"
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _format_value(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return "; ".join(_format_value(v) for v in value if not _is_empty(v))
+    if isinstance(value, bool):
+        return "sí" if value else "no"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return " ".join(str(value).split())
+
+
+def _ordered_keys(keys: Iterable[str]) -> List[str]:
+    keys = set(keys)
+    known = [k for k in LEAD_FIELD_ORDER if k in keys]
+    return known + sorted(keys - set(known))
+
+
+def _lines(data: dict, prefix: str = "") -> List[str]:
+    lines = []
+    for key in _ordered_keys(data):
+        value = data[key]
+        if _is_empty(value):
+            continue
+        if isinstance(value, dict):
+            # extracted_facts anidados: clave.subclave
+            lines.extend(_lines(value, f"{prefix}{key}."))
+        else:
+            lines.append(f"{prefix}{key}: {_format_value(value)}")
+    return lines
+
+
+def render_lead(lead_data: Optional[dict]) -> str:
+    """Bloque "clave: valor" con los datos conocidos del lead."""
+    lines = _lines(lead_data or {})
+    return "\n".join(lines) if lines else EMPTY_LEAD
+
+
+def render_objective(state: str, objective: str) -> str:
+    """Bloque "estado/objetivo" de la FSM."""
+    return f"estado: {state}\nobjetivo: {objective}"
+
+
+def render_objectives(objectives: Dict[str, str]) -> Dict[str, str]:
+    """Bloques "estado/objetivo" precalculados para todos los estados."""
+    return {state: render_objective(state, objective) for state, objective in objectives.items()}
@@ -1,10 +1,24 @@
 """
 Agente Calificador: Evaluación BANT del lead.
 Calcula el score de calificación para determinar si el lead está listo para cierre.
+
+El score se memoiza por lead: mientras los datos extraídos no cambien y los
+mensajes nuevos no traigan señales BANT (presupuesto, cargo, necesidad,
+plazos), se reutiliza el último score sin llamar al LLM.
 """
+import hashlib
+import json
+import re
+from typing import List, Optional
+
 from ..integrations.deepseek import deepseek_client
-from ..models import BANTScore, ConversationContext
-from ..config import BANT_MIN_SCORE_FOR_CLOSE, BANT_MIN_SCORE_FOR_NURTURE
+from ..models import BANTScore, ConversationContext, Message
+from ..config import BANT_MIN_SCORE_FOR_CLOSE, BANT_MIN_SCORE_FOR_NURTURE, settings
+from ..utils import metrics
+from ..utils.cache import TTLCache
+from .context_builder import build_history
+from .prompt_encoding import render_lead
+from .extractor import history_window
 
 
 QUALIFIER_SYSTEM_PROMPT = """Eres el **Agente Calificador BANT de Mi IA Colombia**. Evalúas la calidad del lead para priorizar esfuerzos.
@@ -40,14 +54,10 @@ CRITERIOS DE PUNTUACIÓN (Total 100 pts):
    - 10: "Este año", "Solo mirando".
    - 0: "Futuro lejano".
 
-DATOS DEL LEAD:
-{lead_data}
-
-HISTORIAL:
-{conversacion}
+En un mensaje aparte recibes los DATOS DEL LEAD y el HISTORIAL de la conversación.
 
 Evalúa y responde JSON:
-{{
+{
   "budget_score": 0-25,
   "budget_justification": "...",
   "authority_score": 0-25,
@@ -56,32 +66,105 @@ Evalúa y responde JSON:
   "need_justification": "...",
   "timing_score": 0-25,
   "timing_justification": "..."
-}}"""
+}"""
+
+
+# Contexto dinámico, después del prompt estático (prefijo cacheable)
+QUALIFIER_CONTEXT_TEMPLATE = """DATOS DEL LEAD:
+{lead_data}
+
+HISTORIAL:
+{conversacion}"""
+
+
+# Señales que pueden mover algún criterio BANT
+BANT_SIGNALS = re.compile(
+    r"presupuesto|precio|cu[aá]nto|costo|cotiza|invers|millon|palos|\bmil\b|\$|\d+\s*[mk]\b"
+    r"|gerente|due[ñn]o|fundador|director|jefe|socio|ceo|encargad"
+    r"|problema|necesit|pierd|perd|automatiz|abasto|dolor"
+    r"|urgent|para ya|pronto|mes\b|semana|trimestre|este a[ñn]o|hoy|ma[ñn]ana",
+    re.IGNORECASE
+)
+
+
+def bant_fingerprint(context: ConversationContext, include_delta: bool = True) -> str:
+    """
+    Hash de las entradas que determinan el score: datos conocidos del lead
+    y el mensaje actual solo si trae señales BANT. Sin `include_delta` es la
+    huella ya con el mensaje absorbido (la que se memoiza tras calificar).
+    """
+    facts = {k: v for k, v in (context.lead_data or {}).items() if v not in (None, "", [])}
+    signals = include_delta and BANT_SIGNALS.search(context.current_message)
+    delta = context.current_message if signals else ""
+    canonical = json.dumps({"facts": facts, "delta": delta}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 
 class QualifierAgent:
     """Agente que califica leads usando framework BANT."""
     
+    def __init__(self):
+        # phone_number -> (huella de las entradas, score)
+        self._memo = TTLCache(
+            max_entries=settings.bant_memo_max_entries,
+            ttl_seconds=settings.bant_memo_ttl_seconds
+        )
+    
+    def cached_score(self, context: ConversationContext) -> Optional[BANTScore]:
+        """Score memoizado si las entradas BANT del lead no cambiaron."""
+        if not settings.bant_memo_enabled:
+            return None
+        entry = self._memo.get(context.phone_number)
+        if entry is None or entry[0] != bant_fingerprint(context):
+            return None
+        metrics.increment("llm_calls_saved", reason="bant_memo")
+        return entry[1]
+    
+    def remember(self, context: ConversationContext, score: BANTScore) -> None:
+        """
+        Memoiza el score bajo la huella de `context`, que debe traer los
+        datos del lead ya extraídos en el turno (los que lo produjeron).
+        """
+        if settings.bant_memo_enabled:
+            self._memo.set(context.phone_number, (bant_fingerprint(context, include_delta=False), score))
+    
     async def qualify(self, context: ConversationContext) -> BANTScore:
-        """Evalúa el lead según criterios BANT."""
+        """
+        Evalúa el lead según criterios BANT (o retorna el score memoizado).
+        Lanza DeepSeekError si el LLM no está disponible: un score en cero
+        descartaría al lead, así que el caller debe conservar el anterior.
+        """
+        cached = self.cached_score(context)
+        if cached is not None:
+            return cached
         
         # Construir conversación
-        conversation = self._build_conversation(context)
+        conversation = self._build_conversation(context, history_window(context, "qualifier"))
         
-        system_prompt = QUALIFIER_SYSTEM_PROMPT.format(
-            lead_data=context.lead_data or {},
+        turn_context = QUALIFIER_CONTEXT_TEMPLATE.format(
+            lead_data=render_lead(context.lead_data),
             conversacion=conversation
         )
         
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": QUALIFIER_SYSTEM_PROMPT},
+            {"role": "system", "content": turn_context},
             {"role": "user", "content": "Evalúa este lead según el framework BANT."}
         ]
         
         # Llamar a DeepSeek
-        result = await deepseek_client.chat_json(messages, temperature=0.2)
+        result = await deepseek_client.chat_json(
+            messages,
+            agent="qualifier"
+        )
         
-        # Parsear resultado
+        score = self.parse_result(result)
+        self.remember(context, score)
+        return score
+    
+    @staticmethod
+    def parse_result(result: dict) -> BANTScore:
+        """Valida el JSON del LLM como BANTScore (cada criterio en 0-25)."""
         try:
             return BANTScore(
                 budget_score=min(25, max(0, int(result.get("budget_score", 0)))),
@@ -110,12 +193,12 @@ class QualifierAgent:
         """Determina si el lead debe descartarse."""
         return score.total_score < BANT_MIN_SCORE_FOR_NURTURE
     
-    def _build_conversation(self, context: ConversationContext) -> str:
-        """Construye el historial de conversación."""
-        lines = []
-        for msg in context.message_history:
-            role = "Usuario" if msg.direction == "inbound" else "Agente"
-            lines.append(f"{role}: {msg.content}")
+    def _build_conversation(self, context: ConversationContext, window: List[Message]) -> str:
+        """Construye el historial de conversación (completo o el delta incremental)."""
+        lines = build_history(
+            context, "qualifier", settings.context_budget_qualifier,
+            messages=window, with_summary=not settings.incremental_extraction
+        )
         lines.append(f"Usuario: {context.current_message}")
         return "\n".join(lines)
 
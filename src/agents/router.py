@@ -4,8 +4,12 @@ Clasifica el mensaje del usuario y sugiere el siguiente estado FSM.
 """
 from typing import Optional
 from ..integrations.deepseek import deepseek_client
+from ..integrations.resilience import DeepSeekError
 from ..models import RouterResult, ConversationContext
-from ..config import FSMStates, IntentTypes
+from ..config import FSMStates, IntentTypes, settings
+from .intent_classifier import intent_classifier
+from .context_builder import build_history
+from .prompt_encoding import render_lead
 
 
 ROUTER_SYSTEM_PROMPT = """Eres un clasificador de intenciones para un agente de ventas de Mi IA Colombia.
@@ -33,44 +37,71 @@ INTENCIONES POSIBLES:
 - confirmacion: Confirma algo (horario, datos, etc)
 - rechazo: Rechaza algo propuesto
 
-ESTADO ACTUAL FSM: {estado_actual}
-DATOS YA EXTRAÍDOS: {datos_lead}
+En un mensaje aparte recibes el estado actual de la FSM y los datos ya extraídos del lead.
 
 Responde SOLO en JSON con este formato exacto:
-{{
+{
   "intencion_primaria": "...",
   "intencion_secundaria": null,
   "contiene_dato_extraible": true/false,
-  "datos_detectados": {{}},
+  "datos_detectados": {},
   "siguiente_estado_sugerido": "...",
   "confianza": 0.0-1.0
-}}"""
+}"""
+
+
+# Contexto dinámico, después del prompt estático (prefijo cacheable)
+ROUTER_CONTEXT_TEMPLATE = """ESTADO ACTUAL FSM: {estado_actual}
+DATOS YA EXTRAÍDOS:
+{datos_lead}"""
 
 
 class RouterAgent:
     """Agente que clasifica la intención del mensaje del usuario."""
     
     async def classify(self, context: ConversationContext) -> RouterResult:
-        """Clasifica la intención del mensaje actual."""
+        """
+        Clasifica la intención del mensaje actual.
+        Los mensajes obvios se resuelven con el clasificador local, sin LLM.
+        """
+        if settings.fast_intent_enabled:
+            fast = intent_classifier.classify(context.current_message, context.fsm_state)
+            if fast is not None:
+                return fast
         
         # Construir historial resumido
         history_summary = self._build_history_summary(context)
         
-        # Prompt con contexto
-        system_prompt = ROUTER_SYSTEM_PROMPT.format(
+        # Prompt estático + contexto del turno
+        turn_context = ROUTER_CONTEXT_TEMPLATE.format(
             estado_actual=context.fsm_state,
-            datos_lead=context.lead_data or {}
+            datos_lead=render_lead(context.lead_data)
         )
         
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+            {"role": "system", "content": turn_context},
             {"role": "user", "content": f"HISTORIAL RECIENTE:\n{history_summary}\n\nMENSAJE ACTUAL:\n{context.current_message}"}
         ]
         
         # Llamar a DeepSeek
-        result = await deepseek_client.chat_json(messages, temperature=0.2)
+        try:
+            result = await deepseek_client.chat_json(
+                messages,
+                agent="router"
+            )
+        except DeepSeekError as e:
+            print(f"⚠️ Router sin LLM, usando fallback: {e}")
+            return RouterResult(
+                intencion_primaria=IntentTypes.OFF_TOPIC,
+                confianza=0.0
+            )
         
-        # Parsear resultado
+        return self.parse_result(result)
+    
+    @staticmethod
+    def parse_result(result: dict) -> RouterResult:
+        """Valida el JSON del LLM como RouterResult."""
         try:
             return RouterResult(
                 intencion_primaria=result.get("intencion_primaria", IntentTypes.OFF_TOPIC),
@@ -92,10 +123,10 @@ class RouterAgent:
         if not context.message_history:
             return "(Sin historial previo)"
         
-        summary = []
-        for msg in context.message_history[-3:]:  # Últimos 3 mensajes
-            role = "Usuario" if msg.direction == "inbound" else "Agente"
-            summary.append(f"{role}: {msg.content[:100]}...")
+        # Solo lo más reciente y recortado: basta para desambiguar la intención
+        summary = build_history(
+            context, "router", settings.context_budget_router, with_summary=False, max_chars=100
+        )
         
         return "\n".join(summary)
 
@@ -0,0 +1,196 @@
+"""
+Pre-extracción determinista de datos del lead.
+Emails, montos en COP ("30 palos", "15 millones", "$8.000.000"), ciudades de
+Colombia y urgencia se resuelven con reglas compiladas en microsegundos. El
+extractor LLM solo se llama si el mensaje trae datos que las reglas no
+cubren (nombre, empresa, cargo, dolores) o si lo detectado es ambiguo.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes, conservando posiciones (mismo largo)."""
+    return "".join(
+        unicodedata.normalize("NFKD", c)[0] for c in text.lower()
+    )
+
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Multiplicadores coloquiales de montos
+AMOUNT_UNITS = {
+    "millones": 1_000_000, "millon": 1_000_000, "palos": 1_000_000, "palo": 1_000_000,
+    "melones": 1_000_000, "mm": 1_000_000, "m": 1_000_000,
+    "mil": 1_000, "k": 1_000,
+}
+AMOUNT = re.compile(
+    r"(?P<money>\$\s*)?(?P<number>\d{1,3}(?:[.']\d{3})+|\d+(?:[.,]\d+)?)"
+    r"(?:\s*(?P<unit>millones|millon|palos|palo|melones|mm|m|mil|k)\b)?"
+)
+BUDGET_CONTEXT = re.compile(
+    r"presupuesto|invert|inversion|pagar|gastar|disponible|tenemos para|tengo para|contamos con"
+    r"|alcanza|cuesta|valor|precio|palos|melones|\$"
+)
+# "entre 10 y 20 millones", "de 15 a 30 palos": la unidad va solo al final
+SHARED_UNIT_RANGE = re.compile(
+    r"(?P<low>\d+(?:[.,]\d+)?)\s*(?:y|a|-|hasta)\s*(?P<high>\d+(?:[.,]\d+)?)"
+    r"\s*(?P<unit>millones|millon|palos|palo|melones|mm|m|mil|k)\b"
+)
+# Palabras que acompañan un monto suelto ("entre 10 y 20 millones", "unos 5 palos está bien")
+AMOUNT_FILLER = {
+    "entre", "y", "a", "de", "desde", "hasta", "unos", "unas", "como", "aprox", "aproximadamente",
+    "maximo", "minimo", "mas", "menos", "o", "esta", "bien", "en", "por", "ahi", "alrededor",
+    "cop", "pesos",
+}
+RANGE = re.compile(r"\bentre\b|\bde\b.*\b(a|hasta)\b|-")
+UPPER_BOUND = re.compile(r"\b(hasta|maximo|max|no mas de|menos de|tope)\b")
+LOWER_BOUND = re.compile(r"\b(desde|minimo|min|mas de|por lo menos|al menos)\b")
+
+# Ciudades de Colombia (y apodos) -> nombre canónico
+CITIES = {
+    "bogota": "Bogotá", "la nevera": "Bogotá",
+    "medellin": "Medellín", "medallo": "Medellín",
+    "cali": "Cali", "barranquilla": "Barranquilla", "curramba": "Barranquilla",
+    "cartagena": "Cartagena", "bucaramanga": "Bucaramanga", "pereira": "Pereira",
+    "manizales": "Manizales", "cucuta": "Cúcuta", "ibague": "Ibagué",
+    "santa marta": "Santa Marta", "villavicencio": "Villavicencio", "pasto": "Pasto",
+    "monteria": "Montería", "neiva": "Neiva", "armenia": "Armenia",
+    "valledupar": "Valledupar", "popayan": "Popayán", "sincelejo": "Sincelejo",
+    "tunja": "Tunja", "envigado": "Envigado", "itagui": "Itagüí",
+    "bello": "Bello", "soacha": "Soacha", "chia": "Chía", "rionegro": "Rionegro",
+    "palmira": "Palmira", "soledad": "Soledad",
+}
+CITY = re.compile(r"\b(" + "|".join(sorted(CITIES, key=len, reverse=True)) + r")\b")
+
+# Urgencia, de la más fuerte a la más débil
+URGENCY_RULES: List[Tuple[str, "re.Pattern"]] = [
+    ("urgente", re.compile(r"\b(para ayer|urgente|urge|ya mismo|de inmediato|inmediatamente|lo antes posible|asap)\b")),
+    ("alta", re.compile(r"\b(este mes|esta semana|pronto|cuanto antes|en estos dias|la proxima semana)\b")),
+    ("media", re.compile(r"\b(proximo mes|el otro mes|en un par de meses|este trimestre|proximo trimestre)\b")),
+    ("baja", re.compile(r"\b(viendo opciones|sin afan|solo mirando|mas adelante|el otro ano|algun dia|cotizando)\b")),
+]
+# Negación justo antes de la señal ("no es urgente", "nada urgente", "no tan pronto")
+NEGATION_BEFORE = re.compile(r"\b(no|nada|sin|tampoco|ni)\s+(?:\w+\s+){0,2}$")
+
+# Campos difusos: el LLM interpreta mejor el matiz; las reglas solo llenan vacíos
+LLM_PREFERRED_FIELDS = {"urgencia"}
+
+# Señales de datos que solo el LLM puede extraer bien
+LLM_CUES = re.compile(
+    r"\b(soy|me llamo|mi nombre|llamo|trabajo|empresa|negocio|compania|somos(?! de)|tenemos una|tengo una"
+    r"|gerente|dueno|duena|fundador|director|jefe|ceo|socio|cargo|encargad"
+    r"|problema|pierd|perd|no doy abasto|no alcanz|necesit\w* (un|una|automatizar|mejorar|ayuda)|dolor|demora"
+    r"|queja|saturad|manual)"
+)
+
+
+# Palabra capitalizada a mitad de frase: posible nombre de persona o empresa
+PROPER_NOUN = re.compile(r"(?<=[\w,;:] )[A-ZÁÉÍÓÚÑ][\wáéíóúñ&.-]+")
+COMMON_CAPITALIZED = {"gracias", "hola", "buenas", "listo", "ok", "si", "dale", "perfecto", "claro", "saludos"}
+
+
+class RuleExtraction(BaseModel):
+    """Resultado de las reglas: campos de LeadData y si hace falta el LLM."""
+    data: Dict = Field(default_factory=dict)
+    needs_llm: bool = False
+    reasons: List[str] = Field(default_factory=list)
+
+
+def _parse_amount(match: "re.Match") -> Optional[int]:
+    number, unit = match.group("number"), match.group("unit")
+    grouped = re.fullmatch(r"\d{1,3}(?:[.']\d{3})+", number)
+    if grouped:
+        value = float(re.sub(r"[.']", "", number))
+    else:
+        value = float(number.replace(",", "."))
+    if unit:
+        value *= AMOUNT_UNITS[unit]
+    elif not (match.group("money") or grouped) or value < 1000:
+        # Número suelto sin unidad, "$" ni separador de miles: no es un monto
+        return None
+    return int(value)
+
+
+def _only_amounts(folded: str) -> bool:
+    """El mensaje es solo el monto (respuesta directa a la pregunta de presupuesto)."""
+    rest = CITY.sub(" ", SHARED_UNIT_RANGE.sub(" ", AMOUNT.sub(" ", folded)))
+    return all(w in AMOUNT_FILLER for w in re.findall(r"[a-zñ]+", rest))
+
+
+def _extract_budget(folded: str, result: RuleExtraction) -> None:
+    shared = SHARED_UNIT_RANGE.search(folded)
+    if shared:
+        unit = AMOUNT_UNITS[shared.group("unit")]
+        amounts = [int(float(shared.group(g).replace(",", ".")) * unit) for g in ("low", "high")]
+    else:
+        amounts = [a for a in (_parse_amount(m) for m in AMOUNT.finditer(folded)) if a]
+    if not amounts:
+        return
+    if not (BUDGET_CONTEXT.search(folded) or _only_amounts(folded)):
+        # Un monto sin contexto puede ser facturación, empleados, seguidores...
+        result.needs_llm = True
+        result.reasons.append("monto_sin_contexto")
+        return
+    if len(amounts) == 2 and (shared or RANGE.search(folded)):
+        result.data["presupuesto_min"], result.data["presupuesto_max"] = sorted(amounts)
+    elif len(amounts) == 1:
+        if UPPER_BOUND.search(folded):
+            result.data["presupuesto_max"] = amounts[0]
+        elif LOWER_BOUND.search(folded):
+            result.data["presupuesto_min"] = amounts[0]
+        else:
+            result.data["presupuesto_min"] = result.data["presupuesto_max"] = amounts[0]
+    else:
+        result.needs_llm = True
+        result.reasons.append("montos_multiples")
+
+
+def _extract_urgency(folded: str, result: RuleExtraction) -> None:
+    cues = [
+        (level, match) for level, pattern in URGENCY_RULES for match in pattern.finditer(folded)
+    ]
+    if any(NEGATION_BEFORE.search(folded[:match.start()]) for _, match in cues):
+        # "no es urgente" no dice qué urgencia tiene: que lo decida el LLM
+        result.needs_llm = True
+        result.reasons.append("urgencia_negada")
+    elif cues:
+        result.data["urgencia"] = cues[0][0]
+
+
+def extract_with_rules(text: str) -> RuleExtraction:
+    """Aplica todas las reglas sobre un mensaje."""
+    result = RuleExtraction()
+    folded = _fold(text)
+
+    emails = EMAIL.findall(text)
+    if emails:
+        result.data["email"] = emails[0].lower()
+    # Sin el email para que su dominio no se lea como ciudad o monto
+    folded = EMAIL.sub(" ", folded)
+
+    _extract_budget(folded, result)
+
+    cities = {CITIES[c] for c in CITY.findall(folded)}
+    if len(cities) == 1:
+        result.data["ciudad"] = cities.pop()
+    elif cities:
+        result.needs_llm = True
+        result.reasons.append("ciudades_multiples")
+
+    _extract_urgency(folded, result)
+
+    if LLM_CUES.search(folded):
+        result.needs_llm = True
+        result.reasons.append("datos_no_cubiertos")
+    elif any(
+        _fold(w) not in CITIES and _fold(w) not in COMMON_CAPITALIZED
+        for w in PROPER_NOUN.findall(EMAIL.sub(" ", text))
+    ):
+        result.needs_llm = True
+        result.reasons.append("nombre_propio")
+
+    return result
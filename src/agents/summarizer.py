@@ -0,0 +1,80 @@
+"""
+Agente de Memoria: Resumen acumulado de la conversación.
+Pliega en un resumen breve los mensajes que ya no caben en la ventana de
+historial de los prompts. Corre en segundo plano con prioridad baja, fuera
+del camino de la respuesta.
+"""
+from typing import List, Optional
+
+from ..integrations.deepseek import deepseek_client
+from ..integrations.rate_limit import Priority
+from ..models import ConversationContext, Message
+from ..config import settings
+from ..utils import count_tokens
+from .context_builder import format_message
+
+
+SUMMARIZER_SYSTEM_PROMPT = """Eres el **Agente de Memoria de Mi IA Colombia**. Mantienes un resumen breve de conversaciones de venta por WhatsApp.
+
+Recibes el RESUMEN ANTERIOR (puede estar vacío) y MENSAJES NUEVOS. Devuelve el resumen actualizado.
+
+REGLAS:
+1. Máximo 80 palabras, en tercera persona, sin saludos ni relleno.
+2. Conserva lo que el usuario preguntó o pidió, sus objeciones, lo que ya se le ofreció y cualquier compromiso.
+3. NO repitas datos estructurados (nombre, empresa, ciudad, presupuesto): se guardan aparte.
+4. NO inventes nada que no esté en el resumen anterior o en los mensajes.
+
+RESPONDE SOLO EL TEXTO DEL RESUMEN."""
+
+
+SUMMARIZER_CONTEXT_TEMPLATE = """RESUMEN ANTERIOR:
+{resumen}
+
+MENSAJES NUEVOS:
+{mensajes}"""
+
+
+class SummarizerAgent:
+    """Agente que mantiene el resumen acumulado de cada conversación."""
+
+    def messages_to_fold(self, context: ConversationContext) -> List[Message]:
+        """
+        Mensajes a plegar en el resumen: cuando lo no resumido supera
+        SUMMARY_TRIGGER_TOKENS, los más antiguos hasta dejar la mitad.
+        """
+        pending = context.unsummarized_history
+        costs = [count_tokens(format_message(m)) for m in pending]
+        total = sum(costs)
+        if total <= settings.summary_trigger_tokens:
+            return []
+
+        keep_under = settings.summary_trigger_tokens // 2
+        fold = 0
+        while fold < len(pending) and total > keep_under:
+            total -= costs[fold]
+            fold += 1
+        return pending[:fold]
+
+    async def summarize(self, previous: Optional[str], messages: List[Message]) -> str:
+        """
+        Resumen actualizado con los mensajes nuevos.
+        Lanza DeepSeekError si el LLM no está disponible (se reintenta luego).
+        """
+        turn_context = SUMMARIZER_CONTEXT_TEMPLATE.format(
+            resumen=previous or "(vacío)",
+            mensajes="\n".join(format_message(m) for m in messages)
+        )
+
+        summary = await deepseek_client.chat_completion(
+            [
+                {"role": "system", "content": SUMMARIZER_SYSTEM_PROMPT},
+                {"role": "user", "content": turn_context}
+            ],
+            agent="summarizer",
+            priority=Priority.BACKGROUND
+        )
+        return summary.strip()
+
+
+# Instancia global
+summarizer_agent = SummarizerAgent()
@@ -2,10 +2,12 @@
 Configuración central del sistema SDR WhatsApp.
 Carga variables de entorno y define constantes del sistema.
 """
+import json
 import os
 from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 # Cargar .env.local primero, luego .env como fallback
 load_dotenv(".env.local")
@@ -18,11 +20,107 @@ class Settings(BaseSettings):
     # DeepSeek API
     deepseek_api_key: str = os.getenv("DEEPSEEK_API_KEY", "")
     deepseek_base_url: str = "https://api.deepseek.com/v1"
-    deepseek_model: str = "deepseek-chat"
+    deepseek_model: str = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+    deepseek_http2: bool = os.getenv("DEEPSEEK_HTTP2", "true").lower() == "true"
+    deepseek_connect_timeout: float = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+    deepseek_read_timeout: float = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "30"))
+    deepseek_total_timeout: float = float(os.getenv("DEEPSEEK_TOTAL_TIMEOUT", "45"))
+    deepseek_max_connections: int = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "50"))
+    deepseek_max_keepalive_connections: int = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    deepseek_keepalive_expiry: float = float(os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", "120"))
+    deepseek_warmup_connections: int = int(os.getenv("DEEPSEEK_WARMUP_CONNECTIONS", "2"))
+    
+    # Resiliencia DeepSeek (reintentos, hedging, circuit breaker)
+    deepseek_max_retries: int = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
+    deepseek_backoff_base: float = float(os.getenv("DEEPSEEK_BACKOFF_BASE", "0.5"))
+    deepseek_backoff_max: float = float(os.getenv("DEEPSEEK_BACKOFF_MAX", "8"))
+    deepseek_hedge_enabled: bool = os.getenv("DEEPSEEK_HEDGE_ENABLED", "false").lower() == "true"
+    deepseek_hedge_percentile: float = float(os.getenv("DEEPSEEK_HEDGE_PERCENTILE", "95"))
+    deepseek_hedge_min_samples: int = int(os.getenv("DEEPSEEK_HEDGE_MIN_SAMPLES", "20"))
+    deepseek_circuit_failure_threshold: int = int(os.getenv("DEEPSEEK_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    deepseek_circuit_recovery_seconds: float = float(os.getenv("DEEPSEEK_CIRCUIT_RECOVERY_SECONDS", "30"))
+    
+    # Control de tráfico al LLM (límites por minuto; 0 = sin límite)
+    llm_rpm_limit: float = float(os.getenv("LLM_RPM_LIMIT", "600"))
+    llm_tpm_limit: float = float(os.getenv("LLM_TPM_LIMIT", "1000000"))
+    llm_concurrency_initial: int = int(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+    llm_concurrency_min: int = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+    llm_concurrency_max: int = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+    llm_latency_target_seconds: float = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "15"))
+    
+    # Perfiles de LLM por agente: JSON que sobreescribe campos de LLMProfile
+    llm_profiles: str = os.getenv("LLM_PROFILES", "")
+    
+    # Cache de respuestas del LLM (TTL en segundos por agente; 0 = sin cache)
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+    llm_cache_shared_backend: bool = os.getenv("LLM_CACHE_SHARED_BACKEND", "true").lower() == "true"
+    llm_cache_ttl_router: float = float(os.getenv("LLM_CACHE_TTL_ROUTER", "3600"))
+    llm_cache_ttl_extractor: float = float(os.getenv("LLM_CACHE_TTL_EXTRACTOR", "0"))
+    llm_cache_ttl_qualifier: float = float(os.getenv("LLM_CACHE_TTL_QUALIFIER", "0"))
+    llm_cache_ttl_conversational: float = float(os.getenv("LLM_CACHE_TTL_CONVERSATIONAL", "600"))
+    llm_cache_ttl_analyzer: float = float(os.getenv("LLM_CACHE_TTL_ANALYZER", "0"))
+    
+    # Análisis del turno en una sola llamada (router + extractor + calificador)
+    fused_turn_analysis: bool = os.getenv("FUSED_TURN_ANALYSIS", "false").lower() == "true"
+    
+    # Borrador de respuesta en paralelo al análisis cuando la transición es predecible
+    speculative_responses: bool = os.getenv("SPECULATIVE_RESPONSES", "true").lower() == "true"
+    
+    # Clasificador local de intención antes del router LLM
+    fast_intent_enabled: bool = os.getenv("FAST_INTENT_ENABLED", "true").lower() == "true"
+    fast_intent_threshold: float = float(os.getenv("FAST_INTENT_THRESHOLD", "0.7"))
+    fast_intent_max_words: int = int(os.getenv("FAST_INTENT_MAX_WORDS", "8"))
+    
+    # Historial en los prompts: presupuesto de tokens por agente y resumen acumulado
+    context_history_messages: int = int(os.getenv("CONTEXT_HISTORY_MESSAGES", "20"))
+    context_budget_router: int = int(os.getenv("CONTEXT_BUDGET_ROUTER", "200"))
+    context_budget_extractor: int = int(os.getenv("CONTEXT_BUDGET_EXTRACTOR", "800"))
+    context_budget_qualifier: int = int(os.getenv("CONTEXT_BUDGET_QUALIFIER", "800"))
+    context_budget_conversational: int = int(os.getenv("CONTEXT_BUDGET_CONVERSATIONAL", "600"))
+    context_budget_analyzer: int = int(os.getenv("CONTEXT_BUDGET_ANALYZER", "800"))
+    conversation_summary_enabled: bool = os.getenv("CONVERSATION_SUMMARY_ENABLED", "true").lower() == "true"
+    summary_trigger_tokens: int = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "400"))
+    summary_max_tokens: int = int(os.getenv("SUMMARY_MAX_TOKENS", "150"))
+    
+    # Extracción incremental: solo los mensajes posteriores al watermark del lead
+    incremental_extraction: bool = os.getenv("INCREMENTAL_EXTRACTION", "true").lower() == "true"
+    
+    # Reglas deterministas antes del extractor LLM
+    rule_extraction_enabled: bool = os.getenv("RULE_EXTRACTION_ENABLED", "true").lower() == "true"
+    
+    # Memoización del score BANT por lead (se recalcula solo si cambian sus entradas)
+    bant_memo_enabled: bool = os.getenv("BANT_MEMO_ENABLED", "true").lower() == "true"
+    bant_memo_ttl_seconds: float = float(os.getenv("BANT_MEMO_TTL_SECONDS", "86400"))
+    bant_memo_max_entries: int = int(os.getenv("BANT_MEMO_MAX_ENTRIES", "10000"))
+    
+    # Streaming de respuestas del agente conversacional
+    stream_responses: bool = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    stream_segment_unit: str = os.getenv("STREAM_SEGMENT_UNIT", "paragraph")  # paragraph | sentence
     
     # Supabase
     supabase_url: str = os.getenv("SUPABASE_URL", "")
     supabase_key: str = os.getenv("SUPABASE_KEY", "")
+    supabase_max_workers: int = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))  # hilos para consultas supabase-py
+    
+    # Postgres directo (asyncpg, opcional): reemplaza la API de Supabase si está definido
+    database_url: str = os.getenv("DATABASE_URL", "")
+    database_pool_min_size: int = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+    database_pool_max_size: int = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+    database_statement_cache_size: int = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))  # 0 tras PgBouncer en modo transacción
+    database_command_timeout: float = float(os.getenv("DATABASE_COMMAND_TIMEOUT", "10"))
+    
+    # Cache read-through de leads por teléfono (invalidado con nuestras escrituras)
+    lead_cache_enabled: bool = os.getenv("LEAD_CACHE_ENABLED", "true").lower() == "true"
+    lead_cache_max_entries: int = int(os.getenv("LEAD_CACHE_MAX_ENTRIES", "5000"))
+    lead_cache_ttl_seconds: float = float(os.getenv("LEAD_CACHE_TTL_SECONDS", "300"))
+    lead_cache_shared_backend: bool = os.getenv("LEAD_CACHE_SHARED_BACKEND", "false").lower() == "true"
+    lead_cache_local_ttl_seconds: float = float(os.getenv("LEAD_CACHE_LOCAL_TTL_SECONDS", "5"))  # L1 con backend compartido
+    
+    # Journal write-behind de mensajes (inserciones en bloque fuera del camino de la respuesta)
+    message_journal_enabled: bool = os.getenv("MESSAGE_JOURNAL_ENABLED", "true").lower() == "true"
+    message_journal_max_batch: int = int(os.getenv("MESSAGE_JOURNAL_MAX_BATCH", "100"))
+    message_journal_flush_interval_seconds: float = float(os.getenv("MESSAGE_JOURNAL_FLUSH_INTERVAL_SECONDS", "0.5"))
     
     # WhatsApp Business API
     whatsapp_token: str = os.getenv("WHATSAPP_TOKEN", "")
@@ -38,6 +136,20 @@ class Settings(BaseSettings):
     upstash_redis_url: Optional[str] = os.getenv("UPSTASH_REDIS_URL")
     upstash_redis_token: Optional[str] = os.getenv("UPSTASH_REDIS_TOKEN")
     
+    # Procesamiento de webhooks (pool de workers en proceso)
+    webhook_async_processing: bool = os.getenv("WEBHOOK_ASYNC_PROCESSING", "true").lower() == "true"
+    worker_pool_size: int = int(os.getenv("WORKER_POOL_SIZE", "8"))
+    worker_queue_max_size: int = int(os.getenv("WORKER_QUEUE_MAX_SIZE", "1000"))
+    worker_drain_timeout_seconds: float = float(os.getenv("WORKER_DRAIN_TIMEOUT_SECONDS", "25"))
+    mailbox_debounce_seconds: float = float(os.getenv("MAILBOX_DEBOUNCE_SECONDS", "1.5"))
+    mailbox_max_wait_seconds: float = float(os.getenv("MAILBOX_MAX_WAIT_SECONDS", "5"))
+    cancel_stale_turns: bool = os.getenv("CANCEL_STALE_TURNS", "true").lower() == "true"
+    
+    # Deduplicación de mensajes por id de WhatsApp
+    dedup_ttl_seconds: float = float(os.getenv("DEDUP_TTL_SECONDS", "86400"))
+    dedup_max_entries: int = int(os.getenv("DEDUP_MAX_ENTRIES", "50000"))
+    dedup_shared_backend: bool = os.getenv("DEDUP_SHARED_BACKEND", "true").lower() == "true"
+
     # Empresa
     company_name: str = "Mi IA Colombia"
     company_timezone: str = "America/Bogota"
@@ -52,6 +164,71 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+class LLMProfile(BaseModel):
+    """Parámetros del LLM para un agente: modelo, salida, timeout, cache y tarifa."""
+    name: str = "default"
+    model: str = settings.deepseek_model
+    max_tokens: int = 1024
+    temperature: float = 0.3
+    timeout_seconds: float = settings.deepseek_total_timeout
+    cache_ttl: float = 0
+    # USD por millón de tokens (ajustar a la tarifa vigente del modelo)
+    input_price: float = 0.28
+    cached_input_price: float = 0.028
+    output_price: float = 0.42
+
+
+# Perfiles por agente. LLM_PROFILES los ajusta sin tocar código, p.ej.:
+# LLM_PROFILES='{"router": {"model": "deepseek-chat", "max_tokens": 120}}'
+DEFAULT_LLM_PROFILES = {
+    "router": {"max_tokens": 200, "temperature": 0.2, "timeout_seconds": 15,
+               "cache_ttl": settings.llm_cache_ttl_router},
+    "extractor": {"max_tokens": 400, "temperature": 0.1, "timeout_seconds": 20,
+                  "cache_ttl": settings.llm_cache_ttl_extractor},
+    "qualifier": {"max_tokens": 400, "temperature": 0.2, "timeout_seconds": 20,
+                  "cache_ttl": settings.llm_cache_ttl_qualifier},
+    "conversational": {"max_tokens": 300, "temperature": 0.7, "timeout_seconds": 30,
+                       "cache_ttl": settings.llm_cache_ttl_conversational},
+    "analyzer": {"max_tokens": 700, "temperature": 0.1, "timeout_seconds": 30,
+                 "cache_ttl": settings.llm_cache_ttl_analyzer},
+    "summarizer": {"max_tokens": settings.summary_max_tokens, "temperature": 0.2},
+}
+
+
+def _load_llm_profiles() -> Dict[str, LLMProfile]:
+    overrides = {}
+    if settings.llm_profiles:
+        try:
+            overrides = json.loads(settings.llm_profiles)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ LLM_PROFILES no es JSON válido, usando perfiles por defecto: {e}")
+        if not isinstance(overrides, dict):
+            print("⚠️ LLM_PROFILES debe ser un objeto JSON {perfil: {...}}, usando perfiles por defecto")
+            overrides = {}
+    
+    profiles = {}
+    for name in {"default", *DEFAULT_LLM_PROFILES, *overrides}:
+        defaults = DEFAULT_LLM_PROFILES.get(name, {})
+        override = overrides.get(name, {})
+        try:
+            if not isinstance(override, dict):
+                raise TypeError(f"se esperaba un objeto, llegó {type(override).__name__}")
+            profiles[name] = LLMProfile(name=name, **{**defaults, **override})
+        except (ValidationError, TypeError) as e:
+            print(f"⚠️ Perfil LLM '{name}' inválido, usando el de por defecto: {e}")
+            profiles[name] = LLMProfile(name=name, **defaults)
+    return profiles
+
+
+# Registro global de perfiles
+LLM_PROFILES = _load_llm_profiles()
+
+
+def get_llm_profile(agent: str) -> LLMProfile:
+    """Perfil del agente, o el perfil `default` si no tiene uno propio."""
+    return LLM_PROFILES.get(agent) or LLM_PROFILES["default"]
+
+
 # Estados de la FSM
 class FSMStates:
     """Constantes para los estados de la máquina de estados finitos."""
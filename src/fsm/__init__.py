@@ -10,7 +10,10 @@ from .graph import (
     AgentState,
     conversation_graph,
     process_message,
-    build_conversation_graph
+    build_conversation_graph,
+    cancel_turn,
+    cancel_summary_updates,
+    TurnCancelled
 )
 
 __all__ = [
@@ -23,4 +26,7 @@ __all__ = [
     "conversation_graph",
     "process_message",
     "build_conversation_graph",
+    "cancel_turn",
+    "cancel_summary_updates",
+    "TurnCancelled",
 ]
@@ -1,22 +1,52 @@
 """
 Grafo LangGraph para orquestación del sistema multi-agente.
 Define el flujo de procesamiento de mensajes.
+
+Router y extractor solo dependen del mensaje y de los datos ya conocidos
+del lead, así que corren en paralelo (fan-out) y cada uno retorna
+únicamente las claves que le pertenecen; como no se solapan, la fusión en
+AgentState es determinista sin importar el orden en que terminen. El
+extractor se agenda con señales locales (pre-pase de reglas) y, cuando
+corre, el calificador va después de él para puntuar con los datos del
+turno. Los nodos no escriben en la base: registran sus cambios en la
+unidad de trabajo del turno (config["configurable"]["unit_of_work"]), que
+process_message confirma al final en una sola transacción.
+
+Cuando el siguiente estado de la FSM es predecible, el borrador de la
+respuesta arranca a la par y se usa si la predicción se cumple.
 """
-from typing import TypedDict, Annotated, Literal, Optional
-from langgraph.graph import StateGraph, END
+import asyncio
+from datetime import datetime
+from typing import TypedDict, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 
-from ..config import FSMStates, IntentTypes, BANT_MIN_SCORE_FOR_CLOSE
-from ..models import Message, ConversationContext
+from ..config import FSMStates, IntentTypes, BANT_MIN_SCORE_FOR_CLOSE, settings
+from ..models import Message, ConversationContext, LeadData, BANTScore
 from ..agents import (
     router_agent, 
     extractor_agent, 
     qualifier_agent, 
     conversational_agent,
-    scheduler_agent
+    scheduler_agent,
+    analyzer_agent,
+    summarizer_agent
 )
-from ..integrations import supabase_client
-from .states import TransitionTrigger, get_next_state
+from ..agents.conversational import split_ready_segments
+from ..agents.rule_extractor import extract_with_rules
+from ..integrations import supabase_client, TurnUnitOfWork
+from ..integrations.resilience import DeepSeekError
+from ..utils import metrics
+from .states import TransitionTrigger, get_next_state, is_terminal_state
+
+
+class TurnCancelled(Exception):
+    """El turno fue reemplazado por un mensaje más nuevo del mismo lead."""
+
+
+# Callback que recibe cada segmento de la respuesta en streaming
+SegmentCallback = Callable[[str], Awaitable[None]]
 
 
 class AgentState(TypedDict):
@@ -27,6 +57,10 @@ class AgentState(TypedDict):
     lead_data: dict
     message_history: list
     bant_score: int
+    extraction_watermark: Optional[datetime]
+    extraction_done: bool  # el delta hasta el mensaje actual quedó extraído
+    conversation_summary: Optional[str]
+    summary_watermark: Optional[datetime]
     intent: Optional[str]
     extracted_data: Optional[dict]
     response: Optional[str]
@@ -35,72 +69,179 @@ class AgentState(TypedDict):
     error: Optional[str]
 
 
-async def route_message(state: AgentState) -> AgentState:
-    """Nodo: Clasifica la intención del mensaje."""
-    context = ConversationContext(
+# Estados cuyo siguiente estado no depende del análisis del turno (salvo que
+# el usuario diga que no le interesa): el borrador puede empezar de inmediato
+PREDICTABLE_NEXT_STATE = {
+    FSMStates.INICIO: FSMStates.BIENVENIDA,
+    FSMStates.NUTRICION: FSMStates.NUTRICION,
+    FSMStates.AGENDADO: FSMStates.COMPLETADO,
+}
+
+
+# Borradores especulativos en curso por thread_id: (estado predicho, lead_data usado, tarea)
+_speculative_drafts: Dict[str, Tuple[str, dict, asyncio.Task]] = {}
+
+
+def _unit_of_work(config: RunnableConfig) -> TurnUnitOfWork:
+    return config["configurable"]["unit_of_work"]
+
+
+def _build_context(state: AgentState, **overrides) -> ConversationContext:
+    """Contexto de los agentes a partir del estado del grafo."""
+    fields = dict(
         phone_number=state["phone_number"],
         current_message=state["current_message"],
         message_history=[Message(**m) for m in state.get("message_history", [])],
         lead_data=state.get("lead_data"),
         fsm_state=state["fsm_state"],
-        bant_score=state.get("bant_score", 0)
+        bant_score=state.get("bant_score", 0),
+        extraction_watermark=state.get("extraction_watermark"),
+        conversation_summary=state.get("conversation_summary"),
+        summary_watermark=state.get("summary_watermark")
     )
+    fields.update(overrides)
+    return ConversationContext(**fields)
+
+
+async def route_message(state: AgentState) -> dict:
+    """Nodo: Clasifica la intención del mensaje."""
+    context = _build_context(state)
     
     result = await router_agent.classify(context)
     
-    state["intent"] = result.intencion_primaria
-    state["extracted_data"] = result.datos_detectados if result.contiene_dato_extraible else None
-    
-    return state
+    return {
+        "intent": result.intencion_primaria,
+        "extracted_data": result.datos_detectados if result.contiene_dato_extraible else None,
+    }
 
 
-async def extract_data(state: AgentState) -> AgentState:
-    """Nodo: Extrae datos del lead."""
-    context = ConversationContext(
-        phone_number=state["phone_number"],
-        current_message=state["current_message"],
-        message_history=[Message(**m) for m in state.get("message_history", [])],
-        lead_data=state.get("lead_data"),
-        fsm_state=state["fsm_state"]
-    )
+async def extract_data(state: AgentState, config: RunnableConfig) -> dict:
+    """
+    Nodo: Extrae datos del lead y, si corresponde, lo califica con los
+    datos ya extraídos (el score considera lo que el usuario acaba de decir).
+    """
+    context = _build_context(state)
     
-    lead_data = await extractor_agent.extract(context)
+    lead_data, done = await extractor_agent.extract_with_status(context)
     
-    # Merge con datos existentes
+    update = {**_apply_extraction(state, lead_data, _unit_of_work(config)), "extraction_done": done}
+    extracted = {**state, **update}
+    if should_qualify(extracted) == "qualify":
+        update.update(await qualify_lead(extracted, config))
+    else:
+        metrics.increment("llm_calls_saved", reason="qualify_skipped")
+    return update
+
+
+def _apply_extraction(state: AgentState, lead_data: LeadData, uow: TurnUnitOfWork) -> dict:
+    """Fusiona los datos extraídos con los existentes y los registra para persistir."""
     existing = state.get("lead_data") or {}
     new_data = lead_data.model_dump(exclude_none=True)
-    merged = {**existing, **new_data}
     
-    # Actualizar en base de datos
     if new_data:
-        await supabase_client.update_extracted_facts(state["phone_number"], new_data)
+        uow.update_extracted_facts(new_data)
     
-    state["lead_data"] = merged
-    
-    return state
+    return {"lead_data": {**existing, **new_data}}
 
 
-async def qualify_lead(state: AgentState) -> AgentState:
+async def qualify_lead(state: AgentState, config: RunnableConfig) -> dict:
     """Nodo: Califica el lead según BANT."""
-    context = ConversationContext(
-        phone_number=state["phone_number"],
-        current_message=state["current_message"],
-        message_history=[Message(**m) for m in state.get("message_history", [])],
-        lead_data=state.get("lead_data"),
-        fsm_state=state["fsm_state"]
-    )
-    
-    score = await qualifier_agent.qualify(context)
-    
-    state["bant_score"] = score.total_score
-    
-    # Actualizar en base de datos
-    await supabase_client.update_bant_score(state["phone_number"], score.total_score)
-    
-    return state
+    context = _build_context(state)
+    
+    try:
+        score = await qualifier_agent.qualify(context)
+    except DeepSeekError as e:
+        # Conservar el score anterior en vez de degradar al lead
+        print(f"⚠️ Calificación omitida, LLM no disponible: {e}")
+        return {}
+    
+    if score.total_score == state.get("bant_score", 0):
+        # Score memoizado o sin cambios: nada que persistir
+        return {}
+    return _apply_score(score, _unit_of_work(config))
+
+
+def _apply_score(score: BANTScore, uow: TurnUnitOfWork) -> dict:
+    """Registra el score BANT para persistir y retorna la actualización del estado."""
+    uow.update_bant_score(score.total_score)
+    return {"bant_score": score.total_score}
+
+
+async def analyze_turn(state: AgentState, config: RunnableConfig) -> dict:
+    """
+    Nodo: Análisis fusionado (intención + extracción + BANT) en una llamada.
+    Reemplaza route -> extract -> qualify cuando FUSED_TURN_ANALYSIS está activo.
+    """
+    context = _build_context(state)
+    
+    # Con score memoizado vigente el analizador no necesita calificar
+    wants_score = should_qualify(state) == "qualify"
+    cached = qualifier_agent.cached_score(context) if wants_score else None
+    analysis = await analyzer_agent.analyze(context, qualify=wants_score and cached is None)
+    
+    result = analysis.router
+    update = {
+        "intent": result.intencion_primaria,
+        "extracted_data": result.datos_detectados if result.contiene_dato_extraible else None,
+        # El análisis cubrió el historial hasta el mensaje actual
+        "extraction_done": analysis.extraction_done,
+    }
+    uow = _unit_of_work(config)
+    update.update(_apply_extraction(state, analysis.lead_data, uow))
+    # Sin calificación (no aplicaba o LLM caído) se conserva el score anterior
+    if analysis.bant is not None:
+        # Memoizado con los datos ya extraídos, que son los que produjeron el score
+        qualifier_agent.remember(_build_context(state, lead_data=update["lead_data"]), analysis.bant)
+        update.update(_apply_score(analysis.bant, uow))
+    
+    return update
+
+
+async def speculate_response(state: AgentState, config: RunnableConfig) -> dict:
+    """
+    Nodo: Arranca el borrador de la respuesta para el estado predicho, en
+    paralelo con el análisis. No espera el resultado; `respond` lo usa si la
+    transición y los datos del lead coinciden, o lo cancela.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    predicted = PREDICTABLE_NEXT_STATE[state["fsm_state"]]
+    lead_data = dict(state.get("lead_data") or {})
+    context = _build_context(state, lead_data=lead_data, fsm_state=predicted)
+    
+    discard_speculative_draft(thread_id)
+    task = asyncio.ensure_future(conversational_agent.generate_response(context))
+    _speculative_drafts[thread_id] = (predicted, lead_data, task)
+    metrics.increment("speculative_drafts_started")
+    return {}
 
 
-async def determine_transition(state: AgentState) -> AgentState:
+def discard_speculative_draft(thread_id: str) -> None:
+    """Cancela el borrador pendiente de un thread, si lo hay."""
+    draft = _speculative_drafts.pop(thread_id, None)
+    if draft and not draft[2].done():
+        draft[2].cancel()
+
+
+async def _take_speculative_draft(state: AgentState, thread_id: str) -> Optional[str]:
+    """Retorna el borrador si la predicción se cumplió; si no, lo cancela."""
+    draft = _speculative_drafts.pop(thread_id, None)
+    if draft is None:
+        return None
+    predicted, lead_data, task = draft
+    if predicted != state["fsm_state"] or _known_facts(lead_data) != _known_facts(state.get("lead_data")):
+        task.cancel()
+        metrics.increment("speculative_drafts", outcome="discarded")
+        return None
+    metrics.increment("speculative_drafts", outcome="used")
+    return await task
+
+
+def _known_facts(lead_data: Optional[dict]) -> dict:
+    """Datos del lead sin campos vacíos (para comparar versiones)."""
+    return {k: v for k, v in (lead_data or {}).items() if v not in (None, "", [])}
+
+
+async def determine_transition(state: AgentState, config: RunnableConfig) -> dict:
     """Nodo: Determina la transición de estado basada en intención y score."""
     current = state["fsm_state"]
     intent = state.get("intent", IntentTypes.OFF_TOPIC)
@@ -166,29 +307,36 @@ async def determine_transition(state: AgentState) -> AgentState:
     if trigger:
         next_state = get_next_state(current, trigger)
         if next_state:
-            state["next_state"] = next_state
-            # Actualizar en base de datos
-            await supabase_client.update_fsm_state(state["phone_number"], next_state)
-            state["fsm_state"] = next_state
+            _unit_of_work(config).update_fsm_state(next_state)
+            return {"next_state": next_state, "fsm_state": next_state}
     
-    return state
+    return {}
 
 
-async def generate_response(state: AgentState) -> AgentState:
-    """Nodo: Genera la respuesta usando el agente conversacional."""
-    context = ConversationContext(
-        phone_number=state["phone_number"],
-        current_message=state["current_message"],
-        message_history=[Message(**m) for m in state.get("message_history", [])],
-        lead_data=state.get("lead_data"),
-        fsm_state=state["fsm_state"],
-        bant_score=state.get("bant_score", 0)
-    )
+async def generate_response(state: AgentState, config: RunnableConfig) -> dict:
+    """
+    Nodo: Genera la respuesta usando el agente conversacional.
+    Si el caller pasó `on_segment` en la config, la respuesta normal se
+    genera en streaming y cada segmento se entrega apenas está listo.
+    Un borrador especulativo válido se usa tal cual.
+    """
+    on_segment: Optional[SegmentCallback] = config.get("configurable", {}).get("on_segment")
+    draft = await _take_speculative_draft(state, config["configurable"]["thread_id"])
+    available_slots = state.get("available_slots")
+    context = _build_context(state)
+    
+    # Borrador especulativo: la transición predicha se cumplió
+    if draft is not None:
+        response = draft
+        if on_segment:
+            segments, rest = split_ready_segments(draft, settings.stream_segment_unit)
+            for segment in segments + ([rest.strip()] if rest.strip() else []):
+                await on_segment(segment)
     
     # Caso especial: estado CIERRE - generar con slots
-    if state["fsm_state"] == FSMStates.CIERRE:
+    elif state["fsm_state"] == FSMStates.CIERRE:
         slots = scheduler_agent.get_available_slots()
-        state["available_slots"] = slots
+        available_slots = slots
         
         lead_name = state.get("lead_data", {}).get("nombre", "")
         response = await conversational_agent.generate_closing_message(lead_name, slots)
@@ -209,22 +357,74 @@ async def generate_response(state: AgentState) -> AgentState:
         else:
             response = await conversational_agent.generate_response(context)
     
+    # Caso normal con streaming: entregar segmentos a medida que llegan
+    elif on_segment:
+        segments = []
+        async for segment in conversational_agent.generate_response_stream(context):
+            segments.append(segment)
+            await on_segment(segment)
+        response = "\n\n".join(segments)
+    
     # Caso normal: generar respuesta según estado
     else:
         response = await conversational_agent.generate_response(context)
     
-    state["response"] = response
-    return state
+    return {"response": response, "available_slots": available_slots}
+
+
+def fan_out(state: AgentState) -> List[str]:
+    """
+    Router: Nodos que arrancan en paralelo al inicio del turno.
+    La extracción no espera al router: se decide con `should_extract`. Si
+    se extrae, el calificador corre dentro de `extract`; si no, corre solo
+    cuando `should_qualify` lo pide.
+    """
+    nodes = ["route"]
+    if should_extract(state) == "extract":
+        nodes.append("extract")
+    else:
+        metrics.increment("llm_calls_saved", reason="extract_skipped")
+        if should_qualify(state) == "qualify":
+            nodes.append("qualify")
+        else:
+            metrics.increment("llm_calls_saved", reason="qualify_skipped")
+    return nodes + _speculation(state)
 
 
-def should_extract_data(state: AgentState) -> Literal["extract", "skip"]:
-    """Router: Decide si extraer datos."""
-    # Extraer si el router detectó datos o si estamos en extracción
-    if state.get("extracted_data") or state["fsm_state"] == FSMStates.EXTRACCION_DATOS:
+def fan_out_fused(state: AgentState) -> List[str]:
+    """Router: Análisis fusionado, más el borrador especulativo si aplica."""
+    return ["analyze"] + _speculation(state)
+
+
+def _speculation(state: AgentState) -> List[str]:
+    if settings.speculative_responses and state["fsm_state"] in PREDICTABLE_NEXT_STATE:
+        return ["speculate"]
+    return []
+
+
+def should_extract(state: AgentState) -> Literal["extract", "skip"]:
+    """
+    Router: Decide si extraer, con señales locales (el router LLM corre en
+    paralelo). Siempre en extracción de datos o con mensajes anteriores
+    sin extraer; si no, solo si las reglas detectan datos en el mensaje.
+    """
+    if is_terminal_state(state["fsm_state"]):
+        return "skip"
+    if state["fsm_state"] == FSMStates.EXTRACCION_DATOS or _pending_extraction(state):
+        return "extract"
+    rules = extract_with_rules(state["current_message"])
+    if rules.data or rules.needs_llm:
         return "extract"
     return "skip"
 
 
+def _pending_extraction(state: AgentState) -> bool:
+    """Hay mensajes entrantes anteriores al turno que el extractor no cubrió."""
+    if not settings.incremental_extraction:
+        return False
+    return any(m.direction == "inbound" for m in _build_context(state).unextracted_history)
+
+
 def should_qualify(state: AgentState) -> Literal["qualify", "skip"]:
     """Router: Decide si calificar el lead."""
     # Calificar si estamos en calificación o tenemos suficientes datos
@@ -236,44 +436,42 @@ def should_qualify(state: AgentState) -> Literal["qualify", "skip"]:
     return "skip"
 
 
-def build_conversation_graph():
-    """Construye el grafo de conversación."""
+def build_conversation_graph(fused_analysis: Optional[bool] = None):
+    """
+    Construye el grafo de conversación.
+    Con `fused_analysis` (por defecto FUSED_TURN_ANALYSIS) un solo nodo
+    `analyze` reemplaza route + extract + qualify: dos llamadas al LLM por
+    turno (análisis + respuesta) en vez de cuatro.
+    """
+    if fused_analysis is None:
+        fused_analysis = settings.fused_turn_analysis
     
     # Crear grafo
     workflow = StateGraph(AgentState)
     
     # Añadir nodos
-    workflow.add_node("route", route_message)
-    workflow.add_node("extract", extract_data)
-    workflow.add_node("qualify", qualify_lead)
+    if fused_analysis:
+        analysis_nodes = ["analyze"]
+        workflow.add_node("analyze", analyze_turn)
+    else:
+        analysis_nodes = ["route", "extract", "qualify"]
+        workflow.add_node("route", route_message)
+        workflow.add_node("extract", extract_data)
+        workflow.add_node("qualify", qualify_lead)
+    workflow.add_node("speculate", speculate_response)
     workflow.add_node("transition", determine_transition)
     workflow.add_node("respond", generate_response)
     
-    # Definir flujo
-    workflow.set_entry_point("route")
-    
-    # Route -> Extract (conditional)
+    # Fan-out: análisis (y borrador especulativo) en paralelo desde el inicio
     workflow.add_conditional_edges(
-        "route",
-        should_extract_data,
-        {
-            "extract": "extract",
-            "skip": "qualify"
-        }
+        START,
+        fan_out_fused if fused_analysis else fan_out,
+        analysis_nodes + ["speculate"]
     )
     
-    # Extract -> Qualify
-    workflow.add_edge("extract", "qualify")
-    
-    # Qualify -> Transition (conditional, pero siempre pasa)
-    workflow.add_conditional_edges(
-        "qualify",
-        should_qualify,
-        {
-            "qualify": "transition",
-            "skip": "transition"
-        }
-    )
+    # Fan-in: la transición corre una vez, cuando terminaron todas las ramas
+    for node in analysis_nodes + ["speculate"]:
+        workflow.add_edge(node, "transition")
     
     # Transition -> Respond
     workflow.add_edge("transition", "respond")
@@ -292,13 +490,60 @@ def build_conversation_graph():
 conversation_graph = build_conversation_graph()
 
 
-async def process_message(phone_number: str, message: str) -> str:
+# Ejecuciones del grafo en curso por thread_id
+_inflight_turns: Dict[str, asyncio.Task] = {}
+
+
+def cancel_turn(thread_id: str) -> bool:
+    """
+    Cancela la ejecución del grafo en curso para un thread_id.
+    La cancelación ocurre en el siguiente punto de espera (LLM, base de datos).
+    Retorna True si había un turno en curso.
+    """
+    task = _inflight_turns.get(thread_id)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    metrics.increment("turns_cancelled")
+    return True
+
+
+async def process_message(
+    phone_number: str,
+    message: str,
+    on_segment: Optional[SegmentCallback] = None
+) -> str:
     """
     Procesa un mensaje entrante y retorna la respuesta.
     Entry point principal del sistema.
+    
+    Lanza TurnCancelled si un mensaje más nuevo del mismo lead cancela el
+    turno; en ese caso no se guarda nada y el siguiente turno parte del
+    último estado persistido.
+    
+    Con `on_segment` la respuesta se entrega en streaming, segmento a
+    segmento. Desde el primer segmento entregado el turno ya no es cancelable.
+    
+    El contexto se carga una vez y todas las escrituras del turno se
+    confirman juntas al final (TurnUnitOfWork).
     """
-    # Obtener contexto de la conversación
-    context = await supabase_client.get_conversation_context(phone_number)
+    with TurnUnitOfWork(supabase_client, phone_number) as uow:
+        result = await _run_turn(uow, phone_number, message, on_segment)
+    
+    # Plegar en el resumen lo que ya no cabe en la ventana, sin bloquear el turno
+    schedule_summary_update(result)
+    
+    return result["response"]
+
+
+async def _run_turn(
+    uow: TurnUnitOfWork,
+    phone_number: str,
+    message: str,
+    on_segment: Optional[SegmentCallback]
+) -> AgentState:
+    # Obtener contexto de la conversación (crea el lead si es nuevo)
+    context = await uow.load()
     
     # Estado inicial
     lead = context.get("lead") or {}
@@ -309,6 +554,10 @@ async def process_message(phone_number: str, message: str) -> str:
         "lead_data": lead.get("extracted_facts", {}),
         "message_history": context.get("messages", []),
         "bant_score": lead.get("bant_score", 0),
+        "extraction_watermark": lead.get("extraction_watermark"),
+        "extraction_done": False,
+        "conversation_summary": lead.get("conversation_summary"),
+        "summary_watermark": lead.get("summary_watermark"),
         "intent": None,
         "extracted_data": None,
         "response": None,
@@ -316,28 +565,93 @@ async def process_message(phone_number: str, message: str) -> str:
         "available_slots": None,
         "error": None
     }
-    
-    # Si es un nuevo lead, asegurarse de que existe
-    if not context.get("lead"):
-        await supabase_client.get_or_create_lead(phone_number)
-    
-    # Ejecutar grafo
-    config = {"configurable": {"thread_id": phone_number}}
-    result = await conversation_graph.ainvoke(initial_state, config)
-    
-    # Guardar mensaje entrante
-    await supabase_client.save_message(Message(
+    # Sin nada que extraer en el turno el mensaje queda cubierto (avanza el watermark)
+    initial_state["extraction_done"] = should_extract(initial_state) == "skip"
+    
+    # Ejecutar grafo como tarea cancelable por thread_id
+    config = {"configurable": {"thread_id": phone_number, "unit_of_work": uow}}
+    if on_segment:
+        async def deliver(segment: str) -> None:
+            # Ya se empezó a responder: no cancelar a mitad de la respuesta
+            if _inflight_turns.get(phone_number) is task:
+                del _inflight_turns[phone_number]
+            await on_segment(segment)
+        config["configurable"]["on_segment"] = deliver
+    task = asyncio.ensure_future(conversation_graph.ainvoke(initial_state, config))
+    _inflight_turns[phone_number] = task
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        # Cancelación propia del caller (p.ej. apagado): propagar
+        if asyncio.current_task().cancelling():
+            raise
+        raise TurnCancelled(phone_number)
+    finally:
+        if _inflight_turns.get(phone_number) is task:
+            del _inflight_turns[phone_number]
+        # Un turno cancelado o fallido no debe dejar un borrador vivo
+        discard_speculative_draft(phone_number)
+    
+    # Mensaje entrante (y avanzar el watermark si quedó extraído) y respuesta
+    uow.add_message(Message(
         phone_number=phone_number,
         direction="inbound",
         content=message
-    ))
+    ), mark_extracted=result.get("extraction_done", False))
     
-    # Guardar respuesta
-    response = result.get("response", "Lo siento, hubo un error. ¿Puedes intentar de nuevo?")
-    await supabase_client.save_message(Message(
+    response = result.get("response") or "Lo siento, hubo un error. ¿Puedes intentar de nuevo?"
+    uow.add_message(Message(
         phone_number=phone_number,
         direction="outbound",
         content=response
     ))
     
-    return response
+    # Hechos, BANT, estado FSM y mensajes en una sola transacción
+    await uow.flush()
+    
+    return {**result, "response": response}
+
+
+# Actualizaciones del resumen en curso por lead (en segundo plano)
+_summary_updates: Dict[str, asyncio.Task] = {}
+
+
+def schedule_summary_update(state: AgentState) -> None:
+    """Arranca la actualización del resumen del lead si hay mensajes que plegar."""
+    phone_number = state["phone_number"]
+    if not settings.conversation_summary_enabled or phone_number in _summary_updates:
+        return
+    context = _build_context(state)
+    fold = summarizer_agent.messages_to_fold(context)
+    if not fold:
+        return
+    task = asyncio.ensure_future(_update_summary(phone_number, context.conversation_summary, fold))
+    _summary_updates[phone_number] = task
+    task.add_done_callback(lambda _: _summary_updates.pop(phone_number, None))
+
+
+async def _update_summary(phone_number: str, previous: Optional[str], fold: List[Message]) -> None:
+    try:
+        summary = await summarizer_agent.summarize(previous, fold)
+        await supabase_client.update_lead(phone_number, {
+            "conversation_summary": summary,
+            "summary_watermark": fold[-1].created_at.isoformat()
+        })
+    except DeepSeekError as e:
+        # El watermark no avanza: se reintenta en el próximo turno
+        print(f"⚠️ Resumen pospuesto, LLM no disponible: {e}")
+        return
+    except Exception as e:
+        # Tarea en segundo plano: nadie espera su resultado
+        metrics.increment("conversation_summary_errors")
+        print(f"⚠️ Error actualizando el resumen de ...{phone_number[-4:]}: {e}")
+        return
+    metrics.increment("conversation_summaries_updated")
+
+
+async def cancel_summary_updates() -> None:
+    """Cancela los resúmenes pendientes (apagado); se rehacen en el próximo turno."""
+    tasks = list(_summary_updates.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
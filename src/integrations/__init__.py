@@ -1,10 +1,21 @@
 """Integrations package."""
-from .supabase_client import supabase_client, SupabaseClient
-from .whatsapp import whatsapp_client, WhatsAppClient
+from .supabase_client import supabase_client, SupabaseClient, create_repository
+from .postgres_repository import PostgresRepository
+from .unit_of_work import TurnUnitOfWork
+from .lead_cache import lead_cache, LeadCache
+from .message_journal import MessageJournal
+from .whatsapp import whatsapp_client, WhatsAppClient, parse_webhook_messages
 
 __all__ = [
     "supabase_client",
     "SupabaseClient",
+    "PostgresRepository",
+    "create_repository",
+    "TurnUnitOfWork",
+    "lead_cache",
+    "LeadCache",
+    "MessageJournal",
     "whatsapp_client", 
     "WhatsAppClient",
+    "parse_webhook_messages",
 ]
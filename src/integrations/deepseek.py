@@ -1,21 +1,89 @@
 """
 Cliente para DeepSeek API.
 Proporciona interfaz unificada para llamadas al LLM.
+
+Las llamadas se reintentan con backoff exponencial y jitter ante 429/5xx y
+errores de red, pueden duplicarse (hedging) cuando superan el percentil de
+latencia configurado (medido por perfil), y pasan por un circuit breaker.
+Si el proveedor no responde se lanza DeepSeekError para que el caller use
+su respuesta de respaldo, en vez de devolver el texto del error.
+
+Cada intento pasa antes por el control de tráfico global (rate_limit): las
+respuestas al cliente tienen prioridad sobre el trabajo de fondo y la
+concurrencia se ajusta con la latencia observada y los 429.
 """
+import asyncio
+import time
 import httpx
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import json
 
-from ..config import settings
+from ..config import LLM_PROFILES, LLMProfile, get_llm_profile, settings
+from ..utils import count_tokens, metrics
+from ..utils.metrics import Distribution
+from .llm_cache import llm_cache
+from .rate_limit import Priority, llm_traffic
+from .resilience import (
+    RETRYABLE_STATUS,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeepSeekError,
+    backoff_delay,
+)
+
+
+def usage_cost(usage: dict, profile: LLMProfile) -> float:
+    """Costo en USD de una llamada según el bloque `usage` y la tarifa del perfil."""
+    hit = int(usage.get("prompt_cache_hit_tokens") or 0)
+    miss = int(usage.get("prompt_cache_miss_tokens") or 0)
+    if not hit and not miss:
+        miss = int(usage.get("prompt_tokens") or 0)
+    output = int(usage.get("completion_tokens") or 0)
+    return (
+        hit * profile.cached_input_price
+        + miss * profile.input_price
+        + output * profile.output_price
+    ) / 1_000_000
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """Estimación local de tokens de un prompt."""
+    return sum(count_tokens(m.get("content") or "") for m in messages)
+
+
+# Campos del bloque `usage` de DeepSeek que se acumulan por agente
+USAGE_FIELDS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "prompt_cache_hit_tokens",
+    "prompt_cache_miss_tokens",
+)
 
 
 class DeepSeekClient:
-    """Cliente para DeepSeek API (compatible con OpenAI)."""
+    """
+    Cliente para DeepSeek API (compatible con OpenAI).
     
-    def __init__(self):
-        self.api_key = settings.deepseek_api_key
-        self.base_url = settings.deepseek_base_url
+    Usa un único httpx.AsyncClient de larga vida (HTTP/2, keep-alive y pool
+    acotado) que se abre y precalienta en el arranque de la app y se cierra
+    al apagarla.
+    """
+    
+    def __init__(self, api_key: str = None, base_url: str = None):
+        self.api_key = settings.deepseek_api_key if api_key is None else api_key
+        self.base_url = base_url or settings.deepseek_base_url
         self.model = settings.deepseek_model
+        self._client: Optional[httpx.AsyncClient] = None
+        # Uso acumulado por agente (tokens, cache de contexto de DeepSeek)
+        self._usage: Dict[str, Dict[str, int]] = {}
+        # Latencias recientes de llamadas exitosas por perfil (umbral de hedging)
+        self._latency: Dict[str, Distribution] = {}
+        self.breaker = CircuitBreaker(
+            "deepseek",
+            failure_threshold=settings.deepseek_circuit_failure_threshold,
+            recovery_seconds=settings.deepseek_circuit_recovery_seconds
+        )
     
     @property
     def headers(self) -> dict:
@@ -24,16 +92,70 @@ class DeepSeekClient:
             "Content-Type": "application/json"
         }
     
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartido (se crea bajo demanda si no se llamó start)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=settings.deepseek_http2,
+                headers=self.headers,
+                timeout=httpx.Timeout(
+                    connect=settings.deepseek_connect_timeout,
+                    read=settings.deepseek_read_timeout,
+                    write=settings.deepseek_connect_timeout,
+                    pool=settings.deepseek_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.deepseek_max_connections,
+                    max_keepalive_connections=settings.deepseek_max_keepalive_connections,
+                    keepalive_expiry=settings.deepseek_keepalive_expiry
+                )
+            )
+        return self._client
+    
+    async def start(self) -> None:
+        """Abre el cliente y precalienta conexiones (TCP + TLS) a DeepSeek."""
+        if not self.api_key:
+            return
+        warmups = [self._warm_connection() for _ in range(settings.deepseek_warmup_connections)]
+        await asyncio.gather(*warmups)
+    
+    async def _warm_connection(self) -> None:
+        try:
+            await self.http.get(f"{self.base_url}/models")
+            metrics.increment("llm_connections_warmed")
+        except httpx.HTTPError as e:
+            print(f"⚠️ No se pudo precalentar conexión a DeepSeek: {e}")
+    
+    async def close(self) -> None:
+        """Cierra el cliente y sus conexiones."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     async def chat_completion(
         self,
         messages: List[dict],
-        temperature: float = 0.7,
-        max_tokens: int = 1024,
-        response_format: Optional[dict] = None
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[dict] = None,
+        agent: str = "default",
+        cache_ttl: Optional[float] = None,
+        priority: Priority = Priority.ANALYSIS
     ) -> str:
-        """Genera una respuesta de chat."""
+        """
+        Genera una respuesta de chat.
+        Modelo, timeout y los parámetros no indicados salen del perfil del
+        agente (LLM_PROFILES). Con `cache_ttl` la respuesta se cachea y
+        llamadas idénticas posteriores no llegan a DeepSeek. `priority`
+        define el orden de admisión cuando el tráfico al LLM está saturado.
+        """
+        profile = get_llm_profile(agent)
+        temperature = profile.temperature if temperature is None else temperature
+        max_tokens = profile.max_tokens if max_tokens is None else max_tokens
+        cache_ttl = profile.cache_ttl if cache_ttl is None else cache_ttl
         payload = {
-            "model": self.model,
+            "model": profile.model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens
@@ -46,31 +168,397 @@ class DeepSeekClient:
             print(f"⚠️ DeepSeek no configurado. Mock response.")
             return '{"mock": true}'
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=60.0
-            )
+        cache_key = None
+        if cache_ttl and settings.llm_cache_enabled:
+            cache_key = llm_cache.make_key(profile.model, messages, temperature, max_tokens, response_format)
+            cached = await llm_cache.get(cache_key, agent)
+            if cached is not None:
+                return cached["content"]
+        
+        data = await self._request(payload, messages, priority, profile)
+        
+        choice = data["choices"][0]
+        content = choice["message"]["content"]
+        if choice.get("finish_reason") == "length":
+            # max_tokens del perfil demasiado justo para este agente
+            metrics.increment("llm_truncated_responses", profile=profile.name)
+        self._record_usage(agent, data.get("usage"), profile)
+        
+        if cache_key:
+            await llm_cache.set(cache_key, {"content": content, "usage": data.get("usage")}, cache_ttl)
+        
+        return content
+    
+    async def _request(
+        self, payload: dict, messages: List[dict], priority: Priority, profile: LLMProfile
+    ) -> dict:
+        """POST a /chat/completions con circuit breaker, reintentos y hedging."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("DeepSeek no disponible (circuito abierto)")
+        
+        last_error: Optional[DeepSeekError] = None
+        delay = 0.0
+        try:
+            for attempt in range(settings.deepseek_max_retries + 1):
+                if attempt:
+                    metrics.increment("llm_retries")
+                    await asyncio.sleep(delay)
+                
+                try:
+                    response, data = await self._send_hedged(payload, priority, profile)
+                except (httpx.TransportError, asyncio.TimeoutError) as e:
+                    print(f"❌ Error de red DeepSeek (intento {attempt + 1}): {type(e).__name__}")
+                    last_error = DeepSeekError(f"{type(e).__name__}: {e}")
+                    self.breaker.record_failure()
+                    delay = backoff_delay(attempt, settings.deepseek_backoff_base, settings.deepseek_backoff_max)
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        return data
+                    
+                    print(f"❌ Error DeepSeek API: {response.status_code} - {response.text}")
+                    last_error = DeepSeekError(response.text, response.status_code)
+                    if response.status_code not in RETRYABLE_STATUS:
+                        # Error del request, no del proveedor: no reintentar
+                        break
+                    self.breaker.record_failure()
+                    delay = self._retry_delay(attempt, response)
+                
+                if self.breaker.state == CircuitBreaker.OPEN:
+                    break
+        except asyncio.CancelledError:
+            # Turno obsoleto cancelado: tokens que no se pagan
+            metrics.increment("llm_calls_cancelled")
+            metrics.increment("llm_cancelled_prompt_tokens_estimate", estimate_tokens(messages))
+            raise
+        
+        metrics.increment("llm_calls_failed")
+        raise last_error
+    
+    def _retry_delay(self, attempt: int, response: httpx.Response) -> float:
+        """Respeta Retry-After si viene; si no, backoff con jitter."""
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.deepseek_backoff_max)
+            except ValueError:
+                pass
+        return backoff_delay(attempt, settings.deepseek_backoff_base, settings.deepseek_backoff_max)
+    
+    async def _send(
+        self,
+        payload: dict,
+        priority: Priority,
+        profile: LLMProfile,
+        admitted: Optional[asyncio.Event] = None
+    ) -> Tuple[httpx.Response, Optional[dict]]:
+        """
+        Un intento: espera cupo en el control de tráfico y hace el POST con
+        el timeout total del perfil además de los del cliente. Marca
+        `admitted` al obtener el cupo. Retorna la respuesta y, si fue
+        exitosa, su cuerpo ya parseado.
+        """
+        estimated = estimate_tokens(payload["messages"]) + payload["max_tokens"]
+        async with llm_traffic.slot(priority, estimated) as permit:
+            if admitted is not None:
+                admitted.set()
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self.http.post(f"{self.base_url}/chat/completions", json=payload),
+                    timeout=profile.timeout_seconds
+                )
+            finally:
+                permit.latency = time.monotonic() - started
+            metrics.observe("llm_call_seconds", permit.latency, profile=profile.name)
+            permit.throttled = response.status_code == 429
+            data = None
+            if response.status_code == 200:
+                self._latency_for(profile.name).observe(permit.latency)
+                data = response.json()
+                permit.actual_tokens = (data.get("usage") or {}).get("total_tokens")
+        return response, data
+    
+    def _latency_for(self, profile_name: str) -> Distribution:
+        """Latencias recientes del perfil (cada perfil tiene su propio percentil)."""
+        latency = self._latency.get(profile_name)
+        if latency is None:
+            latency = self._latency[profile_name] = Distribution(window=512)
+        return latency
+    
+    def _hedge_delay(self, profile_name: str) -> Optional[float]:
+        """Latencia del perfil a partir de la cual se lanza una segunda solicitud."""
+        if not settings.deepseek_hedge_enabled:
+            return None
+        latency = self._latency.get(profile_name)
+        if latency is None or len(latency.samples) < settings.deepseek_hedge_min_samples:
+            return None
+        return latency.percentile(settings.deepseek_hedge_percentile)
+    
+    async def _send_hedged(
+        self, payload: dict, priority: Priority, profile: LLMProfile
+    ) -> Tuple[httpx.Response, Optional[dict]]:
+        """
+        Envía la solicitud; si tarda más que el percentil configurado del
+        perfil lanza una segunda idéntica y se queda con la primera respuesta
+        exitosa. El plazo corre desde que la solicitud obtiene cupo en el
+        limitador, no durante la espera en su cola.
+        """
+        delay = self._hedge_delay(profile.name)
+        if delay is None:
+            return await self._send(payload, priority, profile)
+        
+        admitted = asyncio.Event()
+        primary = asyncio.ensure_future(self._send(payload, priority, profile, admitted))
+        admission = asyncio.ensure_future(admitted.wait())
+        pending = {primary}
+        try:
+            await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
             
-            if response.status_code != 200:
-                print(f"❌ Error DeepSeek API: {response.status_code} - {response.text}")
-                return f"Error: {response.text}"
+            metrics.increment("llm_hedges_sent")
+            hedge = asyncio.ensure_future(self._send(payload, priority, profile))
+            pending.add(hedge)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Una respuesta exitosa gana aunque la otra haya fallado a la vez
+                for task in done:
+                    if task.exception() is None and task.result()[0].status_code == 200:
+                        if task is hedge:
+                            metrics.increment("llm_hedges_won")
+                        return task.result()
+                if not pending:
+                    # Ninguna tuvo éxito: mejor una respuesta HTTP que una excepción
+                    failed = sorted(done, key=lambda t: t.exception() is not None)
+                    return failed[0].result()
+        finally:
+            admission.cancel()
+            for task in pending:
+                task.cancel()
+    
+    def stats(self) -> dict:
+        """Estado de resiliencia: circuit breaker, reintentos y hedging."""
+        return {
+            "circuit": self.breaker.stats(),
+            "retries": metrics.get_counter("llm_retries"),
+            "failed_calls": metrics.get_counter("llm_calls_failed"),
+            "hedges_sent": metrics.get_counter("llm_hedges_sent"),
+            "hedges_won": metrics.get_counter("llm_hedges_won"),
+            "hedge_delay_seconds": {name: self._hedge_delay(name) for name in sorted(self._latency)},
+            "traffic": llm_traffic.stats(),
+        }
+    
+    async def chat_completion_stream(
+        self,
+        messages: List[dict],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        agent: str = "default",
+        cache_ttl: Optional[float] = None,
+        priority: Priority = Priority.REPLY
+    ) -> AsyncIterator[str]:
+        """
+        Genera una respuesta de chat en streaming (stream=True).
+        Itera los fragmentos de texto a medida que llegan y registra el
+        tiempo al primer token y el tiempo total de la llamada. El timeout
+        del perfil aplica hasta recibir las cabeceras.
+        Un acierto de cache se entrega como un único fragmento.
+        """
+        profile = get_llm_profile(agent)
+        temperature = profile.temperature if temperature is None else temperature
+        max_tokens = profile.max_tokens if max_tokens is None else max_tokens
+        cache_ttl = profile.cache_ttl if cache_ttl is None else cache_ttl
+        payload = {
+            "model": profile.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        
+        if not self.api_key:
+            print(f"⚠️ DeepSeek no configurado. Mock response.")
+            for piece in ("Respuesta mock. ", "Sin DeepSeek configurado."):
+                yield piece
+            return
+        
+        cache_key = None
+        if cache_ttl and settings.llm_cache_enabled:
+            cache_key = llm_cache.make_key(profile.model, messages, temperature, max_tokens)
+            cached = await llm_cache.get(cache_key, agent)
+            if cached is not None:
+                yield cached["content"]
+                return
+        
+        if not self.breaker.allow():
+            raise CircuitOpenError("DeepSeek no disponible (circuito abierto)")
+        
+        started = time.monotonic()
+        first_token_at = None
+        pieces: List[str] = []
+        usage = None
+        completed = False  # llegó [DONE]: la respuesta está completa
+        estimated = estimate_tokens(messages) + max_tokens
+        try:
+            for attempt in range(settings.deepseek_max_retries + 1):
+                try:
+                    retry_delay = None
+                    async with llm_traffic.slot(priority, estimated) as permit:
+                        sent_at = time.monotonic()
+                        response = await asyncio.wait_for(
+                            self.http.send(
+                                self.http.build_request(
+                                    "POST", f"{self.base_url}/chat/completions", json=payload
+                                ),
+                                stream=True
+                            ),
+                            timeout=profile.timeout_seconds
+                        )
+                        try:
+                            # Para el limitador la latencia de un stream es el tiempo a cabeceras
+                            permit.latency = time.monotonic() - sent_at
+                            permit.throttled = response.status_code == 429
+                            if response.status_code != 200:
+                                body = (await response.aread()).decode(errors="replace")
+                                print(f"❌ Error DeepSeek API: {response.status_code} - {body}")
+                                if response.status_code in RETRYABLE_STATUS:
+                                    self.breaker.record_failure()
+                                if (
+                                    response.status_code not in RETRYABLE_STATUS
+                                    or attempt == settings.deepseek_max_retries
+                                ):
+                                    metrics.increment("llm_calls_failed")
+                                    raise DeepSeekError(body, response.status_code)
+                                retry_delay = self._retry_delay(attempt, response)
+                            else:
+                                self.breaker.record_success()
+                                async for line in response.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[len("data:"):].strip()
+                                    if data == "[DONE]":
+                                        completed = True
+                                        break
+                                    try:
+                                        chunk = json.loads(data)
+                                    except json.JSONDecodeError as e:
+                                        # Chunk truncado o corrupto: el caller usa su respaldo
+                                        metrics.increment("llm_calls_failed")
+                                        raise DeepSeekError(f"Chunk de streaming inválido: {e}")
+                                    # El último chunk trae el bloque usage sin choices
+                                    if chunk.get("usage"):
+                                        usage = chunk["usage"]
+                                        permit.actual_tokens = usage.get("total_tokens")
+                                        self._record_usage(agent, usage, profile)
+                                    choices = chunk.get("choices") or [{}]
+                                    delta = choices[0].get("delta", {}).get("content")
+                                    if not delta:
+                                        continue
+                                    if first_token_at is None:
+                                        first_token_at = time.monotonic()
+                                        metrics.observe("llm_ttft_seconds", first_token_at - started)
+                                    pieces.append(delta)
+                                    yield delta
+                        finally:
+                            await response.aclose()
+                    
+                    if retry_delay is not None:
+                        # El backoff se espera fuera del cupo del limitador
+                        metrics.increment("llm_retries")
+                        await asyncio.sleep(retry_delay)
+                        continue
+                    break
+                except (httpx.TransportError, asyncio.TimeoutError) as e:
+                    self.breaker.record_failure()
+                    # Solo se reintenta si aún no se entregó nada
+                    if pieces or attempt == settings.deepseek_max_retries:
+                        metrics.increment("llm_calls_failed")
+                        raise DeepSeekError(f"{type(e).__name__}: {e}")
+                    metrics.increment("llm_retries")
+                    await asyncio.sleep(
+                        backoff_delay(attempt, settings.deepseek_backoff_base, settings.deepseek_backoff_max)
+                    )
             
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
+            # Un stream cortado antes de [DONE] no se cachea (texto parcial)
+            if cache_key and pieces and completed:
+                await llm_cache.set(cache_key, {"content": "".join(pieces), "usage": usage}, cache_ttl)
+        except asyncio.CancelledError:
+            metrics.increment("llm_calls_cancelled")
+            metrics.increment("llm_cancelled_prompt_tokens_estimate", estimate_tokens(messages))
+            raise
+        finally:
+            metrics.observe("llm_stream_seconds", time.monotonic() - started, profile=profile.name)
+    
+    def _record_usage(self, agent: str, usage: Optional[dict], profile: LLMProfile) -> None:
+        """Acumula el bloque `usage` de la respuesta por agente, con su costo."""
+        if not usage:
+            return
+        totals = self._usage.setdefault(agent, {field: 0 for field in USAGE_FIELDS})
+        totals["calls"] = totals.get("calls", 0) + 1
+        for field in USAGE_FIELDS:
+            value = int(usage.get(field) or 0)
+            totals[field] += value
+            metrics.increment(f"llm_{field}", value, agent=agent)
+        
+        cost = usage_cost(usage, profile)
+        totals["cost_usd"] = totals.get("cost_usd", 0.0) + cost
+        metrics.increment("llm_cost_usd", cost, profile=profile.name)
+        metrics.increment("llm_profile_calls", profile=profile.name)
+    
+    def usage_by_profile(self) -> Dict[str, dict]:
+        """Configuración, latencia y costo acumulado por perfil de LLM."""
+        report = {}
+        for name, profile in sorted(LLM_PROFILES.items()):
+            calls = metrics.get_counter("llm_profile_calls", profile=name)
+            if not calls:
+                continue
+            report[name] = {
+                "model": profile.model,
+                "max_tokens": profile.max_tokens,
+                "calls": calls,
+                "cost_usd": round(metrics.get_counter("llm_cost_usd", profile=name), 6),
+                "truncated": metrics.get_counter("llm_truncated_responses", profile=name),
+                "latency_seconds": metrics.get_distribution("llm_call_seconds", profile=name).summary(),
+                "stream_seconds": metrics.get_distribution("llm_stream_seconds", profile=name).summary(),
+            }
+        return report
+    
+    def usage_by_agent(self) -> Dict[str, dict]:
+        """Uso acumulado por agente, con la tasa de acierto del cache de contexto."""
+        report = {}
+        for agent, totals in self._usage.items():
+            hit = totals["prompt_cache_hit_tokens"]
+            miss = totals["prompt_cache_miss_tokens"]
+            report[agent] = {
+                **totals,
+                "prompt_cache_hit_ratio": round(hit / (hit + miss), 4) if hit + miss else 0.0,
+            }
+        return report
     
     async def chat_json(
         self,
         messages: List[dict],
-        temperature: float = 0.3
+        temperature: Optional[float] = None,
+        agent: str = "default",
+        cache_ttl: Optional[float] = None,
+        priority: Priority = Priority.ANALYSIS,
+        max_tokens: Optional[int] = None
     ) -> dict:
-        """Genera una respuesta en formato JSON."""
+        """
+        Genera una respuesta en formato JSON (parámetros por defecto del perfil del agente).
+        Lanza DeepSeekError si el proveedor no está disponible.
+        """
         response = await self.chat_completion(
             messages=messages,
             temperature=temperature,
-            response_format={"type": "json_object"}
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            agent=agent,
+            cache_ttl=cache_ttl,
+            priority=priority
         )
         
         try:
@@ -82,7 +570,7 @@ class DeepSeekClient:
                 end = response.rindex("}") + 1
                 try:
                     return json.loads(response[start:end])
-                except:
+                except json.JSONDecodeError:
                     pass
             return {"error": "Failed to parse JSON", "raw": response}
 
@@ -0,0 +1,117 @@
+"""
+Cache read-through de leads por teléfono.
+get_lead_by_phone se sirve desde un LRU en proceso con TTL; los
+repositorios lo refrescan con la fila que devuelven sus propias escrituras
+y lo invalidan cuando la escritura no devuelve el lead. Cada entrada lleva
+su versión (updated_at): una fila más vieja que la cacheada no la pisa y
+una lectura de la base más nueva que la cacheada cuenta como lectura
+obsoleta detectada. Con LEAD_CACHE_SHARED_BACKEND las entradas se
+comparten entre workers por Redis y el LRU local solo vive
+LEAD_CACHE_LOCAL_TTL_SECONDS.
+"""
+from datetime import datetime
+from typing import Optional
+
+from ..config import settings
+from ..models import Lead
+from ..utils import metrics
+from ..utils.cache import TTLCache, CacheBackend, get_shared_backend
+
+
+def _version(lead: Lead) -> Optional[datetime]:
+    # Comparable aunque llegue sin zona horaria
+    return lead.updated_at.astimezone() if lead.updated_at else None
+
+
+class LeadCache:
+    """LRU de leads con TTL, versión por updated_at y backend compartido opcional."""
+
+    KEY_PREFIX = "lead:"
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl_seconds: float = None,
+        backend: Optional[CacheBackend] = None
+    ):
+        self.ttl_seconds = settings.lead_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.backend = backend
+        # Con backend compartido otro worker puede escribir el lead: L1 corto
+        local_ttl = min(self.ttl_seconds, settings.lead_cache_local_ttl_seconds) if backend else self.ttl_seconds
+        self._local = TTLCache(
+            max_entries=max_entries or settings.lead_cache_max_entries,
+            ttl_seconds=local_ttl
+        )
+
+    async def get(self, phone_number: str) -> Optional[Lead]:
+        """Lead cacheado (copia) o None."""
+        lead = self._local.get(phone_number)
+        if lead is None and self.backend is not None:
+            try:
+                raw = await self.backend.get(self.KEY_PREFIX + phone_number)
+            except Exception as e:
+                metrics.increment("lead_cache_backend_errors")
+                print(f"⚠️ Error leyendo cache de leads compartido: {e}")
+                raw = None
+            if raw:
+                lead = Lead.model_validate_json(raw)
+                self._local.set(phone_number, lead)
+
+        if lead is None:
+            metrics.increment("lead_cache", outcome="miss")
+            return None
+        metrics.increment("lead_cache", outcome="hit")
+        return lead.model_copy(deep=True)
+
+    async def put(self, lead: Lead, from_read: bool = False) -> None:
+        """
+        Guarda la versión más reciente del lead. Una fila más vieja que la
+        cacheada se descarta; con `from_read`, una más nueva indica que la
+        entrada estaba obsoleta (la escribió otro proceso).
+        """
+        cached = self._local.get(lead.phone_number)
+        if cached is not None and _version(cached) and _version(lead):
+            if _version(lead) < _version(cached):
+                metrics.increment("lead_cache_stale_writes_ignored")
+                return
+            if from_read and _version(lead) > _version(cached):
+                metrics.increment("lead_cache_stale_reads")
+
+        lead = lead.model_copy(deep=True)
+        self._local.set(lead.phone_number, lead)
+        if self.backend is not None:
+            try:
+                await self.backend.set(
+                    self.KEY_PREFIX + lead.phone_number, lead.model_dump_json(), self.ttl_seconds
+                )
+            except Exception as e:
+                metrics.increment("lead_cache_backend_errors")
+                print(f"⚠️ Error escribiendo cache de leads compartido: {e}")
+
+    async def invalidate(self, phone_number: str) -> None:
+        """Descarta el lead (escritura que no devolvió la fila)."""
+        self._local.pop(phone_number)
+        if self.backend is not None:
+            try:
+                await self.backend.delete(self.KEY_PREFIX + phone_number)
+            except Exception as e:
+                metrics.increment("lead_cache_backend_errors")
+                print(f"⚠️ Error invalidando cache de leads compartido: {e}")
+
+    def stats(self) -> dict:
+        hits = metrics.get_counter("lead_cache", outcome="hit")
+        misses = metrics.get_counter("lead_cache", outcome="miss")
+        return {
+            "entries": len(self._local),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "stale_reads": metrics.get_counter("lead_cache_stale_reads"),
+            "shared_backend": self.backend is not None,
+        }
+
+
+# Instancia global
+lead_cache = LeadCache(
+    backend=get_shared_backend() if settings.lead_cache_shared_backend else None
+)
@@ -0,0 +1,98 @@
+"""
+Cache de respuestas del LLM.
+Llamadas idénticas (mismo modelo, mensajes, temperatura y formato) se
+sirven desde un LRU en proceso y, si hay Redis configurado, desde un
+backend compartido entre workers.
+"""
+import hashlib
+import json
+from typing import List, Optional
+
+from ..config import settings
+from ..utils import metrics
+from ..utils.cache import TTLCache, CacheBackend, get_shared_backend
+
+
+class LLMResponseCache:
+    """LRU con TTL por entrada más backend compartido opcional."""
+
+    KEY_PREFIX = "llm:"
+
+    def __init__(self, max_entries: int = None, backend: Optional[CacheBackend] = None):
+        self._local = TTLCache(max_entries=max_entries or settings.llm_cache_max_entries)
+        self.backend = backend
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[dict] = None
+    ) -> str:
+        """Hash canónico de los parámetros que determinan la respuesta."""
+        canonical = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "response_format": response_format,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str, agent: str) -> Optional[dict]:
+        """Busca una respuesta cacheada ({"content", "usage"})."""
+        entry = self._local.get(key)
+        if entry is None and self.backend is not None:
+            try:
+                raw = await self.backend.get(self.KEY_PREFIX + key)
+            except Exception as e:
+                metrics.increment("llm_cache_backend_errors")
+                print(f"⚠️ Error leyendo cache LLM compartido: {e}")
+                raw = None
+            if raw:
+                entry = json.loads(raw)
+                self._local.set(key, entry)
+
+        if entry is None:
+            metrics.increment("llm_cache_misses", agent=agent)
+            return None
+
+        metrics.increment("llm_cache_hits", agent=agent)
+        usage = entry.get("usage") or {}
+        metrics.increment("llm_cache_tokens_saved", usage.get("total_tokens", 0), agent=agent)
+        return entry
+
+    async def set(self, key: str, entry: dict, ttl_seconds: float) -> None:
+        self._local.set(key, entry, ttl_seconds)
+        if self.backend is not None:
+            try:
+                await self.backend.set(self.KEY_PREFIX + key, json.dumps(entry), ttl_seconds)
+            except Exception as e:
+                metrics.increment("llm_cache_backend_errors")
+                print(f"⚠️ Error escribiendo cache LLM compartido: {e}")
+
+    def stats(self) -> dict:
+        snapshot = metrics.snapshot()["counters"]
+        hits = sum(v for k, v in snapshot.items() if k.startswith("llm_cache_hits"))
+        misses = sum(v for k, v in snapshot.items() if k.startswith("llm_cache_misses"))
+        saved = sum(v for k, v in snapshot.items() if k.startswith("llm_cache_tokens_saved"))
+        return {
+            "entries": len(self._local),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "tokens_saved": saved,
+            "shared_backend": self.backend is not None,
+        }
+
+
+# Instancia global
+llm_cache = LLMResponseCache(
+    backend=get_shared_backend() if settings.llm_cache_shared_backend else None
+)
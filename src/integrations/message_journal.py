@@ -0,0 +1,174 @@
+"""
+Journal write-behind de mensajes.
+save_message (y los mensajes de cada turno) no insertan en el camino de la
+respuesta: el mensaje recibe id y created_at en el cliente, queda en un
+buffer en memoria y se inserta en bloque (RPC append_messages) al llegar a
+MESSAGE_JOURNAL_MAX_BATCH mensajes o cada MESSAGE_JOURNAL_FLUSH_INTERVAL_SECONDS.
+La misma llamada incrementa message_count y avanza last_message_at y el
+watermark de extracción de cada lead en la base (sin leer-modificar-escribir).
+Hasta que se confirman, las lecturas del historial de un lead incluyen sus
+mensajes pendientes; al apagar se vacía el buffer.
+"""
+import asyncio
+import contextvars
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..models import Lead, Message
+from ..utils import metrics
+
+
+def message_row(message: Message, mark_extracted: bool = False) -> dict:
+    """Fila de messages para las funciones append_messages / commit_turn."""
+    return {
+        "id": message.id,
+        "phone_number": message.phone_number,
+        "direction": message.direction,
+        "content": message.content,
+        "message_type": message.message_type,
+        "whatsapp_id": message.whatsapp_id,
+        "metadata": message.metadata,
+        "created_at": message.created_at.isoformat() if message.created_at else None,
+        "mark_extracted": mark_extracted
+    }
+
+
+def _latest(*values: Optional[datetime]) -> datetime:
+    return max((v for v in values if v), key=lambda d: d.astimezone())
+
+
+class MessageJournal:
+    """Buffer de mensajes con flush por tamaño o tiempo en inserciones en bloque."""
+
+    def __init__(
+        self,
+        repository,
+        max_batch: int = None,
+        flush_interval_seconds: float = None
+    ):
+        self.repository = repository
+        self.max_batch = max_batch or settings.message_journal_max_batch
+        self.flush_interval = (
+            settings.message_journal_flush_interval_seconds
+            if flush_interval_seconds is None else flush_interval_seconds
+        )
+        self._buffer: List[Tuple[Message, bool]] = []
+        # Pendientes por lead (en buffer o en un flush sin confirmar)
+        self._pending: Dict[str, List[Tuple[Message, bool]]] = {}
+        self._last_created_at: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            # Contexto vacío: no hereda la unidad de trabajo del turno que lo arranca
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context()
+            )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Detiene el flush periódico y confirma lo pendiente (apagado)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            print(f"⚠️ {len(self._buffer)} mensajes sin guardar al apagar")
+
+    def append(self, message: Message, mark_extracted: bool = False) -> Message:
+        """Encola el mensaje y lo retorna con id y created_at asignados."""
+        # created_at estrictamente creciente: fija el orden del historial
+        created_at = (message.created_at or datetime.now()).astimezone()
+        if self._last_created_at and created_at <= self._last_created_at:
+            created_at = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = created_at
+        message = message.model_copy(update={
+            "id": message.id or str(uuid.uuid4()),
+            "created_at": created_at
+        })
+
+        entry = (message, mark_extracted)
+        self._buffer.append(entry)
+        self._pending.setdefault(message.phone_number, []).append(entry)
+        metrics.increment("message_journal_appended")
+
+        self._ensure_started()
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+        return message
+
+    async def flush(self) -> int:
+        """Inserta en bloque lo acumulado. Retorna los mensajes confirmados."""
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+                try:
+                    await self.repository.append_messages([message_row(m, mark) for m, mark in batch])
+                except Exception as e:
+                    # Se reintenta en el próximo flush (las filas llevan id: sin duplicados)
+                    self._buffer = batch + self._buffer
+                    metrics.increment("message_journal_flush_errors")
+                    print(f"⚠️ Error guardando {len(batch)} mensajes, se reintenta: {e}")
+                    break
+                written += len(batch)
+                metrics.observe("message_journal_batch_size", len(batch))
+                await self._confirm(batch)
+            return written
+
+    async def _confirm(self, batch: List[Tuple[Message, bool]]) -> None:
+        confirmed = {m.id for m, _ in batch}
+        for phone in {m.phone_number for m, _ in batch}:
+            remaining = [e for e in self._pending.get(phone, []) if e[0].id not in confirmed]
+            if remaining:
+                self._pending[phone] = remaining
+            else:
+                self._pending.pop(phone, None)
+            # Contador y watermark cambiaron en la base sin devolver el lead
+            if self.repository.lead_cache:
+                await self.repository.lead_cache.invalidate(phone)
+
+    def pending_for(self, phone_number: str) -> List[Message]:
+        return [m for m, _ in self._pending.get(phone_number, [])]
+
+    def merge_history(self, phone_number: str, messages: List[Message], limit: int) -> List[Message]:
+        """Historial de la base más los pendientes del lead, sin duplicados."""
+        pending = self.pending_for(phone_number)
+        if not pending:
+            return messages
+        seen = {m.id for m in messages}
+        merged = messages + [m for m in pending if m.id not in seen]
+        merged.sort(key=lambda m: m.created_at.astimezone())
+        return merged[-limit:]
+
+    def overlay_lead(self, lead: Lead) -> Lead:
+        """Lead con el watermark y último mensaje de sus escrituras pendientes."""
+        entries = self._pending.get(lead.phone_number)
+        if not entries:
+            return lead
+        updates = {"last_message_at": _latest(lead.last_message_at, entries[-1][0].created_at)}
+        marked = [m.created_at for m, mark in entries if mark]
+        if marked:
+            updates["extraction_watermark"] = _latest(lead.extraction_watermark, marked[-1])
+        return lead.model_copy(update=updates)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "pending_leads": len(self._pending),
+            "appended": metrics.get_counter("message_journal_appended"),
+            "flush_errors": metrics.get_counter("message_journal_flush_errors"),
+        }
@@ -0,0 +1,321 @@
+"""
+Repositorio de persistencia sobre Postgres directo con asyncpg.
+Misma interfaz que SupabaseClient, pero sin hilos: las consultas son
+nativamente asíncronas, salen de un pool de conexiones y asyncpg prepara y
+cachea cada sentencia por conexión (DATABASE_STATEMENT_CACHE_SIZE), así que
+las consultas repetidas de cada turno no se vuelven a planificar.
+Se activa con DATABASE_URL (ver create_repository). Los leads se leen a
+través de lead_cache y los mensajes pasan por el journal, como en
+SupabaseClient.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from ..config import settings
+from ..models import Lead, Message, Appointment
+from .lead_cache import lead_cache
+from .message_journal import MessageJournal, message_row
+from .unit_of_work import count_round_trip
+
+
+# Columnas de leads que se pueden actualizar (nunca se interpolan otras)
+LEAD_COLUMNS = set(Lead.model_fields) - {"id", "created_at"}
+TIMESTAMP_COLUMNS = {"extraction_watermark", "summary_watermark", "updated_at", "last_message_at"}
+
+SELECT_LEAD = "SELECT * FROM leads WHERE phone_number = $1"
+
+INSERT_LEAD = """
+INSERT INTO leads (phone_number, fsm_state, bant_score, message_count, source, extracted_facts, puntos_dolor)
+VALUES ($1, 'INICIO', 0, 0, 'whatsapp', '{}'::jsonb, '[]'::jsonb)
+RETURNING *
+"""
+
+SELECT_HISTORY = """
+SELECT m.* FROM messages m
+JOIN leads l ON l.id = m.lead_id
+WHERE l.phone_number = $1
+ORDER BY m.created_at DESC
+LIMIT $2
+"""
+
+APPEND_MESSAGES = "SELECT append_messages($1::jsonb)"
+
+LOAD_CONTEXT = "SELECT load_conversation_context($1, $2)"
+
+COMMIT_TURN = "SELECT commit_turn($1, $2::jsonb, $3::jsonb, $4::jsonb)"
+
+INSERT_APPOINTMENT = """
+INSERT INTO appointments (lead_id, calendar_event_id, meeting_link, scheduled_at, duration_minutes, status, reminder_sent)
+VALUES ($1, $2, $3, $4, $5, $6, $7)
+RETURNING *
+"""
+
+
+def _row(record) -> Dict[str, Any]:
+    """Record de asyncpg -> dict con UUIDs como texto (como los devuelve la API)."""
+    return {k: str(v) if isinstance(v, UUID) else v for k, v in dict(record).items()}
+
+
+def _timestamp(value):
+    """Los timestamps llegan como ISO (convención de la API REST); asyncpg pide datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.astimezone()
+    return value
+
+
+async def _init_connection(conn) -> None:
+    # JSONB <-> dict/list, igual que supabase-py
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+
+class PostgresRepository:
+    """Persistencia de leads, mensajes y citas con un pool asyncpg."""
+
+    def __init__(self, dsn: str):
+        import asyncpg
+        self._asyncpg = asyncpg
+        self.dsn = dsn
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self.lead_cache = lead_cache if settings.lead_cache_enabled else None
+        self.journal: Optional[MessageJournal] = None
+
+    async def start(self) -> None:
+        """Abre el pool (DATABASE_POOL_MIN_SIZE conexiones listas)."""
+        await self._get_pool()
+
+    async def close(self) -> None:
+        """Guarda los mensajes pendientes y cierra el pool de conexiones."""
+        if self.journal:
+            await self.journal.stop()
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await self._asyncpg.create_pool(
+                        self.dsn,
+                        min_size=settings.database_pool_min_size,
+                        max_size=settings.database_pool_max_size,
+                        statement_cache_size=settings.database_statement_cache_size,
+                        command_timeout=settings.database_command_timeout,
+                        init=_init_connection
+                    )
+        return self._pool
+
+    async def _fetch(self, query: str, *args) -> List[Dict[str, Any]]:
+        pool = await self._get_pool()
+        count_round_trip()
+        return [_row(r) for r in await pool.fetch(query, *args)]
+
+    async def _fetchrow(self, query: str, *args) -> Optional[Dict[str, Any]]:
+        pool = await self._get_pool()
+        count_round_trip()
+        record = await pool.fetchrow(query, *args)
+        return _row(record) if record else None
+
+    async def _fetchval(self, query: str, *args) -> Any:
+        pool = await self._get_pool()
+        count_round_trip()
+        return await pool.fetchval(query, *args)
+
+    async def _cache_lead(self, lead: Lead, from_read: bool = False) -> Lead:
+        if self.lead_cache:
+            await self.lead_cache.put(lead, from_read=from_read)
+        return lead
+
+    async def _invalidate_lead(self, phone_number: str) -> None:
+        if self.lead_cache:
+            await self.lead_cache.invalidate(phone_number)
+
+    def _with_pending(self, phone_number: str, messages: List[Message], limit: int) -> List[Message]:
+        """Historial más los mensajes del lead aún en el journal."""
+        if self.journal:
+            return self.journal.merge_history(phone_number, messages, limit)
+        return messages
+
+    def _context(self, lead: Optional[Lead], messages: List[Message]) -> dict:
+        if lead and self.journal:
+            lead = self.journal.overlay_lead(lead)
+        return {
+            "lead": lead.model_dump() if lead else None,
+            "messages": [m.model_dump() for m in messages],
+            "fsm_state": lead.fsm_state if lead else "INICIO",
+            "bant_score": lead.bant_score if lead else 0,
+            "extracted_facts": lead.extracted_facts if lead else {}
+        }
+
+    # =====================
+    # LEADS
+    # =====================
+
+    async def get_lead_by_phone(self, phone_number: str, use_cache: bool = True) -> Optional[Lead]:
+        """Obtiene un lead por número de teléfono (desde lead_cache si está)."""
+        if use_cache and self.lead_cache:
+            cached = await self.lead_cache.get(phone_number)
+            if cached:
+                return cached
+        row = await self._fetchrow(SELECT_LEAD, phone_number)
+        return await self._cache_lead(Lead(**row), from_read=True) if row else None
+
+    async def create_lead(self, phone_number: str) -> Lead:
+        """Crea un nuevo lead."""
+        return await self._cache_lead(Lead(**await self._fetchrow(INSERT_LEAD, phone_number)))
+
+    async def get_or_create_lead(self, phone_number: str) -> Lead:
+        """Obtiene o crea un lead."""
+        lead = await self.get_lead_by_phone(phone_number)
+        if not lead:
+            lead = await self.create_lead(phone_number)
+        return lead
+
+    async def update_lead(self, phone_number: str, updates: dict) -> Optional[Lead]:
+        """Actualiza un lead."""
+        columns = [c for c in updates if c != "updated_at"]
+        unknown = set(columns) - LEAD_COLUMNS
+        if unknown:
+            raise ValueError(f"Columnas de leads desconocidas: {sorted(unknown)}")
+
+        # Orden estable: el mismo conjunto de columnas reutiliza la sentencia preparada
+        columns.sort()
+        assignments = [f"{c} = ${i}" for i, c in enumerate(columns, start=2)]
+        assignments.append("updated_at = NOW()")
+        query = f"UPDATE leads SET {', '.join(assignments)} WHERE phone_number = $1 RETURNING *"
+        values = [
+            _timestamp(updates[c]) if c in TIMESTAMP_COLUMNS else updates[c]
+            for c in columns
+        ]
+
+        row = await self._fetchrow(query, phone_number, *values)
+        if not row:
+            await self._invalidate_lead(phone_number)
+            return None
+        return await self._cache_lead(Lead(**row))
+
+    async def update_fsm_state(self, phone_number: str, new_state: str) -> None:
+        """Actualiza el estado FSM de un lead."""
+        await self.update_lead(phone_number, {"fsm_state": new_state})
+
+    async def update_extracted_facts(self, phone_number: str, facts: dict) -> None:
+        """Actualiza los hechos extraídos de un lead (merge en la base)."""
+        row = await self._fetchrow(
+            "UPDATE leads SET extracted_facts = COALESCE(extracted_facts, '{}'::jsonb) || $2::jsonb, "
+            "updated_at = NOW() WHERE phone_number = $1 RETURNING *",
+            phone_number, facts
+        )
+        if row:
+            await self._cache_lead(Lead(**row))
+
+    async def update_bant_score(self, phone_number: str, score: int) -> None:
+        """Actualiza el BANT score de un lead."""
+        await self.update_lead(phone_number, {"bant_score": score})
+
+    # =====================
+    # MENSAJES
+    # =====================
+
+    async def save_message(self, message: Message, mark_extracted: bool = False) -> Optional[Message]:
+        """
+        Guarda un mensaje (en diferido si hay journal).
+        Con `mark_extracted` el mensaje pasa a ser el watermark de extracción
+        del lead (lo posterior es el delta del extractor incremental).
+        """
+        if self.journal:
+            return self.journal.append(message, mark_extracted)
+
+        message = message.model_copy(update={
+            "id": message.id or str(uuid.uuid4()),
+            "created_at": message.created_at.astimezone()
+        })
+        await self.append_messages([message_row(message, mark_extracted)])
+        # El contador y el watermark cambiaron en la base sin devolver el lead
+        await self._invalidate_lead(message.phone_number)
+        return message
+
+    async def append_messages(self, rows: List[dict]) -> None:
+        """
+        Inserta mensajes en bloque (función append_messages) e incrementa
+        message_count y el watermark de cada lead en la misma transacción.
+        """
+        await self._fetchval(APPEND_MESSAGES, rows)
+
+    async def get_message_history(
+        self,
+        phone_number: str,
+        limit: int = 10
+    ) -> List[Message]:
+        """Obtiene el historial de mensajes de un lead (incluye los pendientes)."""
+        rows = await self._fetch(SELECT_HISTORY, phone_number, limit)
+        messages = [Message(**row, phone_number=phone_number) for row in rows]
+        return self._with_pending(phone_number, messages[::-1], limit)  # Orden cronológico
+
+    # =====================
+    # CITAS
+    # =====================
+
+    async def create_appointment(self, appointment: Appointment) -> Optional[Appointment]:
+        """Crea una cita."""
+        row = await self._fetchrow(
+            INSERT_APPOINTMENT,
+            UUID(appointment.lead_id),
+            appointment.calendar_event_id,
+            appointment.meeting_link,
+            _timestamp(appointment.scheduled_at),
+            appointment.duration_minutes,
+            appointment.status,
+            appointment.reminder_sent
+        )
+        return Appointment(**row) if row else appointment
+
+    # =====================
+    # CONTEXTO CONVERSACIÓN
+    # =====================
+
+    async def get_conversation_context(self, phone_number: str) -> dict:
+        """Obtiene el contexto completo para los agentes (lead e historial en paralelo)."""
+        lead, messages = await asyncio.gather(
+            self.get_lead_by_phone(phone_number),
+            self.get_message_history(phone_number, limit=settings.context_history_messages)
+        )
+        return self._context(lead, messages)
+
+    async def load_conversation_context(self, phone_number: str) -> dict:
+        """
+        Contexto del turno en un round trip (función load_conversation_context):
+        obtiene o crea el lead y trae sus últimos mensajes.
+        """
+        data = await self._fetchval(LOAD_CONTEXT, phone_number, settings.context_history_messages)
+
+        lead = await self._cache_lead(Lead(**data["lead"]), from_read=True)
+        messages = [Message(**msg, phone_number=phone_number) for msg in data["messages"]]
+        return self._context(lead, self._with_pending(phone_number, messages, settings.context_history_messages))
+
+    # =====================
+    # UNIDAD DE TRABAJO
+    # =====================
+
+    async def commit_turn(
+        self,
+        phone_number: str,
+        lead_updates: dict,
+        facts: dict,
+        messages: List[dict]
+    ) -> Optional[Lead]:
+        """
+        Confirma las escrituras de un turno en una transacción (función
+        commit_turn): estado FSM/BANT, merge de hechos, mensajes y contador.
+        """
+        row = await self._fetchval(COMMIT_TURN, phone_number, lead_updates, facts, messages)
+        return await self._cache_lead(Lead(**row)) if row else None
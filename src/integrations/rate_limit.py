@@ -0,0 +1,206 @@
+"""
+Control de tráfico hacia el LLM para todo el proceso.
+Combina presupuestos de requests y tokens por minuto (token buckets) con
+un límite de concurrencia adaptativo AIMD y colas por prioridad, para que
+un pico de tráfico no se convierta en una ráfaga de 429.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, List, Optional, Tuple
+
+from ..config import settings
+from ..utils import metrics
+
+
+class Priority(IntEnum):
+    """Clases de prioridad (menor valor = se atiende antes)."""
+    REPLY = 0        # Respuesta al cliente (agente conversacional)
+    ANALYSIS = 1     # Análisis en el camino de la respuesta (router, extractor, calificador)
+    BACKGROUND = 2   # Trabajo diferible (resúmenes, recalificación)
+
+
+class TokenBucket:
+    """Token bucket con recarga continua; rate_per_minute <= 0 lo desactiva."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta poder consumir `amount` (0 si ya se puede)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.enabled:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AIMDLimiter:
+    """
+    Límite de concurrencia AIMD: sube 1/límite por éxito rápido y se
+    multiplica por `backoff` ante un 429 o una latencia sobre el objetivo.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float, backoff: float = 0.7):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._last_decrease = 0.0
+
+    def on_result(self, latency: float, throttled: bool) -> None:
+        if throttled or latency > self.latency_target:
+            # Una sola reducción por ventana de latencia para no colapsar el límite
+            now = time.monotonic()
+            if now - self._last_decrease >= min(self.latency_target, 1.0):
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+
+class LLMTrafficController:
+    """Admisión de llamadas al LLM por prioridad, concurrencia y presupuesto."""
+
+    def __init__(
+        self,
+        rpm: float = None,
+        tpm: float = None,
+        initial_concurrency: int = None,
+        min_concurrency: int = None,
+        max_concurrency: int = None,
+        latency_target: float = None
+    ):
+        self.requests = TokenBucket(settings.llm_rpm_limit if rpm is None else rpm)
+        self.tokens = TokenBucket(settings.llm_tpm_limit if tpm is None else tpm)
+        self.concurrency = AIMDLimiter(
+            initial=initial_concurrency or settings.llm_concurrency_initial,
+            minimum=min_concurrency or settings.llm_concurrency_min,
+            maximum=max_concurrency or settings.llm_concurrency_max,
+            latency_target=latency_target or settings.llm_latency_target_seconds
+        )
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, estimated_tokens: int) -> AsyncIterator["_Permit"]:
+        """
+        Espera turno y reserva capacidad para una llamada.
+        Al salir se libera el cupo y se ajusta el límite con el resultado
+        reportado en el permiso (latencia, 429, tokens reales).
+        """
+        queued_at = time.monotonic()
+        await self._acquire(priority, estimated_tokens)
+        metrics.observe("llm_limiter_wait_seconds", time.monotonic() - queued_at, priority=priority.name.lower())
+        permit = _Permit(estimated_tokens)
+        try:
+            yield permit
+        finally:
+            self.in_flight -= 1
+            if permit.latency is not None:
+                self.concurrency.on_result(permit.latency, permit.throttled)
+            if permit.throttled:
+                metrics.increment("llm_limiter_throttled")
+            if permit.actual_tokens is not None:
+                self.tokens.refund(estimated_tokens - permit.actual_tokens)
+            self._publish_gauges()
+            self._dispatch()
+
+    async def _acquire(self, priority: Priority, estimated_tokens: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), estimated_tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Ya se había concedido el cupo: devolverlo
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Concede cupos en orden de prioridad mientras haya capacidad."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, estimated_tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.concurrency.limit):
+                break
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+            heapq.heappop(self._waiters)
+            self.requests.consume(1)
+            self.tokens.consume(estimated_tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+        self._publish_gauges()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for *_, f in self._waiters if not f.done()),
+            "rpm_available": round(self.requests.tokens, 1) if self.requests.enabled else None,
+            "tpm_available": round(self.tokens.tokens, 1) if self.tokens.enabled else None,
+            "wait_seconds": {
+                p.name.lower(): metrics.get_distribution("llm_limiter_wait_seconds", priority=p.name.lower()).summary()
+                for p in Priority
+            },
+        }
+
+    def _publish_gauges(self) -> None:
+        metrics.set_gauge("llm_limiter_concurrency_limit", self.concurrency.limit)
+        metrics.set_gauge("llm_limiter_in_flight", self.in_flight)
+        metrics.set_gauge("llm_limiter_queued", len(self._waiters))
+
+
+class _Permit:
+    """Resultado de la llamada que el caller reporta al limitador."""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.latency: Optional[float] = None
+        self.throttled = False
+        self.actual_tokens: Optional[int] = None
+
+
+# Instancia global (compartida por todos los agentes del proceso)
+llm_traffic = LLMTrafficController()
@@ -0,0 +1,90 @@
+"""
+Resiliencia para llamadas al LLM.
+Backoff exponencial con jitter, circuit breaker y errores tipados para que
+un proveedor degradado falle rápido en vez de bloquear el turno.
+"""
+import random
+import time
+from typing import Optional
+
+from ..utils import metrics
+
+
+# Códigos HTTP que vale la pena reintentar
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DeepSeekError(Exception):
+    """La llamada a DeepSeek falló tras agotar los reintentos."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(DeepSeekError):
+    """El circuit breaker está abierto: se falla rápido sin llamar al proveedor."""
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial con full jitter: U(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico: closed -> open -> half_open -> closed.
+    Tras `failure_threshold` fallos consecutivos se abre durante
+    `recovery_seconds`; luego deja pasar llamadas de prueba y se cierra con
+    el primer éxito.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        metrics.set_gauge("llm_circuit_state", 0, circuit=name)
+
+    def allow(self) -> bool:
+        """Indica si se puede llamar al proveedor."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                metrics.increment("llm_circuit_rejections", circuit=self.name)
+                return False
+            self._transition(self.HALF_OPEN)
+        return True
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != self.OPEN:
+                self._transition(self.OPEN)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+        }
+
+    def _transition(self, new_state: str) -> None:
+        print(f"⚡ Circuit breaker {self.name}: {self.state} -> {new_state}")
+        metrics.increment("llm_circuit_transitions", circuit=self.name, to=new_state)
+        metrics.set_gauge("llm_circuit_state", self._STATE_VALUES[new_state], circuit=self.name)
+        self.state = new_state
@@ -1,14 +1,27 @@
 """
 Cliente Supabase para persistencia de datos.
 Maneja leads, mensajes, estados FSM y citas.
+El cliente de supabase-py es síncrono: cada consulta corre en un pool de
+hilos propio para no bloquear el event loop (y con él al resto de
+conversaciones del worker). Con DATABASE_URL se usa en su lugar
+PostgresRepository (asyncpg), con la misma interfaz. Los leads se leen a
+través de lead_cache y cada escritura lo refresca con la fila devuelta.
+Con MESSAGE_JOURNAL_ENABLED los mensajes se guardan en diferido y en bloque
+(MessageJournal); las lecturas de historial incluyen los pendientes.
 """
 from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List
 from datetime import datetime
+import asyncio
 import json
+import uuid
 
 from ..config import settings
 from ..models import Lead, Message, Appointment
+from .lead_cache import lead_cache
+from .message_journal import MessageJournal, message_row
+from .unit_of_work import count_round_trip
 
 
 class SupabaseClient:
@@ -23,22 +36,73 @@ class SupabaseClient:
         else:
             self.client = None
             print("⚠️ Supabase no configurado. Usando modo mock.")
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.lead_cache = lead_cache if settings.lead_cache_enabled else None
+        self.journal: Optional[MessageJournal] = None
+
+    async def start(self) -> None:
+        """Sin conexiones que abrir: el pool de hilos se crea al primer uso."""
+
+    async def close(self) -> None:
+        """Guarda los mensajes pendientes y libera el pool de hilos."""
+        if self.journal:
+            await self.journal.stop()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _execute(self, query):
+        """Ejecuta una consulta de supabase-py fuera del event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.supabase_max_workers,
+                thread_name_prefix="supabase"
+            )
+        count_round_trip()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, query.execute)
+
+    async def _cache_lead(self, lead: Lead, from_read: bool = False) -> Lead:
+        if self.lead_cache:
+            await self.lead_cache.put(lead, from_read=from_read)
+        return lead
+
+    def _with_pending(self, phone_number: str, messages: List[Message], limit: int) -> List[Message]:
+        """Historial más los mensajes del lead aún en el journal."""
+        if self.journal:
+            return self.journal.merge_history(phone_number, messages, limit)
+        return messages
+
+    def _context(self, lead: Optional[Lead], messages: List[Message]) -> dict:
+        if lead and self.journal:
+            lead = self.journal.overlay_lead(lead)
+        return {
+            "lead": lead.model_dump() if lead else None,
+            "messages": [m.model_dump() for m in messages],
+            "fsm_state": lead.fsm_state if lead else "INICIO",
+            "bant_score": lead.bant_score if lead else 0,
+            "extracted_facts": lead.extracted_facts if lead else {}
+        }
     
     # =====================
     # LEADS
     # =====================
     
-    async def get_lead_by_phone(self, phone_number: str) -> Optional[Lead]:
-        """Obtiene un lead por número de teléfono."""
+    async def get_lead_by_phone(self, phone_number: str, use_cache: bool = True) -> Optional[Lead]:
+        """Obtiene un lead por número de teléfono (desde lead_cache si está)."""
         if not self.client:
             return None
+        
+        if use_cache and self.lead_cache:
+            cached = await self.lead_cache.get(phone_number)
+            if cached:
+                return cached
             
-        result = self.client.table("leads").select("*").eq(
+        result = await self._execute(self.client.table("leads").select("*").eq(
             "phone_number", phone_number
-        ).execute()
+        ))
         
         if result.data and len(result.data) > 0:
-            return Lead(**result.data[0])
+            return await self._cache_lead(Lead(**result.data[0]), from_read=True)
         return None
     
     async def create_lead(self, phone_number: str) -> Lead:
@@ -56,8 +120,8 @@ class SupabaseClient:
         if not self.client:
             return Lead(**lead_data, id="mock-id")
         
-        result = self.client.table("leads").insert(lead_data).execute()
-        return Lead(**result.data[0])
+        result = await self._execute(self.client.table("leads").insert(lead_data))
+        return await self._cache_lead(Lead(**result.data[0]))
     
     async def get_or_create_lead(self, phone_number: str) -> Lead:
         """Obtiene o crea un lead."""
@@ -73,12 +137,14 @@ class SupabaseClient:
             
         updates["updated_at"] = datetime.now().isoformat()
         
-        result = self.client.table("leads").update(updates).eq(
+        result = await self._execute(self.client.table("leads").update(updates).eq(
             "phone_number", phone_number
-        ).execute()
+        ))
         
         if result.data:
-            return Lead(**result.data[0])
+            return await self._cache_lead(Lead(**result.data[0]))
+        if self.lead_cache:
+            await self.lead_cache.invalidate(phone_number)
         return None
     
     async def update_fsm_state(self, phone_number: str, new_state: str) -> None:
@@ -86,8 +152,8 @@ class SupabaseClient:
         await self.update_lead(phone_number, {"fsm_state": new_state})
     
     async def update_extracted_facts(self, phone_number: str, facts: dict) -> None:
-        """Actualiza los hechos extraídos de un lead (merge)."""
-        lead = await self.get_lead_by_phone(phone_number)
+        """Actualiza los hechos extraídos de un lead (merge sobre la fila actual)."""
+        lead = await self.get_lead_by_phone(phone_number, use_cache=False)
         if lead:
             existing_facts = lead.extracted_facts or {}
             merged_facts = {**existing_facts, **facts}
@@ -101,56 +167,56 @@ class SupabaseClient:
     # MENSAJES
     # =====================
     
-    async def save_message(self, message: Message) -> Optional[Message]:
-        """Guarda un mensaje."""
+    async def save_message(self, message: Message, mark_extracted: bool = False) -> Optional[Message]:
+        """
+        Guarda un mensaje (en diferido si hay journal).
+        Con `mark_extracted` el mensaje pasa a ser el watermark de extracción
+        del lead (lo posterior es el delta del extractor incremental).
+        """
+        if self.journal:
+            return self.journal.append(message, mark_extracted)
         if not self.client:
             return message
         
-        # Obtener lead_id
-        lead = await self.get_lead_by_phone(message.phone_number)
-        if not lead:
-            return None
-        
-        message_data = {
-            "lead_id": lead.id,
-            "direction": message.direction,
-            "content": message.content,
-            "message_type": message.message_type,
-            "whatsapp_id": message.whatsapp_id,
-            "metadata": message.metadata
-        }
-        
-        result = self.client.table("messages").insert(message_data).execute()
-        
-        # Incrementar contador de mensajes
-        await self.update_lead(message.phone_number, {
-            "message_count": (lead.message_count or 0) + 1,
-            "last_message_at": datetime.now().isoformat()
+        message = message.model_copy(update={
+            "id": message.id or str(uuid.uuid4()),
+            "created_at": message.created_at.astimezone()
         })
-        
-        if result.data:
-            return Message(**result.data[0], phone_number=message.phone_number)
+        await self.append_messages([message_row(message, mark_extracted)])
+        if self.lead_cache:
+            await self.lead_cache.invalidate(message.phone_number)
         return message
     
+    async def append_messages(self, rows: List[dict]) -> None:
+        """
+        Inserta mensajes en bloque (RPC append_messages) e incrementa
+        message_count y el watermark de cada lead en la misma transacción.
+        """
+        if not self.client:
+            return
+        await self._execute(self.client.rpc("append_messages", {"p_messages": rows}))
+    
     async def get_message_history(
         self, 
         phone_number: str, 
         limit: int = 10
     ) -> List[Message]:
-        """Obtiene el historial de mensajes de un lead."""
-        if not self.client:
-            return []
-        
+        """Obtiene el historial de mensajes de un lead (incluye los pendientes)."""
         lead = await self.get_lead_by_phone(phone_number)
-        if not lead or not lead.id:
+        messages = await self._history_for_lead(lead, limit)
+        return self._with_pending(phone_number, messages, limit)
+    
+    async def _history_for_lead(self, lead: Optional[Lead], limit: int) -> List[Message]:
+        """Historial de un lead ya cargado (sin volver a buscarlo)."""
+        if not self.client or not lead or not lead.id:
             return []
         
-        result = self.client.table("messages").select("*").eq(
+        result = await self._execute(self.client.table("messages").select("*").eq(
             "lead_id", lead.id
-        ).order("created_at", desc=True).limit(limit).execute()
+        ).order("created_at", desc=True).limit(limit))
         
         messages = [
-            Message(**msg, phone_number=phone_number) 
+            Message(**msg, phone_number=lead.phone_number) 
             for msg in result.data
         ]
         return messages[::-1]  # Orden cronológico
@@ -174,7 +240,7 @@ class SupabaseClient:
             "reminder_sent": appointment.reminder_sent
         }
         
-        result = self.client.table("appointments").insert(appointment_data).execute()
+        result = await self._execute(self.client.table("appointments").insert(appointment_data))
         
         if result.data:
             return Appointment(**result.data[0])
@@ -186,17 +252,72 @@ class SupabaseClient:
     
     async def get_conversation_context(self, phone_number: str) -> dict:
         """Obtiene el contexto completo para los agentes."""
+        limit = settings.context_history_messages
         lead = await self.get_lead_by_phone(phone_number)
-        messages = await self.get_message_history(phone_number, limit=10)
+        messages = await self._history_for_lead(lead, limit)
+        return self._context(lead, self._with_pending(phone_number, messages, limit))
+    
+    async def load_conversation_context(self, phone_number: str) -> dict:
+        """
+        Contexto del turno en un round trip (RPC load_conversation_context):
+        obtiene o crea el lead y trae sus últimos mensajes.
+        """
+        if not self.client:
+            return await self.get_conversation_context(phone_number)
         
-        return {
-            "lead": lead.model_dump() if lead else None,
-            "messages": [m.model_dump() for m in messages],
-            "fsm_state": lead.fsm_state if lead else "INICIO",
-            "bant_score": lead.bant_score if lead else 0,
-            "extracted_facts": lead.extracted_facts if lead else {}
-        }
+        result = await self._execute(self.client.rpc("load_conversation_context", {
+            "p_phone_number": phone_number,
+            "p_limit": settings.context_history_messages
+        }))
+        
+        lead = await self._cache_lead(Lead(**result.data["lead"]), from_read=True)
+        messages = [Message(**msg, phone_number=phone_number) for msg in result.data["messages"]]
+        return self._context(lead, self._with_pending(phone_number, messages, settings.context_history_messages))
+    
+    # =====================
+    # UNIDAD DE TRABAJO
+    # =====================
+    
+    async def commit_turn(
+        self,
+        phone_number: str,
+        lead_updates: dict,
+        facts: dict,
+        messages: List[dict]
+    ) -> Optional[Lead]:
+        """
+        Confirma las escrituras de un turno en una transacción (RPC
+        commit_turn): estado FSM/BANT, merge de hechos, mensajes y contador.
+        """
+        if not self.client:
+            return None
+        
+        result = await self._execute(self.client.rpc("commit_turn", {
+            "p_phone_number": phone_number,
+            "p_lead_updates": lead_updates,
+            "p_facts": facts,
+            "p_messages": messages
+        }))
+        
+        if result.data:
+            return await self._cache_lead(Lead(**result.data))
+        return None
+
+
+def create_repository():
+    """
+    Postgres directo (asyncpg) si hay DATABASE_URL; si no, la API de Supabase.
+    Con MESSAGE_JOURNAL_ENABLED los mensajes pasan por un journal write-behind.
+    """
+    if settings.database_url:
+        from .postgres_repository import PostgresRepository
+        repository = PostgresRepository(settings.database_url)
+    else:
+        repository = SupabaseClient()
+    if settings.message_journal_enabled:
+        repository.journal = MessageJournal(repository)
+    return repository
 
 
 # Instancia global
-supabase_client = SupabaseClient()
+supabase_client = create_repository()
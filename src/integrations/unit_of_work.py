@@ -0,0 +1,90 @@
+"""
+Unidad de trabajo por turno.
+Los nodos del grafo no escriben en la base: registran sus cambios (hechos
+extraídos, BANT, estado FSM, mensajes) en la unidad de trabajo del turno y
+process_message los confirma al final con una sola llamada a commit_turn
+(una transacción). Si el repositorio tiene journal, los mensajes se le
+entregan (escritura diferida) y commit_turn solo corre si el turno cambió
+el lead. También cuenta los round trips a la base del turno.
+"""
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from ..models import Lead, Message
+from ..utils import metrics
+from .message_journal import message_row
+
+
+# Unidad de trabajo del turno en curso (las tareas del grafo heredan el contexto)
+_current: ContextVar[Optional["TurnUnitOfWork"]] = ContextVar("turn_unit_of_work", default=None)
+
+
+def count_round_trip() -> None:
+    """Registra un round trip a la base (lo llaman los repositorios)."""
+    metrics.increment("db_round_trips")
+    uow = _current.get()
+    if uow is not None:
+        uow.round_trips += 1
+
+
+class TurnUnitOfWork:
+    """Carga el contexto una vez y acumula las escrituras del turno."""
+
+    def __init__(self, repository, phone_number: str):
+        self.repository = repository
+        self.phone_number = phone_number
+        self.lead_updates: dict = {}
+        self.facts: dict = {}
+        self.messages: List[Tuple[Message, bool]] = []
+        self.round_trips = 0
+        self._token = None
+
+    def __enter__(self) -> "TurnUnitOfWork":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _current.reset(self._token)
+        metrics.observe("db_round_trips_per_turn", self.round_trips)
+
+    async def load(self) -> dict:
+        """Contexto de la conversación en un round trip; crea el lead si es nuevo."""
+        return await self.repository.load_conversation_context(self.phone_number)
+
+    def update_extracted_facts(self, facts: dict) -> None:
+        """Hechos a fusionar sobre los guardados."""
+        self.facts.update(facts)
+
+    def update_bant_score(self, score: int) -> None:
+        self.lead_updates["bant_score"] = score
+
+    def update_fsm_state(self, new_state: str) -> None:
+        self.lead_updates["fsm_state"] = new_state
+
+    def add_message(self, message: Message, mark_extracted: bool = False) -> None:
+        """
+        Mensaje a insertar, en orden. Con `mark_extracted` pasa a ser el
+        watermark de extracción del lead.
+        """
+        self.messages.append((message, mark_extracted))
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.lead_updates or self.facts or self.messages)
+
+    async def flush(self) -> Optional[Lead]:
+        """Confirma todos los cambios del turno en una transacción."""
+        messages, self.messages = self.messages, []
+        journal = getattr(self.repository, "journal", None)
+        if journal:
+            for message, mark_extracted in messages:
+                journal.append(message, mark_extracted)
+            messages = []
+        if not (self.lead_updates or self.facts or messages):
+            return None
+        lead = await self.repository.commit_turn(
+            self.phone_number, self.lead_updates, self.facts,
+            [message_row(m, mark) for m, mark in messages]
+        )
+        self.lead_updates, self.facts = {}, {}
+        return lead
@@ -3,10 +3,32 @@ Integración con WhatsApp Business Cloud API.
 Maneja envío y recepción de mensajes.
 """
 import httpx
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from pydantic import ValidationError
 
 from ..config import settings
-from ..models import OutboundMessage, WhatsAppButton
+from ..models import OutboundMessage, WhatsAppButton, WhatsAppWebhookMessage
+
+
+def parse_webhook_messages(body: dict) -> Tuple[List[WhatsAppWebhookMessage], List[dict]]:
+    """
+    Recorre todas las entradas, cambios y mensajes de un payload del webhook.
+    Meta agrupa varios mensajes (y varios remitentes) en un solo POST.
+    Retorna (mensajes válidos en orden de llegada, descartados con su motivo).
+    """
+    parsed: List[WhatsAppWebhookMessage] = []
+    invalid: List[dict] = []
+    
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for raw in value.get("messages") or []:
+                try:
+                    parsed.append(WhatsAppWebhookMessage.model_validate(raw))
+                except ValidationError:
+                    invalid.append({"message_id": raw.get("id"), "status": "invalid_message"})
+    
+    return parsed, invalid
 
 
 class WhatsAppClient:
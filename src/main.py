@@ -3,21 +3,36 @@ Entry point de la aplicación FastAPI.
 Expone webhook de WhatsApp y endpoints de salud.
 """
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List
+import asyncio
 import json
+import time
 import structlog
 
 try:
     from src.config import settings
-    from src.fsm import process_message
-    from src.integrations import whatsapp_client
+    from src.agents.intent_classifier import intent_classifier
+    from src.fsm import process_message, cancel_turn, cancel_summary_updates, TurnCancelled
+    from src.integrations import supabase_client, whatsapp_client, parse_webhook_messages
+    from src.integrations.deepseek import deepseek_client
+    from src.integrations.llm_cache import llm_cache
+    from src.integrations.lead_cache import lead_cache
     from src.guardrails import guardrails, pii_detector
+    from src.utils import metrics
+    from src.workers import turn_pool, lead_mailbox, message_deduplicator, TurnJob
 except ImportError:
     # Fallback for local dev/relative context
     from .config import settings
-    from .fsm import process_message
-    from .integrations import whatsapp_client
+    from .agents.intent_classifier import intent_classifier
+    from .fsm import process_message, cancel_turn, cancel_summary_updates, TurnCancelled
+    from .integrations import supabase_client, whatsapp_client, parse_webhook_messages
+    from .integrations.deepseek import deepseek_client
+    from .integrations.llm_cache import llm_cache
+    from .integrations.lead_cache import lead_cache
     from .guardrails import guardrails, pii_detector
+    from .utils import metrics
+    from .workers import turn_pool, lead_mailbox, message_deduplicator, TurnJob
 
 # Configurar logging estructurado
 structlog.configure(
@@ -92,89 +107,204 @@ async def verify_webhook(
 async def receive_webhook(request: Request):
     """
     Recibe mensajes de WhatsApp.
-    Procesa el mensaje y responde automáticamente.
+    Recorre todas las entradas, cambios y mensajes del payload, encola cada
+    mensaje de texto y responde de inmediato con el resultado por mensaje.
     """
     try:
         body = await request.json()
         
         logger.info("webhook_received", body_keys=list(body.keys()))
         
-        # Extraer mensaje
-        entry = body.get("entry", [{}])[0]
-        changes = entry.get("changes", [{}])[0]
-        value = changes.get("value", {})
-        
-        # Verificar que es un mensaje de texto
-        messages = value.get("messages", [])
-        if not messages:
+        messages, results = parse_webhook_messages(body)
+        if not messages and not results:
             return {"status": "no_messages"}
         
-        message = messages[0]
-        
-        # Solo procesar mensajes de texto
-        if message.get("type") != "text":
-            logger.info("non_text_message", type=message.get("type"))
-            return {"status": "non_text_ignored"}
-        
-        phone_number = message.get("from")
-        text = message.get("text", {}).get("body", "")
-        message_id = message.get("id")
-        
-        if not phone_number or not text:
-            return {"status": "invalid_message"}
-        
-        logger.info(
-            "message_received",
-            phone=phone_number[-4:],  # Solo últimos 4 dígitos por privacidad
-            text_length=len(text),
-            message_id=message_id
-        )
-        
-        # Verificar guardrails de input
-        is_valid, reason = guardrails.check_input(text)
-        if not is_valid:
-            logger.warning("input_blocked", reason=reason, phone=phone_number[-4:])
-            response = guardrails.get_deflection(reason.split(":")[1] if ":" in reason else "default")
-        else:
-            # Procesar mensaje con el grafo de agentes
-            response = await process_message(phone_number, text)
+        jobs: List[TurnJob] = []
+        for message in messages:
+            # Solo procesar mensajes de texto
+            if message.type != "text":
+                logger.info("non_text_message", type=message.type)
+                results.append({"message_id": message.id, "status": "non_text_ignored"})
+                continue
+            
+            if not message.body:
+                results.append({"message_id": message.id, "status": "invalid_message"})
+                continue
+            
+            # Reintentos de Meta con el mismo id: no se vuelven a procesar
+            if await message_deduplicator.is_duplicate(message.id):
+                logger.info("duplicate_message", message_id=message.id)
+                results.append({"message_id": message.id, "status": "duplicate"})
+                continue
             
-            # Verificar y sanitizar output
-            response = guardrails.sanitize_output(response)
+            logger.info(
+                "message_received",
+                phone=message.from_number[-4:],  # Solo últimos 4 dígitos por privacidad
+                text_length=len(message.body),
+                message_id=message.id
+            )
+            jobs.append(TurnJob(
+                phone_number=message.from_number,
+                text=message.body,
+                message_ids=[message.id]
+            ))
         
-        # Marcar mensaje como leído
-        await whatsapp_client.mark_as_read(message_id)
+        if not settings.webhook_async_processing:
+            results.extend(await _process_inline(jobs))
+            return {"status": "processed", "results": results}
         
-        # Enviar respuesta
-        send_result = await whatsapp_client.send_text_message(phone_number, response)
+        if jobs and not turn_pool.running:
+            await turn_pool.start(handle_turn)
         
-        logger.info(
-            "response_sent",
-            phone=phone_number[-4:],
-            response_length=len(response),
-            send_result=send_result.get("messages", [{}])[0].get("id") if "messages" in send_result else None
-        )
+        if jobs and not turn_pool.has_capacity(len(jobs)):
+            logger.warning("turn_queue_full", total=len(jobs))
+            # Permitir que el reintento de Meta no se tome como duplicado
+            for job in jobs:
+                await message_deduplicator.forget(job.message_id)
+            # 503 para que Meta reintente más tarde (backpressure)
+            raise HTTPException(status_code=503, detail="Queue full")
         
-        return {"status": "processed"}
+        # El buzón agrupa ráfagas del mismo lead antes de pasar al pool
+        for job in jobs:
+            # Un mensaje nuevo deja obsoleto el turno en curso del mismo lead
+            if settings.cancel_stale_turns and cancel_turn(job.phone_number):
+                logger.info("stale_turn_cancelled", phone=job.phone_number[-4:])
+            lead_mailbox.post(job)
+            results.append({"message_id": job.message_id, "status": "queued"})
         
+        return {"status": "queued", "results": results}
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("webhook_error", error=str(e))
         # No lanzar excepción para que WhatsApp no reintente
         return {"status": "error", "message": str(e)}
 
 
+async def _process_inline(jobs: List[TurnJob]) -> List[dict]:
+    """
+    Procesa los turnos dentro del request (sin pool).
+    Números distintos en paralelo; los mensajes de un mismo número del
+    payload se agrupan en un solo turno.
+    """
+    by_phone = {}
+    for job in jobs:
+        by_phone.setdefault(job.phone_number, []).append(job)
+    
+    async def run_in_order(phone_jobs: List[TurnJob]) -> List[dict]:
+        job = TurnJob.merge(phone_jobs)
+        try:
+            await handle_turn(job)
+            status = "processed"
+        except Exception as e:
+            logger.error("turn_error", error=str(e), message_id=job.message_id)
+            status = "error"
+        return [{"message_id": mid, "status": status} for mid in job.message_ids]
+    
+    grouped = await asyncio.gather(*(run_in_order(j) for j in by_phone.values()))
+    return [outcome for outcomes in grouped for outcome in outcomes]
+
+
+async def handle_turn(job: TurnJob) -> None:
+    """
+    Procesa un turno encolado: guardrails, grafo de agentes y envío.
+    Se ejecuta en el pool de workers. Con streaming activo cada párrafo se
+    valida y se envía en cuanto está listo.
+    """
+    phone_number = job.phone_number
+    text = job.text
+    sent_segments: List[str] = []
+    
+    async def send_segment(segment: str) -> None:
+        if not sent_segments and job.message_id:
+            await whatsapp_client.mark_as_read(job.message_id)
+        segment = guardrails.sanitize_output(segment)
+        sent_segments.append(segment)
+        await whatsapp_client.send_text_message(phone_number, segment)
+    
+    # Verificar guardrails de input
+    is_valid, reason = guardrails.check_input(text)
+    if not is_valid:
+        logger.warning("input_blocked", reason=reason, phone=phone_number[-4:])
+        response = guardrails.get_deflection(reason.split(":")[1] if ":" in reason else "default")
+    else:
+        # Procesar mensaje con el grafo de agentes
+        try:
+            response = await process_message(
+                phone_number,
+                text,
+                on_segment=send_segment if settings.stream_responses else None
+            )
+        except TurnCancelled:
+            # Se reprocesa junto con los mensajes nuevos del lead
+            lead_mailbox.carry_over(job)
+            return
+        
+        if sent_segments:
+            logger.info(
+                "response_streamed",
+                phone=phone_number[-4:],
+                segments=len(sent_segments),
+                response_length=len(response)
+            )
+            return
+        
+        # Verificar y sanitizar output
+        response = guardrails.sanitize_output(response)
+    
+    # Marcar mensaje como leído
+    if job.message_id:
+        await whatsapp_client.mark_as_read(job.message_id)
+    
+    # Enviar respuesta
+    send_result = await whatsapp_client.send_text_message(phone_number, response)
+    
+    logger.info(
+        "response_sent",
+        phone=phone_number[-4:],
+        response_length=len(response),
+        send_result=send_result.get("messages", [{}])[0].get("id") if "messages" in send_result else None
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en proceso (pool de workers, LLM, caches)."""
+    return {
+        "worker_pool": turn_pool.stats(),
+        "mailbox_pending_leads": lead_mailbox.pending_leads,
+        "dedup": message_deduplicator.stats(),
+        "llm_cache": llm_cache.stats(),
+        "lead_cache": lead_cache.stats(),
+        "message_journal": supabase_client.journal.stats() if supabase_client.journal else None,
+        "llm_usage": deepseek_client.usage_by_agent(),
+        "llm_profiles": deepseek_client.usage_by_profile(),
+        "llm_resilience": deepseek_client.stats(),
+        **metrics.snapshot()
+    }
+
+
 # =====================
 # ENDPOINTS DE DEBUG (solo desarrollo)
 # =====================
 
 @app.post("/test/message")
-async def test_message(phone_number: str, message: str):
+async def test_message(phone_number: str, message: str, stream: bool = False):
     """
     Endpoint de prueba para simular mensajes.
     Solo para desarrollo/testing.
+    Con `stream=true` responde server-sent events: un evento `segment` por
+    párrafo y un evento `done` con la respuesta completa y los tiempos.
     """
     logger.info("test_message", phone=phone_number, message=message)
     
+    if stream:
+        return StreamingResponse(
+            _stream_test_message(phone_number, message),
+            media_type="text/event-stream"
+        )
+    
     response = await process_message(phone_number, message)
     
     return {
@@ -183,6 +313,56 @@ async def test_message(phone_number: str, message: str):
     }
 
 
+async def _stream_test_message(phone_number: str, message: str):
+    """Genera los eventos SSE de /test/message."""
+    started = time.monotonic()
+    segments: asyncio.Queue = asyncio.Queue()
+    
+    async def on_segment(segment: str) -> None:
+        await segments.put(segment)
+    
+    turn = asyncio.create_task(process_message(phone_number, message, on_segment=on_segment))
+    getter = None
+    first_segment_ms = None
+    
+    try:
+        while True:
+            getter = asyncio.create_task(segments.get())
+            done, _ = await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            first_segment_ms = first_segment_ms or elapsed_ms
+            yield f"event: segment\ndata: {json.dumps({'text': getter.result(), 'elapsed_ms': elapsed_ms})}\n\n"
+        
+        # Segmentos que llegaron junto con el fin del turno
+        while not segments.empty():
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            first_segment_ms = first_segment_ms or elapsed_ms
+            yield f"event: segment\ndata: {json.dumps({'text': segments.get_nowait(), 'elapsed_ms': elapsed_ms})}\n\n"
+        
+        try:
+            response = turn.result()
+        except Exception as e:
+            # Las cabeceras ya salieron: el error va como evento
+            logger.error("test_message_error", error=str(e))
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        
+        done_event = {
+            "response": response,
+            "first_segment_ms": first_segment_ms,
+            "total_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+        yield f"event: done\ndata: {json.dumps(done_event)}\n\n"
+    finally:
+        # El cliente se desconectó o el turno terminó: no dejar tareas vivas
+        for task in (getter, turn):
+            if task is not None and not task.done():
+                task.cancel()
+
+
 # =====================
 # INIT
 # =====================
@@ -194,11 +374,31 @@ async def startup():
         "app_startup",
         deepseek_configured=bool(settings.deepseek_api_key),
         supabase_configured=bool(settings.supabase_url),
+        database_url_configured=bool(settings.database_url),
         whatsapp_configured=bool(settings.whatsapp_token)
     )
+    
+    # Conexiones a DeepSeek abiertas antes del primer turno
+    await deepseek_client.start()
+    # Pool de la base de datos (asyncpg con DATABASE_URL)
+    await supabase_client.start()
+    
+    # Entrenar el clasificador local de intención antes del primer mensaje
+    if settings.fast_intent_enabled:
+        await asyncio.to_thread(lambda: intent_classifier.model)
+    
+    if settings.webhook_async_processing:
+        await turn_pool.start(handle_turn)
 
 
 @app.on_event("shutdown")
 async def shutdown():
     """Limpieza al cerrar."""
-    logger.info("app_shutdown")
+    # Entregar ráfagas en espera y drenar turnos pendientes antes de salir
+    lead_mailbox.flush_all()
+    await turn_pool.stop()
+    await cancel_summary_updates()
+    await deepseek_client.close()
+    # Guarda los mensajes pendientes del journal y cierra la base
+    await supabase_client.close()
+    logger.info("app_shutdown", worker_pool=turn_pool.stats())
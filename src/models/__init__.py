@@ -1,6 +1,6 @@
 """Models package."""
 from .lead import Lead, LeadData, BANTScore, Appointment
-from .message import Message, WhatsAppWebhookMessage, WhatsAppButton, OutboundMessage, RouterResult, ConversationContext
+from .message import Message, WhatsAppWebhookMessage, WhatsAppButton, OutboundMessage, RouterResult, TurnAnalysis, ConversationContext
 
 __all__ = [
     "Lead",
@@ -12,5 +12,6 @@ __all__ = [
     "WhatsAppButton",
     "OutboundMessage",
     "RouterResult",
+    "TurnAnalysis",
     "ConversationContext",
 ]
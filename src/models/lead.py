@@ -63,6 +63,9 @@ class Lead(BaseModel):
     bant_score: int = 0
     fsm_state: str = "INICIO"
     extracted_facts: dict = Field(default_factory=dict)
+    extraction_watermark: Optional[datetime] = None  # último mensaje ya extraído
+    conversation_summary: Optional[str] = None  # resumen de lo anterior a la ventana
+    summary_watermark: Optional[datetime] = None  # último mensaje incluido en el resumen
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     last_message_at: Optional[datetime] = None
@@ -5,6 +5,8 @@ from pydantic import BaseModel, Field
 from typing import Optional, Literal, List
 from datetime import datetime
 
+from .lead import LeadData, BANTScore
+
 
 class Message(BaseModel):
     """Mensaje de WhatsApp."""
@@ -57,6 +59,14 @@ class RouterResult(BaseModel):
     confianza: float = Field(ge=0.0, le=1.0, default=0.5)
 
 
+class TurnAnalysis(BaseModel):
+    """Resultado del agente de análisis fusionado (router + extractor + calificador)."""
+    router: RouterResult
+    lead_data: LeadData = Field(default_factory=LeadData)
+    bant: Optional[BANTScore] = None  # None = no se calificó este turno
+    extraction_done: bool = False  # respondió el bloque de datos: avanza el watermark
+
+
 class ConversationContext(BaseModel):
     """Contexto de conversación para los agentes."""
     phone_number: str
@@ -65,3 +75,24 @@ class ConversationContext(BaseModel):
     lead_data: Optional[dict] = None
     fsm_state: str = "INICIO"
     bant_score: int = 0
+    extraction_watermark: Optional[datetime] = None
+    conversation_summary: Optional[str] = None
+    summary_watermark: Optional[datetime] = None
+    
+    @property
+    def unextracted_history(self) -> List[Message]:
+        """Mensajes del historial posteriores al watermark de extracción del lead."""
+        return _after(self.message_history, self.extraction_watermark)
+    
+    @property
+    def unsummarized_history(self) -> List[Message]:
+        """Mensajes del historial que el resumen del lead aún no cubre."""
+        return _after(self.message_history, self.summary_watermark)
+
+
+def _after(messages: List[Message], watermark: Optional[datetime]) -> List[Message]:
+    if watermark is None:
+        return messages
+    # astimezone(): los mensajes locales no traen zona horaria y los de BD sí
+    watermark = watermark.astimezone()
+    return [m for m in messages if m.created_at.astimezone() > watermark]
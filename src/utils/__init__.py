@@ -1 +1,14 @@
 """Utils package."""
+from .metrics import metrics, MetricsRegistry
+from .cache import TTLCache, CacheBackend, InMemoryCacheBackend, get_shared_backend
+from .tokens import count_tokens
+
+__all__ = [
+    "metrics",
+    "MetricsRegistry",
+    "TTLCache",
+    "CacheBackend",
+    "InMemoryCacheBackend",
+    "get_shared_backend",
+    "count_tokens",
+]
@@ -0,0 +1,165 @@
+"""
+Caches en proceso y backends compartidos.
+TTLCache es un LRU acotado con expiración; los backends (Redis / Upstash)
+permiten compartir estado entre varios workers o instancias.
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Protocol
+import time
+
+import httpx
+
+from ..config import settings
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU acotado por número de entradas con expiración por entrada."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def add(self, key: Hashable, value: Any, ttl_seconds: float = None) -> bool:
+        """Guarda solo si la clave no existe. Retorna True si la guardó."""
+        if key in self:
+            return False
+        self.set(key, value, ttl_seconds)
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        if item is None or item[1] <= time.monotonic():
+            return default
+        return item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class CacheBackend(Protocol):
+    """Backend compartido clave-valor con TTL (valores serializados como str)."""
+
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        ...
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        ...
+
+    async def delete(self, key: str) -> None:
+        ...
+
+
+class InMemoryCacheBackend:
+    """Backend local con la misma interfaz que Redis (desarrollo y pruebas)."""
+
+    def __init__(self, max_entries: int = 10000):
+        self._cache = TTLCache(max_entries=max_entries)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self._cache.set(key, value, ttl_seconds)
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        return self._cache.add(key, value, ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        self._cache.pop(key)
+
+
+class RedisCacheBackend:
+    """Backend sobre Redis (protocolo redis:// o rediss://)."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        await self._redis.set(key, value, px=int(ttl_seconds * 1000))
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        return bool(await self._redis.set(key, value, px=int(ttl_seconds * 1000), nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+
+class UpstashRestBackend:
+    """Backend sobre la API REST de Upstash Redis (https://...)."""
+
+    def __init__(self, url: str, token: str):
+        self.url = url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=httpx.Timeout(2.0)
+        )
+
+    async def _command(self, *args) -> Any:
+        response = await self._client.post(self.url, json=[str(a) for a in args])
+        response.raise_for_status()
+        return response.json().get("result")
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._command("GET", key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        await self._command("SET", key, value, "PX", int(ttl_seconds * 1000))
+
+    async def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        return await self._command("SET", key, value, "PX", int(ttl_seconds * 1000), "NX") == "OK"
+
+    async def delete(self, key: str) -> None:
+        await self._command("DEL", key)
+
+
+_shared_backend: Optional[CacheBackend] = None
+
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """
+    Backend compartido según configuración (UPSTASH_REDIS_URL).
+    Retorna None si no hay Redis configurado.
+    """
+    global _shared_backend
+    if _shared_backend is None and settings.upstash_redis_url:
+        url = settings.upstash_redis_url
+        if url.startswith(("redis://", "rediss://")):
+            _shared_backend = RedisCacheBackend(url)
+        else:
+            _shared_backend = UpstashRestBackend(url, settings.upstash_redis_token or "")
+    return _shared_backend
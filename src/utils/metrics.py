@@ -0,0 +1,126 @@
+"""
+Métricas en proceso para observabilidad.
+Contadores, gauges y distribuciones simples expuestas en /metrics.
+"""
+from collections import deque
+from typing import Deque, Dict, Tuple
+import threading
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _series_name(name: str, key: LabelKey) -> str:
+    if not key:
+        return name
+    labels = ",".join(f'{k}="{v}"' for k, v in key)
+    return f"{name}{{{labels}}}"
+
+
+class Distribution:
+    """Distribución con ventana de muestras recientes para percentiles."""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        """Percentil q (0-100) sobre la ventana reciente."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class MetricsRegistry:
+    """Registro global de métricas con soporte de etiquetas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._distributions: Dict[str, Dict[LabelKey, Distribution]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Incrementa un contador."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Fija el valor actual de un gauge."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra una observación (latencias, tamaños, esperas)."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._distributions.setdefault(name, {})
+            if key not in series:
+                series[key] = Distribution()
+            series[key].observe(value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def get_gauge(self, name: str, **labels) -> float:
+        return self._gauges.get(name, {}).get(_label_key(labels), 0)
+
+    def get_distribution(self, name: str, **labels) -> Distribution:
+        return self._distributions.get(name, {}).get(_label_key(labels)) or Distribution()
+
+    def snapshot(self) -> dict:
+        """Foto de todas las métricas en formato serializable."""
+        with self._lock:
+            return {
+                "counters": {
+                    _series_name(name, key): value
+                    for name, series in self._counters.items()
+                    for key, value in series.items()
+                },
+                "gauges": {
+                    _series_name(name, key): value
+                    for name, series in self._gauges.items()
+                    for key, value in series.items()
+                },
+                "distributions": {
+                    _series_name(name, key): dist.summary()
+                    for name, series in self._distributions.items()
+                    for key, dist in series.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._distributions.clear()
+
+
+# Instancia global
+metrics = MetricsRegistry()
@@ -0,0 +1,14 @@
+"""Workers package."""
+from .pool import turn_pool, TurnWorkerPool, TurnJob
+from .mailbox import lead_mailbox, LeadMailbox
+from .dedup import message_deduplicator, MessageDeduplicator
+
+__all__ = [
+    "turn_pool",
+    "TurnWorkerPool",
+    "TurnJob",
+    "lead_mailbox",
+    "LeadMailbox",
+    "message_deduplicator",
+    "MessageDeduplicator",
+]
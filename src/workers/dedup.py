@@ -0,0 +1,83 @@
+"""
+Deduplicación de mensajes entrantes por id de WhatsApp.
+Meta reenvía el mismo `message.id` cuando respondemos lento; los duplicados
+se descartan antes de cualquier trabajo de LLM o base de datos.
+"""
+from typing import Optional
+
+from ..config import settings
+from ..utils import metrics
+from ..utils.cache import TTLCache, CacheBackend, get_shared_backend
+
+
+class MessageDeduplicator:
+    """LRU local con TTL más backend compartido opcional."""
+
+    KEY_PREFIX = "wa:msg:"
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl_seconds: float = None,
+        backend: Optional[CacheBackend] = None
+    ):
+        self.ttl_seconds = ttl_seconds or settings.dedup_ttl_seconds
+        self._local = TTLCache(
+            max_entries=max_entries or settings.dedup_max_entries,
+            ttl_seconds=self.ttl_seconds
+        )
+        self.backend = backend
+
+    async def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """Registra el id y retorna True si ya se había visto."""
+        if not message_id:
+            return False
+
+        if not self._local.add(message_id, True):
+            metrics.increment("dedup_hits", source="local")
+            return True
+
+        if self.backend is not None:
+            try:
+                added = await self.backend.add(self.KEY_PREFIX + message_id, "1", self.ttl_seconds)
+            except Exception as e:
+                # Si el backend falla se prefiere procesar antes que perder el mensaje
+                metrics.increment("dedup_backend_errors")
+                print(f"⚠️ Error en backend de deduplicación: {e}")
+                added = True
+            if not added:
+                metrics.increment("dedup_hits", source="shared")
+                return True
+
+        metrics.increment("dedup_misses")
+        return False
+
+    async def forget(self, message_id: str) -> None:
+        """Olvida un id (p.ej. si el turno no se pudo aceptar y Meta reintentará)."""
+        self._local.pop(message_id)
+        if self.backend is not None:
+            try:
+                await self.backend.delete(self.KEY_PREFIX + message_id)
+            except Exception as e:
+                metrics.increment("dedup_backend_errors")
+                print(f"⚠️ Error en backend de deduplicación: {e}")
+
+    def stats(self) -> dict:
+        hits = (
+            metrics.get_counter("dedup_hits", source="local")
+            + metrics.get_counter("dedup_hits", source="shared")
+        )
+        misses = metrics.get_counter("dedup_misses")
+        return {
+            "entries": len(self._local),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "shared_backend": self.backend is not None,
+        }
+
+
+# Instancia global
+message_deduplicator = MessageDeduplicator(
+    backend=get_shared_backend() if settings.dedup_shared_backend else None
+)
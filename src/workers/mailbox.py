@@ -0,0 +1,154 @@
+"""
+Buzón por lead: agrupa ráfagas de mensajes en un solo turno.
+Los usuarios suelen escribir "hola" / "soy Ana" / "de Acme" en mensajes
+separados; dentro de la ventana de debounce se concatenan y el grafo corre
+una sola vez. Si al vencer la ventana la cola del pool está llena, la
+ráfaga se reintenta; si se agotan los reintentos se olvidan sus ids en el
+deduplicador para que el usuario pueda reenviar el mensaje.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from ..config import settings
+from ..utils import metrics
+from .dedup import MessageDeduplicator, message_deduplicator
+from .pool import TurnJob, TurnWorkerPool, turn_pool
+
+
+class _PendingBurst:
+    """Mensajes acumulados de un lead a la espera de la ventana."""
+
+    def __init__(self, first_at: float):
+        self.first_at = first_at
+        self.jobs: List[TurnJob] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.attempts = 0
+
+
+class LeadMailbox:
+    """Buzón con debounce por `phone_number` delante del pool de workers."""
+
+    # Reintentos de entrega cuando la cola del pool está llena
+    SUBMIT_RETRY_SECONDS = 1.0
+    SUBMIT_MAX_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        pool: TurnWorkerPool = None,
+        debounce_seconds: float = None,
+        max_wait_seconds: float = None,
+        deduplicator: MessageDeduplicator = None
+    ):
+        self.pool = pool or turn_pool
+        self.deduplicator = deduplicator or message_deduplicator
+        self.debounce_seconds = (
+            settings.mailbox_debounce_seconds if debounce_seconds is None else debounce_seconds
+        )
+        self.max_wait_seconds = (
+            settings.mailbox_max_wait_seconds if max_wait_seconds is None else max_wait_seconds
+        )
+        self._pending: Dict[str, _PendingBurst] = {}
+
+    @property
+    def pending_leads(self) -> int:
+        return len(self._pending)
+
+    def post(self, job: TurnJob) -> None:
+        """Recibe un mensaje; se entrega al pool cuando el lead deja de escribir."""
+        now = time.monotonic()
+        if self.debounce_seconds <= 0:
+            burst = _PendingBurst(now)
+            burst.jobs.append(job)
+            self._submit(burst)
+            return
+
+        burst = self._pending.get(job.phone_number)
+        if burst is None:
+            burst = self._pending[job.phone_number] = _PendingBurst(now)
+        elif burst.timer:
+            burst.timer.cancel()
+        burst.jobs.append(job)
+
+        # Extender la ventana sin superar la espera máxima desde el primer mensaje
+        deadline = min(now + self.debounce_seconds, burst.first_at + self.max_wait_seconds)
+        loop = asyncio.get_running_loop()
+        burst.timer = loop.call_at(
+            loop.time() + max(0.0, deadline - now),
+            self._flush,
+            job.phone_number
+        )
+        metrics.set_gauge("mailbox_pending_leads", len(self._pending))
+
+    def carry_over(self, job: TurnJob) -> None:
+        """
+        Reprograma un turno cancelado delante de los mensajes más nuevos del
+        mismo lead, para que el siguiente turno los incluya a todos.
+        """
+        burst = self._pending.get(job.phone_number)
+        if burst is not None:
+            burst.jobs.insert(0, job)
+            burst.first_at = min(burst.first_at, job.enqueued_at)
+            return
+        if not self.pool.requeue_front(job):
+            burst = _PendingBurst(job.enqueued_at)
+            burst.jobs.append(job)
+            self._reject(burst)
+
+    def flush_all(self) -> None:
+        """Entrega de inmediato todo lo acumulado (p.ej. al apagar)."""
+        for phone_number in list(self._pending):
+            burst = self._pending[phone_number]
+            if burst.timer:
+                burst.timer.cancel()
+            self._flush(phone_number)
+
+    def _flush(self, phone_number: str) -> None:
+        burst = self._pending.pop(phone_number, None)
+        metrics.set_gauge("mailbox_pending_leads", len(self._pending))
+        if burst and burst.jobs:
+            self._submit(burst)
+
+    def _submit(self, burst: _PendingBurst) -> None:
+        jobs = burst.jobs
+        job = TurnJob.merge(jobs)
+        if not self.pool.submit(job):
+            self._reject(burst)
+            return
+        if len(jobs) > 1:
+            metrics.increment("mailbox_messages_coalesced", len(jobs) - 1)
+        metrics.observe("mailbox_burst_size", len(jobs))
+
+    def _reject(self, burst: _PendingBurst) -> None:
+        """Cola llena: reintenta más tarde o, agotados los intentos, descarta."""
+        metrics.increment("mailbox_flush_rejected")
+        phone_number = burst.jobs[0].phone_number
+        burst.attempts += 1
+        if burst.attempts < self.SUBMIT_MAX_ATTEMPTS:
+            # Los mensajes que lleguen mientras tanto se suman detrás
+            newer = self._pending.get(phone_number)
+            if newer is not None:
+                newer.jobs[:0] = burst.jobs
+                newer.first_at = min(newer.first_at, burst.first_at)
+                newer.attempts = max(newer.attempts, burst.attempts)
+                return
+            self._pending[phone_number] = burst
+            burst.timer = asyncio.get_running_loop().call_later(
+                self.SUBMIT_RETRY_SECONDS, self._flush, phone_number
+            )
+            metrics.set_gauge("mailbox_pending_leads", len(self._pending))
+            return
+
+        message_ids = [mid for job in burst.jobs for mid in job.message_ids]
+        metrics.increment("mailbox_bursts_dropped")
+        print(f"❌ Cola llena: turno de ...{phone_number[-4:]} descartado ({len(message_ids)} mensajes).")
+        # Sin esto un reenvío del usuario se tomaría como duplicado
+        asyncio.ensure_future(self._forget(message_ids))
+
+    async def _forget(self, message_ids: List[str]) -> None:
+        for message_id in message_ids:
+            await self.deduplicator.forget(message_id)
+
+
+# Instancia global
+lead_mailbox = LeadMailbox()
@@ -0,0 +1,212 @@
+"""
+Pool de workers asyncio para procesar turnos fuera del request del webhook.
+El webhook encola y responde 200 de inmediato; los workers ejecutan el grafo
+y envían la respuesta por WhatsApp.
+
+Los turnos de números distintos corren en paralelo; los de un mismo número
+se procesan en orden de llegada, nunca dos a la vez.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from ..config import settings
+from ..utils import metrics
+
+
+class TurnJob(BaseModel):
+    """Turno pendiente de procesar (uno o varios mensajes del mismo lead)."""
+    phone_number: str
+    text: str
+    message_ids: List[str] = Field(default_factory=list)
+    enqueued_at: float = Field(default_factory=time.monotonic)
+    
+    @property
+    def message_id(self) -> Optional[str]:
+        """Último mensaje del turno (marcarlo como leído marca los anteriores)."""
+        return self.message_ids[-1] if self.message_ids else None
+    
+    @classmethod
+    def merge(cls, jobs: List["TurnJob"]) -> "TurnJob":
+        """Une varios mensajes del mismo lead en un solo turno."""
+        if len(jobs) == 1:
+            return jobs[0]
+        return cls(
+            phone_number=jobs[0].phone_number,
+            text="\n".join(job.text for job in jobs),
+            message_ids=[mid for job in jobs for mid in job.message_ids],
+            enqueued_at=min(job.enqueued_at for job in jobs)
+        )
+
+
+TurnHandler = Callable[[TurnJob], Awaitable[None]]
+
+
+class TurnWorkerPool:
+    """Pool de workers en proceso con cola acotada."""
+
+    def __init__(self, size: int = None, max_queue_size: int = None):
+        self.size = size or settings.worker_pool_size
+        self.max_queue_size = max_queue_size or settings.worker_queue_max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._handler: Optional[TurnHandler] = None
+        self._busy = 0
+        self._accepting = False
+        # Turnos pendientes por teléfono con un turno en curso
+        self._active: Dict[str, Deque[TurnJob]] = {}
+        # Turnos aceptados y aún no terminados (cola + encadenados + en curso)
+        self._unfinished = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, handler: TurnHandler) -> None:
+        """Arranca los workers. Idempotente."""
+        if self.running:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"turn-worker-{i}")
+            for i in range(self.size)
+        ]
+        self._accepting = True
+        self._publish_gauges()
+
+    def submit(self, job: TurnJob) -> bool:
+        """Encola un turno. Retorna False si la cola está llena o cerrada."""
+        if not self._accepting or self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.increment("worker_jobs_rejected")
+            return False
+        self._track(1)
+        metrics.increment("worker_jobs_enqueued")
+        self._publish_gauges()
+        return True
+
+    def requeue_front(self, job: TurnJob) -> bool:
+        """
+        Devuelve un turno interrumpido al frente de su lead, antes de los
+        mensajes que llegaron después. Solo aplica si el lead está activo.
+        """
+        pending = self._active.get(job.phone_number)
+        if pending is None:
+            return self.submit(job)
+        pending.appendleft(job)
+        self._track(1)
+        return True
+
+    def has_capacity(self, count: int = 1) -> bool:
+        """Indica si la cola admite `count` turnos más."""
+        if not self._accepting or self._queue is None:
+            return False
+        return self._queue.qsize() + count <= self.max_queue_size
+
+    async def stop(self, timeout: float = None) -> None:
+        """Deja de aceptar trabajo, drena la cola y detiene los workers."""
+        if not self.running:
+            return
+        self._accepting = False
+        timeout = settings.worker_drain_timeout_seconds if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            metrics.increment("worker_jobs_dropped_on_shutdown", self._unfinished)
+            print(f"⚠️ Pool detenido con {self._unfinished} turnos sin procesar.")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._publish_gauges()
+
+    def stats(self) -> dict:
+        """Estado actual del pool."""
+        wait = metrics.get_distribution("worker_queue_wait_seconds")
+        return {
+            "running": self.running,
+            "workers": self.size,
+            "busy_workers": self._busy,
+            "utilisation": round(self._busy / self.size, 3) if self.size else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue_size,
+            "queue_wait_seconds": wait.summary(),
+        }
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            key = job.phone_number
+            
+            # Otro worker ya atiende este número: se encadena detrás, en orden
+            if key in self._active:
+                self._active[key].append(job)
+                continue
+            
+            self._active[key] = deque()
+            try:
+                while job is not None:
+                    await self._run(index, job)
+                    job = self._next_for(key)
+            finally:
+                del self._active[key]
+    
+    def _next_for(self, key: str) -> Optional[TurnJob]:
+        """Siguiente turno del lead; lo acumulado mientras tanto va en un solo turno."""
+        pending = self._active[key]
+        if not pending:
+            return None
+        jobs = list(pending)
+        pending.clear()
+        if len(jobs) > 1:
+            metrics.increment("turns_coalesced", len(jobs) - 1)
+            # Los turnos absorbidos ya no se procesan por separado
+            self._track(1 - len(jobs))
+        return TurnJob.merge(jobs)
+    
+    async def _run(self, index: int, job: TurnJob) -> None:
+        metrics.observe("worker_queue_wait_seconds", time.monotonic() - job.enqueued_at)
+        self._busy += 1
+        self._publish_gauges()
+        started = time.monotonic()
+        try:
+            await self._handler(job)
+            metrics.increment("worker_jobs_processed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.increment("worker_jobs_failed")
+            print(f"❌ Error procesando turno en worker {index}: {e}")
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.observe("worker_job_seconds", elapsed)
+            metrics.increment("worker_busy_seconds", elapsed)
+            self._busy -= 1
+            self._track(-1)
+            self._publish_gauges()
+
+    def _track(self, delta: int) -> None:
+        self._unfinished += delta
+        if self._unfinished > 0:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    def _publish_gauges(self) -> None:
+        metrics.set_gauge("worker_queue_depth", self._queue.qsize() if self._queue else 0)
+        metrics.set_gauge("worker_busy", self._busy)
+        metrics.set_gauge("worker_utilisation", self._busy / self.size if self.size else 0.0)
+
+
+# Instancia global
+turn_pool = TurnWorkerPool()
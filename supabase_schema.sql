@@ -19,6 +19,9 @@ CREATE TABLE IF NOT EXISTS leads (
     bant_score INTEGER DEFAULT 0,
     fsm_state VARCHAR(50) DEFAULT 'INICIO',
     extracted_facts JSONB DEFAULT '{}',
+    extraction_watermark TIMESTAMPTZ,
+    conversation_summary TEXT,
+    summary_watermark TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     last_message_at TIMESTAMPTZ,
@@ -26,6 +29,11 @@ CREATE TABLE IF NOT EXISTS leads (
     source VARCHAR(50) DEFAULT 'whatsapp'
 );
 
+-- Columnas añadidas después de la versión inicial (bases existentes)
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS extraction_watermark TIMESTAMPTZ;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS conversation_summary TEXT;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS summary_watermark TIMESTAMPTZ;
+
 -- Tabla de mensajes
 CREATE TABLE IF NOT EXISTS messages (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -93,6 +101,150 @@ CREATE TRIGGER update_leads_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Inserción en bloque de mensajes (journal write-behind y save_message).
+-- Cada elemento trae phone_number, id y created_at asignados por el
+-- cliente; los reintentos no duplican (ON CONFLICT (id)). En la misma
+-- transacción incrementa message_count de cada lead y avanza
+-- last_message_at y el watermark de extracción (mark_extracted).
+CREATE OR REPLACE FUNCTION append_messages(p_messages JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_inserted INTEGER;
+BEGIN
+    WITH incoming AS (
+        SELECT COALESCE((m.value->>'id')::UUID, gen_random_uuid()) AS id, l.id AS lead_id, m.value
+        FROM jsonb_array_elements(p_messages) AS m
+        JOIN leads l ON l.phone_number = m.value->>'phone_number'
+    ), inserted AS (
+        INSERT INTO messages (id, lead_id, direction, content, message_type, whatsapp_id, metadata, created_at)
+        SELECT
+            id,
+            lead_id,
+            value->>'direction',
+            value->>'content',
+            COALESCE(value->>'message_type', 'text'),
+            value->>'whatsapp_id',
+            COALESCE(value->'metadata', '{}'::jsonb),
+            COALESCE((value->>'created_at')::TIMESTAMPTZ, clock_timestamp())
+        FROM incoming
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id, lead_id, created_at
+    ), per_lead AS (
+        SELECT
+            i.lead_id,
+            COUNT(*) AS n,
+            MAX(i.created_at) AS last_at,
+            MAX(i.created_at) FILTER (
+                WHERE COALESCE((c.value->>'mark_extracted')::BOOLEAN, FALSE)
+            ) AS watermark
+        FROM inserted i
+        JOIN incoming c ON c.id = i.id
+        GROUP BY i.lead_id
+    ), bumped AS (
+        UPDATE leads l SET
+            message_count = COALESCE(l.message_count, 0) + p.n,
+            last_message_at = GREATEST(l.last_message_at, p.last_at),
+            extraction_watermark = GREATEST(l.extraction_watermark, p.watermark)
+        FROM per_lead p
+        WHERE l.id = p.lead_id
+        RETURNING l.id
+    )
+    SELECT COUNT(*) INTO v_inserted FROM inserted;
+
+    RETURN v_inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Contexto de un turno en un solo round trip: obtiene o crea el lead por
+-- teléfono y devuelve {lead, messages} con sus últimos p_limit mensajes en
+-- orden cronológico (índice idx_messages_lead). Un lead nuevo cuesta la
+-- misma llamada.
+CREATE OR REPLACE FUNCTION load_conversation_context(
+    p_phone_number VARCHAR,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_lead leads;
+BEGIN
+    SELECT * INTO v_lead FROM leads WHERE phone_number = p_phone_number;
+    IF NOT FOUND THEN
+        INSERT INTO leads (phone_number) VALUES (p_phone_number)
+        ON CONFLICT (phone_number) DO NOTHING
+        RETURNING * INTO v_lead;
+        IF v_lead.id IS NULL THEN
+            -- Otro turno lo creó en paralelo
+            SELECT * INTO v_lead FROM leads WHERE phone_number = p_phone_number;
+        END IF;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'lead', to_jsonb(v_lead),
+        'messages', COALESCE((
+            SELECT jsonb_agg(to_jsonb(m) ORDER BY m.created_at)
+            FROM (
+                SELECT * FROM messages
+                WHERE lead_id = v_lead.id
+                ORDER BY created_at DESC
+                LIMIT p_limit
+            ) m
+        ), '[]'::jsonb)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Escrituras de un turno en una sola transacción (unidad de trabajo):
+-- estado FSM/BANT, merge de hechos extraídos, mensajes en orden y contador.
+-- Los mensajes reciben created_at crecientes (NOW() + orden en microsegundos)
+-- y el último con mark_extracted pasa a ser el watermark de extracción.
+CREATE OR REPLACE FUNCTION commit_turn(
+    p_phone_number VARCHAR,
+    p_lead_updates JSONB DEFAULT '{}',
+    p_facts JSONB DEFAULT '{}',
+    p_messages JSONB DEFAULT '[]'
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_lead leads;
+    v_count INTEGER := jsonb_array_length(p_messages);
+    v_watermark TIMESTAMPTZ;
+BEGIN
+    SELECT * INTO v_lead FROM leads WHERE phone_number = p_phone_number FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO messages (lead_id, direction, content, message_type, whatsapp_id, metadata, created_at)
+    SELECT
+        v_lead.id,
+        m.value->>'direction',
+        m.value->>'content',
+        COALESCE(m.value->>'message_type', 'text'),
+        m.value->>'whatsapp_id',
+        COALESCE(m.value->'metadata', '{}'::jsonb),
+        NOW() + (m.ordinality - 1) * INTERVAL '1 microsecond'
+    FROM jsonb_array_elements(p_messages) WITH ORDINALITY AS m;
+
+    SELECT NOW() + (m.ordinality - 1) * INTERVAL '1 microsecond' INTO v_watermark
+    FROM jsonb_array_elements(p_messages) WITH ORDINALITY AS m
+    WHERE COALESCE((m.value->>'mark_extracted')::BOOLEAN, FALSE)
+    ORDER BY m.ordinality DESC
+    LIMIT 1;
+
+    UPDATE leads SET
+        fsm_state = COALESCE(p_lead_updates->>'fsm_state', fsm_state),
+        bant_score = COALESCE((p_lead_updates->>'bant_score')::INTEGER, bant_score),
+        extracted_facts = COALESCE(extracted_facts, '{}'::jsonb) || p_facts,
+        extraction_watermark = COALESCE(v_watermark, extraction_watermark),
+        message_count = COALESCE(message_count, 0) + v_count,
+        last_message_at = CASE WHEN v_count > 0 THEN NOW() ELSE last_message_at END
+    WHERE id = v_lead.id
+    RETURNING * INTO v_lead;
+
+    RETURN to_jsonb(v_lead);
+END;
+$$ LANGUAGE plpgsql;
+
 -- =============================================
 -- ROW LEVEL SECURITY (opcional)
 -- =============================================